@@ -0,0 +1,125 @@
+"""Hot table size and query cost before and after archiving finished tasks.
+
+Seeds --history finished tasks spread over the past year plus --open pending
+ones, then times the reminder sweep and /tasks history reads, runs
+archive_old_tasks() and times them again. Reports archival throughput and
+the database file size before and after the incremental vacuum. With
+--separate-file the archive lives in its own attached database
+(TASK_ARCHIVE_DB) and only the main file is expected to shrink.
+
+    python benchmarks/bench_archive.py --history 200000 --open 5000
+    python benchmarks/bench_archive.py --history 200000 --separate-file
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+from common import remove_db, report, setup_env, summarize
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("--history", type=int, default=200000, help="finished tasks seeded")
+parser.add_argument("--open", type=int, default=5000, help="pending tasks seeded")
+parser.add_argument("--chats", type=int, default=2000)
+parser.add_argument("--reads", type=int, default=2000, help="history reads timed per phase")
+parser.add_argument("--separate-file", action="store_true", help="archive into an attached TASK_ARCHIVE_DB")
+args = parser.parse_args()
+
+DB_FILE = setup_env()
+ARCHIVE_FILE = DB_FILE + ".archive" if args.separate_file else None
+if ARCHIVE_FILE:
+    os.environ["TASK_ARCHIVE_DB"] = ARCHIVE_FILE
+
+import bot  # noqa: E402
+
+bot.print = lambda *a, **k: None
+bot.init_database()
+
+
+def seed(now):
+    rows = []
+    for i in range(args.history):
+        target = now - datetime.timedelta(minutes=random.randint(60, 60 * 24 * 365))
+        done = random.random() < 0.6
+        rows.append((random.randrange(args.chats), f"finished task {i} " + "x" * 40, bot.to_epoch(target),
+                     bot.to_epoch(target - datetime.timedelta(hours=1)),
+                     bot.to_epoch(target + datetime.timedelta(minutes=15)),
+                     bot.to_epoch(target - datetime.timedelta(days=1)), 1, int(not done), int(done)))
+    for i in range(args.open):
+        target = now + datetime.timedelta(minutes=random.randint(60, 60 * 24 * 30))
+        rows.append((random.randrange(args.chats), f"open task {i}", bot.to_epoch(target),
+                     bot.to_epoch(target - datetime.timedelta(hours=1)),
+                     bot.to_epoch(target + datetime.timedelta(minutes=15)), bot.to_epoch(now), 0, 0, 0))
+    conn = bot.get_db()
+    with conn:
+        conn.executemany('''
+            INSERT INTO tasks (chat_id, task_description, target_at, reminder_at, followup_at,
+                               created_at, reminder_sent, followup_sent, completed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def file_mb(path):
+    return round(os.path.getsize(path) / 1024 / 1024, 2) if path and os.path.exists(path) else 0.0
+
+
+def measure(now):
+    conn = bot.get_db()
+    now_epoch = bot.to_epoch(now)
+    sweep = []
+    for _ in range(200):
+        start = time.perf_counter()
+        conn.execute(bot.SQL_PENDING_REMINDERS, (now_epoch,)).fetchall()
+        conn.execute(bot.SQL_PENDING_FOLLOWUPS, (now_epoch,)).fetchall()
+        sweep.append(time.perf_counter() - start)
+    history = []
+    for _ in range(args.reads):
+        start = time.perf_counter()
+        bot.get_user_tasks(random.randrange(args.chats), include_completed=True)
+        history.append(time.perf_counter() - start)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return {
+        "hot_rows": conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0],
+        "db_mb": file_mb(DB_FILE),
+        "archive_db_mb": file_mb(ARCHIVE_FILE),
+        "sweep": summarize(sweep),
+        "history_read": summarize(history),
+    }
+
+
+def main():
+    random.seed(3)
+    now = bot.get_ist_time()
+    seed(now)
+    before = measure(now)
+    sample_chat = random.randrange(args.chats)
+    history_before = bot.get_user_tasks(sample_chat, include_completed=True)
+
+    start = time.perf_counter()
+    archived, freed = bot.archive_old_tasks(now)
+    elapsed = time.perf_counter() - start
+
+    after = measure(now)
+    history_after = bot.get_user_tasks(sample_chat, include_completed=True)
+    report("archive", {
+        "archive_file": "separate" if ARCHIVE_FILE else "same",
+        "archived": archived,
+        "archive_seconds": round(elapsed, 3),
+        "archived_per_sec": round(archived / elapsed, 1) if elapsed else None,
+        "pages_freed": freed,
+        "before": before,
+        "after": after,
+    })
+    remove_db(DB_FILE)
+    if ARCHIVE_FILE:
+        remove_db(ARCHIVE_FILE)
+    if [t[0] for t in history_before] != [t[0] for t in history_after]:
+        print(f"❌ /tasks history for chat {sample_chat} changed after archiving")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
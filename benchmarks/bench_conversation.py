@@ -0,0 +1,62 @@
+"""Context assembly cost vs. how long a chat has been going.
+
+Seeds one chat with N stored turns (all but the newest already summarized,
+as the compactor would leave them) and times build_chat_context. Both the
+latency and the prompt size should stay flat as N grows.
+
+    python benchmarks/bench_conversation.py --turns 100 10000 100000
+"""
+import argparse
+import time
+
+from common import remove_db, report, setup_env, summarize
+
+DB_FILE = setup_env()
+
+import bot  # noqa: E402
+
+
+def seed(chat_id, turns):
+    conn = bot.get_db()
+    now = bot.get_ist_time().isoformat()
+    text = "How many rotis can I have with rajma tonight if I skipped lunch? " * 2
+    tokens = bot.estimate_tokens(text)
+    live = min(turns, 12)
+    rows = ((chat_id, "user" if i % 2 == 0 else "assistant", text, tokens, now, 1 if i < turns - live else 0)
+            for i in range(turns))
+    summary = "- prefers dal over paneer\n" * 30
+    with conn:
+        conn.executemany('''
+            INSERT INTO conversation_messages (chat_id, role, content, tokens, created_at, summarized)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.execute('''
+            INSERT INTO conversation_state (chat_id, summary, summary_tokens, live_tokens, last_turn_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (chat_id, summary, bot.estimate_tokens(summary), live * tokens, now))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=[100, 10000, 100000])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    bot.init_database()
+    results = {}
+    for chat_id, turns in enumerate(args.turns, start=1):
+        seed(chat_id, turns)
+        samples = []
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            t0 = time.perf_counter()
+            messages, prompt_tokens, _ = bot.build_chat_context(chat_id, "Can I eat paneer tonight?")
+            samples.append(time.perf_counter() - t0)
+        results[f"{turns}_turns"] = dict(summarize(samples, time.perf_counter() - start),
+                                         prompt_tokens=prompt_tokens, messages=len(messages))
+    report("conversation_context", results)
+    remove_db(DB_FILE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Per-call latency of the task DB helpers, connect-per-call vs pooled connections.
+
+Readers (reminder sweep + /tasks lookups) and writers (add + mark sent) run at
+the same time, which is what the reminder checker and the Flask pings do.
+
+    python benchmarks/bench_db.py --readers 4 --writers 2 --seconds 5
+"""
+import argparse
+import datetime
+import sqlite3
+import threading
+import time
+
+from common import remove_db, report, setup_env, summarize
+
+DB_FILE = setup_env()
+
+import bot  # noqa: E402
+
+bot.init_database()
+
+
+# Copies of the original helpers: a fresh connection for every call.
+def legacy_get_pending_reminders(db_file):
+    now = bot.to_epoch(datetime.datetime.now(bot.IST))
+    conn = sqlite3.connect(db_file)
+    rows = conn.execute(bot.SQL_PENDING_REMINDERS, (now,)).fetchall()
+    conn.close()
+    return rows
+
+
+def legacy_get_user_tasks(db_file, chat_id):
+    conn = sqlite3.connect(db_file)
+    rows = conn.execute(bot.SQL_USER_TASKS_PENDING, (chat_id,)).fetchall()
+    conn.close()
+    return rows
+
+
+def legacy_add_task(db_file, chat_id, desc, target):
+    now = datetime.datetime.now(bot.IST)
+    conn = sqlite3.connect(db_file)
+    cursor = conn.execute(bot.SQL_INSERT_TASK, (
+        chat_id, desc, bot.to_epoch(target),
+        bot.to_epoch(target - datetime.timedelta(hours=1)),
+        bot.to_epoch(target + datetime.timedelta(minutes=15)),
+        bot.to_epoch(now), 0,
+    ))
+    conn.commit()
+    conn.close()
+    return cursor.lastrowid
+
+
+def legacy_mark_reminder_sent(db_file, task_id):
+    conn = sqlite3.connect(db_file)
+    conn.execute(bot.SQL_MARK_REMINDER_SENT, (task_id,))
+    conn.commit()
+    conn.close()
+
+
+def pooled_add_task(db_file, chat_id, desc, target):
+    return bot.add_task(chat_id, desc, target)
+
+
+def pooled_mark_reminder_sent(db_file, task_id):
+    bot.mark_reminder_sent(task_id)
+
+
+def pooled_get_pending_reminders(db_file):
+    return bot.get_pending_reminders()
+
+
+def pooled_get_user_tasks(db_file, chat_id):
+    return bot.get_user_tasks(chat_id)
+
+
+MODES = {
+    "connect_per_call": (legacy_get_pending_reminders, legacy_get_user_tasks,
+                         legacy_add_task, legacy_mark_reminder_sent),
+    "pooled": (pooled_get_pending_reminders, pooled_get_user_tasks,
+               pooled_add_task, pooled_mark_reminder_sent),
+}
+
+
+def seed(db_file, rows):
+    conn = sqlite3.connect(db_file)
+    conn.execute("DELETE FROM tasks")
+    target = datetime.datetime.now(bot.IST) + datetime.timedelta(days=1)
+    conn.executemany(bot.SQL_INSERT_TASK, [
+        (i % 50, f"seed task {i}", bot.to_epoch(target), bot.to_epoch(target),
+         bot.to_epoch(target), bot.to_epoch(target), 0)
+        for i in range(rows)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def run_mode(mode, db_file, readers, writers, seconds):
+    sweep, user_tasks, add, mark = MODES[mode]
+    samples = {"read": [], "write": []}
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def reader(n):
+        local = []
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            if n % 2:
+                sweep(db_file)
+            else:
+                user_tasks(db_file, n % 50)
+            local.append(time.perf_counter() - start)
+        with lock:
+            samples["read"].extend(local)
+
+    def writer(n):
+        local = []
+        target = datetime.datetime.now(bot.IST) + datetime.timedelta(hours=3)
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            task_id = add(db_file, n, "bench task", target)
+            mark(db_file, task_id)
+            local.append(time.perf_counter() - start)
+        with lock:
+            samples["write"].extend(local)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    began = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - began
+    return {kind: summarize(values, elapsed) for kind, values in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    # The legacy run gets its own file in the default rollback-journal mode,
+    # since WAL is a persistent property of the database file.
+    legacy_db = DB_FILE + ".legacy"
+    conn = sqlite3.connect(legacy_db)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.close()
+    bot.get_db().execute("SELECT 1")
+    schema = bot.get_db().execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'tasks'").fetchone()[0]
+    conn = sqlite3.connect(legacy_db)
+    conn.execute(schema)
+    conn.close()
+
+    results = {}
+    for mode, db_file in (("connect_per_call", legacy_db), ("pooled", DB_FILE)):
+        seed(db_file, args.rows)
+        results[mode] = run_mode(mode, db_file, args.readers, args.writers, args.seconds)
+    report("db_helpers", results)
+    remove_db(legacy_db)
+    remove_db(DB_FILE)
+
+
+if __name__ == "__main__":
+    main()
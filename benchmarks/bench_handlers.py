@@ -0,0 +1,158 @@
+"""Message handling end to end against fake Telegram and fake OpenAI servers.
+
+Feeds a mix of updates through handle_all_messages on --workers threads (as
+telebot's polling pool would), with every Telegram call going to
+benchmarks/fake_telegram.py over HTTP and every chat completion to
+benchmarks/fake_openai.py. Reports handler latency per kind of message,
+overall throughput up to the last reply reaching Telegram, and how many
+injected errors the bot absorbed. The kinds are:
+
+    command   /time, /tasks, /status, /usage
+    reminder  "Remind me to ..." (reminder parsing plus add_task)
+    workout   "workout done"
+    chat      a nutrition question answered by the LLM
+
+    python benchmarks/bench_handlers.py --messages 2000 --mix command=4,reminder=3,workout=1,chat=2
+    python benchmarks/bench_handlers.py --telegram-error-rate 0.05 --openai-error-rate 0.1
+"""
+import argparse
+import contextlib
+import io
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+from common import remove_db, report, setup_env, summarize, wait_for_quiet
+from fake_openai import FakeOpenAI
+from fake_telegram import FakeTelegram, make_update
+
+DB_FILE = setup_env()
+os.environ.update({
+    # The fake API doesn't rate limit unless asked to; don't let our own
+    # limiter cap the test.
+    "TELEGRAM_GLOBAL_RATE": "1000000",
+    "TELEGRAM_CHAT_RATE": "1000000",
+    "TELEGRAM_CHAT_BURST": "1000000",
+    "LLM_STREAMING": "0",
+})
+CHAT_BASE = 10_000
+COMMANDS = ["/time", "/tasks", "/status", "/usage"]
+REMINDERS = [
+    "Remind me to drink water at 5 PM tomorrow",
+    "Remind me to call the dietician tomorrow at 10 AM",
+    "remember to buy oats on December 5 at 3 PM",
+    "Remind me to take vitamin D in 3 hours",
+]
+
+
+def make_text(kind, i):
+    if kind == "command":
+        return random.choice(COMMANDS)
+    if kind == "reminder":
+        return random.choice(REMINDERS)
+    if kind == "workout":
+        return "workout done"
+    # Distinct questions so the response cache doesn't answer them all.
+    return f"What should I eat after a {i % 97 + 20} minute evening walk if dinner was rajma chawal?"
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in ("command", "reminder", "workout", "chat"):
+            raise SystemExit(f"unknown kind in --mix: {kind}")
+        weights[kind] = float(weight or 1)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4, help="handler threads")
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--mix", default="command=4,reminder=3,workout=1,chat=2")
+    parser.add_argument("--telegram-latency", type=float, default=0.005, help="seconds per fake Telegram call")
+    parser.add_argument("--telegram-error-rate", type=float, default=0.0)
+    parser.add_argument("--ttft", type=float, default=0.05, help="fake OpenAI time to first token, seconds")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="fake OpenAI delay per token, seconds")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    weights = parse_mix(args.mix)
+    random.seed(5)
+
+    # retry_after=0 keeps injected 429s from pausing the whole run for seconds.
+    telegram = FakeTelegram(latency=args.telegram_latency, error_rate=args.telegram_error_rate,
+                            error_codes=(429, 500), retry_after=0).start()
+    openai = FakeOpenAI(ttft=args.ttft, token_delay=args.token_delay,
+                        error_rate=args.openai_error_rate).start()
+    os.environ["OPENAI_BASE_URL"] = openai.base_url
+    import telebot
+    telebot.apihelper.API_URL = telegram.api_url
+
+    import bot
+    quiet = io.StringIO()
+    with contextlib.redirect_stdout(quiet):
+        bot.init_database()
+        bot.task_store.start()
+        bot.outbound.start()
+        bot.outbox.start()
+
+    kinds = random.choices(list(weights), weights=list(weights.values()), k=args.messages)
+    updates = queue.Queue()
+    for i, kind in enumerate(kinds, 1):
+        update = make_update(i, CHAT_BASE + random.randrange(args.chats), make_text(kind, i))
+        updates.put((kind, telebot.types.Message.de_json(update["message"])))
+    latencies = {kind: [] for kind in weights}
+    errors = []
+
+    def worker():
+        while True:
+            try:
+                kind, message = updates.get_nowait()
+            except queue.Empty:
+                return
+            started = time.perf_counter()
+            try:
+                bot.handle_all_messages(message)
+            except Exception as e:
+                errors.append(repr(e))
+            latencies[kind].append(time.perf_counter() - started)
+
+    with contextlib.redirect_stdout(quiet):
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(args.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        handled = time.perf_counter() - start
+        last_call = wait_for_quiet(bot, telegram)
+
+    results = {
+        "messages": args.messages,
+        "workers": args.workers,
+        "handled_per_sec": round(args.messages / handled, 1),
+        "drained_per_sec": round(args.messages / (last_call - start), 1) if last_call else None,
+        "handler": {kind: summarize(samples) for kind, samples in latencies.items()},
+        "telegram_calls": len(telegram.calls),
+        "telegram_errors_injected": telegram.errors,
+        "openai_requests": len(openai.requests),
+        "openai_errors_injected": openai.errors,
+        "dispatcher": dict(bot.outbound.counters),
+        "handler_exceptions": len(errors),
+    }
+    report("handlers", results)
+    telegram.stop()
+    openai.stop()
+    remove_db(DB_FILE)
+    if errors or last_call is None:
+        print(f"❌ {len(errors)} handler exceptions, e.g. {errors[:3]}; drained: {last_call is not None}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Reminder/follow-up sweep cost as finished-task history grows.
+
+Checks the EXPLAIN QUERY PLAN of every hot task query first and exits non-zero
+if one of them stops using its index, then grows the table with already-sent
+history and times the sweeps with and without the partial indexes.
+
+    python benchmarks/bench_indexes.py --sizes 10000 100000 1000000
+"""
+import argparse
+import datetime
+import sys
+import time
+
+from common import remove_db, report, setup_env, summarize
+
+DB_FILE = setup_env()
+
+import bot  # noqa: E402
+
+bot.init_database()
+
+EXPECTED_PLANS = {
+    "SQL_PENDING_REMINDERS": "idx_tasks_reminder_due",
+    "SQL_PENDING_FOLLOWUPS": "idx_tasks_followup_due",
+    "SQL_USER_TASKS_PENDING": "idx_tasks_chat",
+    "SQL_USER_TASKS_ALL": "idx_tasks_chat",
+}
+
+
+def check_query_plans(conn):
+    failures = []
+    for name, index in EXPECTED_PLANS.items():
+        sql = getattr(bot, name)
+        params = (0,) * sql.count("?")
+        plan = " | ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+        if index not in plan:
+            failures.append(f"{name}: expected {index}, got '{plan}'")
+    return failures
+
+
+def grow_history(conn, current, target_rows):
+    """Append finished tasks (reminded, followed up, completed) up to target_rows"""
+    past = datetime.datetime.now(bot.IST) - datetime.timedelta(days=30)
+    stamp = bot.to_epoch(past)
+    batch = []
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM tasks").fetchone()[0]
+    with conn:
+        for i in range(current, target_rows):
+            batch.append((i % 1000, f"old task {i}", stamp, stamp, stamp, stamp, 1))
+            if len(batch) == 50000:
+                conn.executemany(bot.SQL_INSERT_TASK, batch)
+                batch.clear()
+        if batch:
+            conn.executemany(bot.SQL_INSERT_TASK, batch)
+        conn.execute("UPDATE tasks SET followup_sent = 1, completed = 1 WHERE id > ?", (last_id,))
+
+
+def seed_live(conn, count):
+    """A handful of live tasks, some of them due, like a real deployment"""
+    now = datetime.datetime.now(bot.IST)
+    rows = []
+    for i in range(count):
+        target = now + datetime.timedelta(minutes=30 + i)
+        rows.append((i, f"live task {i}", bot.to_epoch(target),
+                     bot.to_epoch(target - datetime.timedelta(hours=1)),
+                     bot.to_epoch(target + datetime.timedelta(minutes=15)),
+                     bot.to_epoch(now), 0))
+    with conn:
+        conn.executemany(bot.SQL_INSERT_TASK, rows)
+
+
+def time_query(conn, sql, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    conn = bot.get_db()
+    failures = check_query_plans(conn)
+    if failures:
+        print("❌ Query plan regression:\n" + "\n".join(failures))
+        sys.exit(1)
+
+    seed_live(conn, 100)
+    now = bot.to_epoch(datetime.datetime.now(bot.IST))
+    scan_sql = bot.SQL_PENDING_REMINDERS.replace("FROM tasks", "FROM tasks NOT INDEXED")
+    results = {}
+    rows = 0
+    for size in sorted(args.sizes):
+        grow_history(conn, rows, size)
+        rows = size
+        results[str(size)] = {
+            "reminder_sweep": time_query(conn, bot.SQL_PENDING_REMINDERS, (now,), args.repeat),
+            "followup_sweep": time_query(conn, bot.SQL_PENDING_FOLLOWUPS, (now,), args.repeat),
+            "user_tasks": time_query(conn, bot.SQL_USER_TASKS_PENDING, (7,), args.repeat),
+            "reminder_sweep_full_scan": time_query(conn, scan_sql, (now,), min(args.repeat, 10)),
+        }
+
+    failures = check_query_plans(conn)
+    if failures:
+        print("❌ Query plan regression:\n" + "\n".join(failures))
+        sys.exit(1)
+    report("task_indexes", results)
+    remove_db(DB_FILE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""p50/p99 latency of parse_reminder_request over a corpus of reminder phrasings.
+
+Three runs over the same corpus:
+  dateparser_only  - the old path: every phrase goes through dateparser
+  fast_path_cold   - compiled grammar first, dateparser fallback, cache cleared per call
+  fast_path_cached - as deployed, with the (phrase, minute) LRU cache warm
+
+    python benchmarks/bench_parser.py --rounds 20
+"""
+import argparse
+import datetime
+import time
+
+from common import report, setup_env, summarize
+
+setup_env()
+
+import bot  # noqa: E402
+
+CORPUS = [
+    "Remind me to call mom at 5pm",
+    "remind me to drink water in 20 minutes",
+    "Remind me to pay rent tomorrow at 9",
+    "remind me to send report on 12 March at 10:30",
+    "remind me to call doctor at 5 PM tomorrow",
+    "Remind me to send report on Dec 5 at 3 PM",
+    "remind me to check email on dec 5th, 2027 at 10 am",
+    "remind me to eat in an hour",
+    "remind me to stretch in 2 hours",
+    "remind me to buy milk at 18:45",
+    "remind me to go to gym next monday at 7am",
+    "reminder to take vitamins at 9:30 pm",
+    "remind me to book tickets in 3 days",
+    "remind me to water plants today at 6 pm",
+    "remind me to call the bank at 11.15 am",
+    # Fallback-only phrasings
+    "remind me to renew passport next week",
+    "remind me to file taxes on the first of april",
+    "remind me to call john the day after tomorrow",
+]
+
+
+def dateparser_only(text):
+    _, _, time_phrase = bot._split_reminder_text(text)
+    return bot._dateparser_time_phrase(time_phrase, datetime.datetime.now(bot.IST))
+
+
+def fast_path_cold(text):
+    bot._resolve_time_phrase.cache_clear()
+    return bot.parse_reminder_request(text)
+
+
+def run(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        for text in CORPUS:
+            start = time.perf_counter()
+            fn(text)
+            samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    # Warm dateparser's own lazy loading so the first run isn't penalised.
+    dateparser_only(CORPUS[0])
+    fast_hits = sum(
+        1 for text in CORPUS
+        if bot._fast_parse_time_phrase(bot._split_reminder_text(text)[2],
+                                       datetime.datetime.now(bot.IST)) is not None)
+
+    results = {
+        "corpus_size": len(CORPUS),
+        "fast_path_coverage": f"{fast_hits}/{len(CORPUS)}",
+        "dateparser_only": run(dateparser_only, args.rounds),
+        "fast_path_cold": run(fast_path_cold, args.rounds),
+    }
+    bot._resolve_time_phrase.cache_clear()
+    results["fast_path_cached"] = run(bot.parse_reminder_request, args.rounds)
+    results["cache"] = bot._resolve_time_phrase.cache_info()._asdict()
+    report("reminder_parser", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""/ping under load, and whether it delays task reminders.
+
+Serves create_app() with waitress (as python bot.py does) and runs the real
+workers against the fake Telegram API. Each phase schedules --reminders task
+reminders falling due across a --seconds window and measures their lag, from
+the due second to the reminder reaching Telegram. The idle phase has no
+other traffic; the load phase also hammers --path from client processes over
+keep-alive connections. --direct recomputes the status on every request (the
+database counts included), the way / and /ping worked before the snapshot.
+
+    python benchmarks/bench_ping.py --seconds 15 --clients 4 --connections 4
+    python benchmarks/bench_ping.py --direct
+"""
+import argparse
+import contextlib
+import datetime
+import http.client
+import io
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+
+from common import remove_db, report, setup_env, summarize
+from fake_telegram import FakeTelegram
+
+DB_FILE = setup_env()
+os.environ.update({
+    "TELEGRAM_GLOBAL_RATE": "1000000",
+    "TELEGRAM_CHAT_RATE": "1000000",
+    "TELEGRAM_CHAT_BURST": "1000000",
+})
+CHAT_BASE = 30_000
+
+
+def hammer(args):
+    """One client process: keep-alive connections requesting path until the deadline"""
+    port, path, connections, deadline = args
+    results = [[] for _ in range(connections)]
+
+    def run(i):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        while time.time() < deadline:
+            start = time.perf_counter()
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status == 200:
+                results[i].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [sample for chunk in results for sample in chunk]
+
+
+def schedule_reminders(bot, phase, count, seconds):
+    """Tasks whose reminders fall due over the next `seconds`; returns {description: due epoch}"""
+    due = {}
+    now = bot.get_ist_time()
+    for i in range(count):
+        reminder_at = now + datetime.timedelta(seconds=2 + seconds * i / count)
+        description = f"bench-{phase}-{i}"
+        bot.add_task(CHAT_BASE + i, description, reminder_at + datetime.timedelta(hours=1))
+        due[description] = bot.to_epoch(reminder_at)
+    return due
+
+
+def reminder_lags(telegram, due):
+    """Seconds from each reminder's due second to its sendMessage reaching Telegram"""
+    offset = time.time() - time.perf_counter()
+    lags = []
+    for at, method, params in telegram.calls_to("sendMessage"):
+        match = re.search(r"bench-\w+-\d+", params.get("text", ""))
+        if match and match.group(0) in due and "TASK REMINDER" in params.get("text", ""):
+            lags.append(at + offset - due.pop(match.group(0)))
+    return lags
+
+
+def run_phase(bot, telegram, port, phase, args, load):
+    due = schedule_reminders(bot, phase, args.reminders, args.seconds)
+    expected = len(due)
+    start = time.time()
+    samples = []
+    if load:
+        deadline = start + args.seconds + 2
+        jobs = [(port, args.path, args.connections, deadline)] * args.clients
+        with multiprocessing.get_context("fork").Pool(args.clients) as pool:
+            samples = [s for chunk in pool.map(hammer, jobs) for s in chunk]
+    wait_until = start + args.seconds + 10
+    lags = []
+    while time.time() < wait_until and len(lags) < expected:
+        time.sleep(0.2)
+        lags += reminder_lags(telegram, due)
+    result = {"reminders": expected, "delivered": len(lags), "reminder_lag": summarize(lags)}
+    if load:
+        result[args.path] = summarize(samples, args.seconds + 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=15, help="length of each phase")
+    parser.add_argument("--clients", type=int, default=4, help="load processes")
+    parser.add_argument("--connections", type=int, default=4, help="keep-alive connections per process")
+    parser.add_argument("--reminders", type=int, default=100, help="task reminders due in each phase")
+    parser.add_argument("--path", default="/ping")
+    parser.add_argument("--tasks", type=int, default=50000, help="open tasks seeded so the counts cost something")
+    parser.add_argument("--direct", action="store_true", help="recompute the status on every request")
+    args = parser.parse_args()
+
+    telegram = FakeTelegram(latency=0.005).start()
+    import telebot
+    telebot.apihelper.API_URL = telegram.api_url
+
+    import bot
+    from waitress import create_server
+
+    # waitress warns on every request that finds all its threads busy.
+    logging.getLogger("waitress.queue").setLevel(logging.ERROR)
+    quiet = io.StringIO()
+    with contextlib.redirect_stdout(quiet):
+        bot.init_database()
+        target = bot.to_epoch(bot.get_ist_time() + datetime.timedelta(days=30))
+        conn = bot.get_db()
+        with conn:
+            conn.executemany('''
+                INSERT INTO tasks (chat_id, task_description, target_at, reminder_at, followup_at,
+                                   created_at, reminder_sent, followup_sent, completed)
+                VALUES (?, 'seeded', ?, ?, ?, ?, 0, 0, 0)
+            ''', ((i % 5000, target, target - 3600, target + 900, target - 86400) for i in range(args.tasks)))
+        bot.start_workers()
+        if args.direct:
+            bot.status.get = lambda: (bot.status.refresh(), bot.status._data)[1]
+        server = create_server(bot.create_app(), host="127.0.0.1", port=0, threads=bot.HTTP_THREADS)
+    threading.Thread(target=server.run, daemon=True).start()
+
+    with contextlib.redirect_stdout(quiet):
+        idle = run_phase(bot, telegram, server.effective_port, "idle", args, load=False)
+        loaded = run_phase(bot, telegram, server.effective_port, "load", args, load=True)
+    report("ping", {
+        "status": "recomputed per request" if args.direct else "snapshot",
+        "http_threads": bot.HTTP_THREADS,
+        "connections": args.clients * args.connections,
+        "idle": idle,
+        "load": loaded,
+    })
+    server.close()
+    telegram.stop()
+    remove_db(DB_FILE)
+    if idle["delivered"] < idle["reminders"] or loaded["delivered"] < loaded["reminders"]:
+        print("❌ some reminders never arrived")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Cold-start cost: import time and time until the app is ready to serve.
+
+Runs fresh interpreters so nothing is cached in-process, and reports the
+median of several runs. `-X importtime` output is parsed to show which
+top-level imports dominate. --compare REV measures bot.py from an older
+revision (e.g. the commit before lazy imports) the same way.
+
+    python benchmarks/bench_startup.py --runs 5 --compare HEAD~1
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from common import ROOT, remove_db, report, setup_env
+
+DB_FILE = setup_env()
+
+# Older revisions did all their work at import time; the current one needs the
+# factory calls to reach the same point (DB open, workers running, Flask app built).
+READY_SNIPPET = """
+import time
+start = time.perf_counter()
+import bot
+if hasattr(bot, "start_workers"):
+    bot.start_workers()
+    bot.create_app()
+else:
+    import flask
+print(round((time.perf_counter() - start) * 1000, 2))
+"""
+
+
+def run_python(args, cwd):
+    env = dict(os.environ, PYTHONPATH=cwd, PYTHONDONTWRITEBYTECODE="1")
+    return subprocess.run([sys.executable] + args, cwd=cwd, env=env,
+                          capture_output=True, text=True, timeout=120)
+
+
+def parse_importtime(stderr):
+    """Cumulative milliseconds per top-level import, heaviest first"""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line.split(":", 1)[1].split("|")]
+        if not cumulative.isdigit() or name.startswith(" "):
+            continue
+        totals[name] = int(cumulative)
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    return {name: round(us / 1000, 2) for name, us in ranked}
+
+
+def measure(cwd, runs, top):
+    ready = []
+    for _ in range(runs):
+        remove_db(DB_FILE)
+        result = run_python(["-c", READY_SNIPPET], cwd)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr[-2000:])
+        ready.append(float(result.stdout.strip().splitlines()[-1]))
+    remove_db(DB_FILE)
+    timing = run_python(["-X", "importtime", "-c", "import bot"], cwd)
+    imports = parse_importtime(timing.stderr)
+    return {
+        "ready_ms_median": round(statistics.median(ready), 2),
+        "ready_ms_runs": ready,
+        "import_bot_ms": imports.get("bot"),
+        "heaviest_imports_ms": dict(list(imports.items())[:top]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--compare", metavar="REV", help="git revision to measure as the baseline")
+    args = parser.parse_args()
+
+    results = {"current": measure(ROOT, args.runs, args.top)}
+    if args.compare:
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("bot.py", "prompts.py"):
+                source = subprocess.run(["git", "show", f"{args.compare}:{name}"], cwd=ROOT,
+                                        capture_output=True, text=True)
+                if source.returncode != 0:
+                    continue  # not every revision has every module
+                with open(os.path.join(tmp, name), "w", encoding="utf-8") as f:
+                    f.write(source.stdout)
+            results[args.compare] = measure(tmp, args.runs, args.top)
+    report("startup", results)
+    remove_db(DB_FILE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Time-to-first-visible-text for chat replies, blocking vs streaming.
+
+Runs handle_chat against benchmarks/fake_openai.py and a recording stand-in
+for the Telegram bot. "first text" is when the user first sees part of the
+answer; "placeholder" is when the Thinking... message lands. Exits non-zero if
+a streamed reply doesn't end as the full answer with Markdown applied.
+
+    python benchmarks/bench_streaming.py --runs 5 --ttft 0.4 --token-delay 0.02
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import types
+
+from common import remove_db, report, setup_env, summarize
+from fake_openai import FakeOpenAI
+
+DB_FILE = setup_env()
+
+
+class RecordingBot:
+    """Records every send/edit with a timestamp instead of calling Telegram"""
+
+    def __init__(self):
+        self.events = []
+        self._ids = iter(range(1, 10 ** 9))
+        self._lock = threading.Lock()
+
+    def _record(self, method, chat_id, text, kwargs):
+        with self._lock:
+            self.events.append((time.perf_counter(), method, chat_id, text, kwargs.get("parse_mode")))
+            return types.SimpleNamespace(message_id=next(self._ids), chat=types.SimpleNamespace(id=chat_id))
+
+    def send_message(self, chat_id, text, **kwargs):
+        return self._record("send", chat_id, text, kwargs)
+
+    def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        return self._record("edit", chat_id, text, kwargs)
+
+    def delete_message(self, chat_id, message_id):
+        return True
+
+
+def run_mode(bot, fake, recorder, streaming, runs, chat_base):
+    bot.LLM_STREAMING = streaming
+    first_text, placeholder, final = [], [], []
+    for i in range(runs):
+        chat_id = chat_base + i
+        message = types.SimpleNamespace(text=f"question {chat_id}", message_id=1,
+                                        chat=types.SimpleNamespace(id=chat_id))
+        start = time.perf_counter()
+        bot.handle_chat(message)
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            events = [e for e in recorder.events if e[2] == chat_id]
+            if events and events[-1][3] == fake.reply and (not streaming or events[-1][4] == "Markdown"):
+                break
+            time.sleep(0.01)
+        else:
+            print(f"❌ chat {chat_id}: reply never completed: {events[-1:] if events else 'nothing sent'}")
+            sys.exit(1)
+        answer = [e for e in events if e[3] != bot.STREAM_PLACEHOLDER]
+        first_text.append(answer[0][0] - start)
+        final.append(events[-1][0] - start)
+        if streaming:
+            placeholder.append(events[0][0] - start)
+    result = {"first_text": summarize(first_text), "full_reply": summarize(final)}
+    if streaming:
+        result["placeholder"] = summarize(placeholder)
+        result["edits_per_reply"] = round(
+            sum(1 for e in recorder.events if e[1] == "edit" and e[2] >= chat_base) / runs, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ttft", type=float, default=0.4, help="fake time to first token, seconds")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="fake delay per token, seconds")
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(ttft=args.ttft, token_delay=args.token_delay).start()
+    os.environ["OPENAI_BASE_URL"] = fake.base_url
+
+    import bot
+    bot.init_database()
+    recorder = RecordingBot()
+    bot.get_bot = lambda: recorder
+    bot.is_response_cache_enabled = lambda chat_id: False
+    bot.outbound.start()
+
+    results = {
+        "reply_tokens": len(fake.tokens()),
+        "blocking": run_mode(bot, fake, recorder, False, args.runs, 1000),
+        "streaming": run_mode(bot, fake, recorder, True, args.runs, 2000),
+    }
+    report("streaming", results)
+    fake.stop()
+    remove_db(DB_FILE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Task store throughput: the SQLite store against the in-memory indexed one.
+
+Each store runs the same workloads through the bot's public helpers:
+
+    add       add_task() for reminders a few hours out
+    complete  mark_task_completed() on random open tasks
+    read      get_user_tasks() for random chats
+    sweep     run_task_sweep() claiming --due-per-sweep due reminders each time
+    mixed     40% add, 30% read, 20% complete, 10% sweep
+
+The memory store writes its append-only log as it would in production
+(TASK_LOG_FSYNC is honoured); snapshots are taken once at the end and timed
+separately. A last check archives every task, snapshots, restarts the memory
+store and makes sure the next task id is not one the archive already holds.
+
+    python benchmarks/bench_task_store.py --tasks 20000 --ops 5000
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+from common import remove_db, report, setup_env
+
+DB_FILE = setup_env()
+
+import bot  # noqa: E402
+
+bot.print = lambda *a, **k: None
+bot.init_database()
+
+
+def fresh_store(kind, log_file):
+    conn = bot.get_db()
+    with conn:
+        conn.execute("DELETE FROM tasks")
+        conn.execute("DELETE FROM outbox")
+    for path in (log_file, log_file + ".1"):
+        if os.path.exists(path):
+            os.remove(path)
+    store = bot.MemoryTaskStore(log_file) if kind == "memory" else bot.SQLiteTaskStore()
+    bot.TASK_SNAPSHOT_SECONDS = 10 ** 9
+    store.start()
+    bot.task_store = store
+    return store
+
+
+def task_tuple(chat_id, now, due_in_minutes):
+    target = now + datetime.timedelta(minutes=due_in_minutes + 60)
+    return (chat_id, f"task for {chat_id}", bot.to_epoch(target),
+            bot.to_epoch(target - datetime.timedelta(hours=1)),
+            bot.to_epoch(target + datetime.timedelta(minutes=15)), bot.to_epoch(now), 0)
+
+
+def seed(store, count, chats):
+    now = bot.get_ist_time()
+    return [store.add(task_tuple(random.randrange(chats), now, random.randint(60, 60 * 24 * 30)))
+            for _ in range(count)]
+
+
+def seed_due(store, count, chats):
+    now = bot.get_ist_time()
+    for _ in range(count):
+        store.add(task_tuple(random.randrange(chats), now, -random.randint(1, 30)))
+
+
+def ops_per_sec(count, elapsed):
+    return round(count / elapsed, 1) if elapsed else None
+
+
+def run_workloads(kind, log_file, args):
+    store = fresh_store(kind, log_file)
+    open_ids = seed(store, args.tasks, args.chats)
+    results = {}
+    target = bot.get_ist_time() + datetime.timedelta(hours=3)
+
+    start = time.perf_counter()
+    for i in range(args.ops):
+        open_ids.append(bot.add_task(random.randrange(args.chats), f"bench {i}", target))
+    results["add"] = ops_per_sec(args.ops, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(args.ops):
+        bot.get_user_tasks(random.randrange(args.chats))
+    results["read"] = ops_per_sec(args.ops, time.perf_counter() - start)
+
+    random.shuffle(open_ids)
+    start = time.perf_counter()
+    for _ in range(args.ops):
+        bot.mark_task_completed(open_ids.pop())
+    results["complete"] = ops_per_sec(args.ops, time.perf_counter() - start)
+
+    sweeps = max(args.ops // 100, 1)
+    claimed = 0
+    elapsed = 0.0
+    for _ in range(sweeps):
+        seed_due(store, args.due_per_sweep, args.chats)
+        start = time.perf_counter()
+        claimed += bot.run_task_sweep()
+        elapsed += time.perf_counter() - start
+    results["sweep"] = {"sweeps_per_sec": ops_per_sec(sweeps, elapsed),
+                        "tasks_claimed_per_sec": ops_per_sec(claimed, elapsed)}
+
+    start = time.perf_counter()
+    for i in range(args.ops):
+        roll = random.random()
+        if roll < 0.4:
+            open_ids.append(bot.add_task(random.randrange(args.chats), f"mixed {i}", target))
+        elif roll < 0.7:
+            bot.get_user_tasks(random.randrange(args.chats))
+        elif roll < 0.9 and open_ids:
+            bot.mark_task_completed(open_ids.pop(random.randrange(len(open_ids))))
+        else:
+            seed_due(store, 1, args.chats)
+            bot.run_task_sweep()
+    results["mixed"] = ops_per_sec(args.ops, time.perf_counter() - start)
+
+    if kind == "memory":
+        start = time.perf_counter()
+        store.snapshot()
+        results["snapshot_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        results["log_replay_ms"] = replay_ms(log_file, args)
+    return results
+
+
+def replay_ms(log_file, args):
+    """Time a cold start: load the snapshot, then replay a log of --ops changes"""
+    store = bot.task_store
+    for i in range(args.ops):
+        store.mark_completed(random.randrange(1, args.tasks))
+    store._log.close()
+    restarted = bot.MemoryTaskStore(log_file)
+    start = time.perf_counter()
+    restarted.start()
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def restart_after_archive(log_file, count=100):
+    """Archive everything, snapshot, restart: the next id must be past every archived one"""
+    conn = bot.get_db()
+    with conn:
+        conn.execute(f"DELETE FROM {bot.ARCHIVE_SCHEMA}tasks_archive")
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'tasks'")
+    store = fresh_store("memory", log_file)
+    now = bot.get_ist_time()
+    for _ in range(count):
+        store.mark_completed(store.add(task_tuple(1, now, -180)))
+    archived = store.archive_finished(bot.to_epoch(now), count)
+    store.snapshot()
+    store._log.close()
+    restarted = bot.MemoryTaskStore(log_file)
+    restarted.start()
+    next_id = restarted.add(task_tuple(1, now, 60))
+    restarted._log.close()
+    max_archived = conn.execute(f"SELECT MAX(id) FROM {bot.ARCHIVE_SCHEMA}tasks_archive").fetchone()[0]
+    return {"archived": archived, "max_archived_id": max_archived, "next_id": next_id}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=20000, help="tasks seeded before timing")
+    parser.add_argument("--ops", type=int, default=5000, help="operations per workload")
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--due-per-sweep", type=int, default=20)
+    args = parser.parse_args()
+
+    fd, log_file = tempfile.mkstemp(prefix="bench_", suffix=".tasklog")
+    os.close(fd)
+    random.seed(1)
+    results = {kind: run_workloads(kind, log_file, args) for kind in ("sqlite", "memory")}
+    results["restart_after_archive"] = restart_after_archive(log_file)
+    report("task_store", results)
+    for path in (log_file, log_file + ".1"):
+        if os.path.exists(path):
+            os.remove(path)
+    remove_db(DB_FILE)
+    restart = results["restart_after_archive"]
+    if restart["next_id"] <= restart["max_archived_id"]:
+        print(f"❌ task id {restart['next_id']} reused after archive and restart")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
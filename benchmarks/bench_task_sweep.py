@@ -0,0 +1,108 @@
+"""Reminder sweep throughput with thousands of due tasks.
+
+Compares the old per-row loop (send, then open a connection and commit each
+mark) with run_task_sweep(), which moves every due row into the outbox in one
+transaction, timed until the outbox sender has delivered them and committed
+the outcomes in batches. Sends go to a stub with configurable latency and
+failure rate; failed sends are left for their retry and not waited on.
+
+    python benchmarks/bench_task_sweep.py --tasks 1000 5000 --fail-rate 0.01
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import time
+
+from common import remove_db, report, setup_env
+
+DB_FILE = setup_env()
+# The stub has no rate limit; don't let the dispatcher's pacing dominate.
+os.environ.setdefault("TELEGRAM_GLOBAL_RATE", "1000000")
+
+import bot  # noqa: E402
+
+# Only the DB, the send queue and the outbox sender - the reminder checker is
+# left off so it cannot race the timed sweeps.
+bot.init_database()
+bot.outbound.start()
+bot.outbox.start()
+
+
+def seed_due(conn, count):
+    now = datetime.datetime.now(bot.IST)
+    due = bot.to_epoch(now - datetime.timedelta(minutes=1))
+    target = bot.to_epoch(now + datetime.timedelta(minutes=59))
+    later = bot.to_epoch(now + datetime.timedelta(minutes=74))
+    with conn:
+        conn.execute("DELETE FROM tasks")
+        conn.execute("DELETE FROM outbox")
+        conn.executemany(bot.SQL_INSERT_TASK, [
+            (i, f"due task {i}", target, due, later, bot.to_epoch(now), 0) for i in range(count)
+        ])
+
+
+def make_sender(latency, fail_rate):
+    def send_message(chat_id, text, **kwargs):
+        if latency:
+            time.sleep(latency)
+        if fail_rate and random.random() < fail_rate:
+            raise RuntimeError("simulated Telegram error")
+    return send_message
+
+
+def legacy_sweep():
+    sent = 0
+    for task_id, chat_id, task_desc, target_at, _ in bot.get_pending_reminders():
+        try:
+            bot.get_bot().send_message(chat_id, bot._format_task_message("reminder", task_desc, target_at),
+                                       parse_mode="Markdown")
+            conn = sqlite3.connect(DB_FILE)
+            conn.execute(bot.SQL_MARK_REMINDER_SENT, (task_id,))
+            conn.commit()
+            conn.close()
+            sent += 1
+        except Exception:
+            pass
+    return sent
+
+
+def outbox_sweep():
+    bot.run_task_sweep()
+    conn = bot.get_db()
+    # Done once nothing is claimable and every send's outcome is committed.
+    while bot.outbox.inflight() or conn.execute(
+            "SELECT 1 FROM outbox WHERE status = 'pending' AND attempts = 0 LIMIT 1").fetchone():
+        time.sleep(0.005)
+    return conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'sent'").fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per simulated send")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    bot.get_bot().send_message = make_sender(args.latency, args.fail_rate)
+    # Keep the per-row prints out of the timings.
+    bot.print = lambda *a, **k: None
+    conn = bot.get_db()
+    results = {}
+    for count in args.tasks:
+        row = {}
+        for name, sweep in (("per_row_commit", legacy_sweep), ("outbox", outbox_sweep)):
+            seed_due(conn, count)
+            start = time.perf_counter()
+            sent = sweep()
+            elapsed = time.perf_counter() - start
+            row[name] = {"sent": sent, "seconds": round(elapsed, 4),
+                         "tasks_per_sec": round(sent / elapsed, 1) if elapsed else None}
+        results[str(count)] = row
+    report("task_sweep", results)
+    remove_db(DB_FILE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Render cost per meal message for a bulk fan-out.
+
+Compares the old per-send build (rebuild the options and titles dicts, then
+concatenate line by line) with the precompiled templates, and checks that both
+produce the same text.
+
+    python benchmarks/bench_templates.py --subscribers 10000
+"""
+import argparse
+import time
+
+from common import report, setup_env
+
+setup_env()
+
+import bot  # noqa: E402
+
+
+def legacy_render(meal, current_time):
+    options_map = {name: list(items) for name, items in bot.FOOD_OPTIONS.items()}
+    options = options_map.get(meal, ["Options not found"])
+    titles = dict(bot.MEAL_TITLES)
+    message = "*{title}*\n⏰ {time}\n\n".format(title=titles.get(meal, meal), time=current_time)
+    for item in options:
+        message += f"{item}\n"
+    if meal in ["lunch", "dinner"]:
+        message += "\n💡 Walk 5-10 mins after eating for better digestion!"
+    elif meal == "snack":
+        message += "\n💪 This is your challenging time - you've got this!"
+    elif meal == "night_craving":
+        message += "\n✨ Smart choices now = lighter morning tomorrow!"
+    return message
+
+
+def per_slot_fanout(render, meals, subscribers):
+    """Time rendering one slot for every subscriber, as the scheduler does"""
+    results = {}
+    for meal in meals:
+        start = time.perf_counter()
+        for _ in range(subscribers):
+            render(meal, bot.get_ist_display())
+        elapsed = time.perf_counter() - start
+        results[meal] = round(elapsed / subscribers * 1e6, 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=10000)
+    args = parser.parse_args()
+
+    meals = list(bot.FOOD_OPTIONS)
+    stamp = bot.get_ist_display()
+    for meal in meals:
+        assert legacy_render(meal, stamp) == bot.render_meal_message(meal, stamp), meal
+
+    legacy = per_slot_fanout(legacy_render, meals, args.subscribers)
+    templated = per_slot_fanout(bot.render_meal_message, meals, args.subscribers)
+    # The scheduler formats the timestamp once per slot, so this is the real
+    # per-message cost during a fan-out.
+    start = time.perf_counter()
+    for meal in meals:
+        for _ in range(args.subscribers):
+            bot.build_meal_message(0, meal, stamp)
+    shared_stamp = (time.perf_counter() - start) / (args.subscribers * len(meals)) * 1e6
+
+    report("meal_templates", {
+        "subscribers": args.subscribers,
+        "legacy_us_per_message": legacy,
+        "template_us_per_message": templated,
+        "template_shared_timestamp_us_per_message": round(shared_stamp, 3),
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Webhook ingestion under load.
+
+Serves create_app() in webhook mode, points telebot at a fake Telegram API,
+then POSTs /time updates from poster processes over keep-alive connections as
+fast as they are accepted. Reports ack latency for the webhook route (what
+Telegram waits on), accepted updates/s, and end-to-end latency from POST to
+the reply reaching the fake Telegram API. Posters run in their own
+processes so they don't compete with the bot for the GIL.
+
+    python benchmarks/bench_webhook.py --updates 5000 --posters 4 --connections 4
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+from common import remove_db, report, setup_env, summarize
+from fake_telegram import FakeTelegram, make_update
+
+DB_FILE = setup_env()
+SECRET = "bench-secret"
+os.environ.update({
+    "BOT_MODE": "webhook",
+    "WEBHOOK_URL": "https://bench.invalid",
+    "WEBHOOK_SECRET": SECRET,
+    # The fake API doesn't rate limit; don't let our own limiter cap the test.
+    "TELEGRAM_GLOBAL_RATE": "1000000",
+    "TELEGRAM_CHAT_RATE": "1000000",
+    "TELEGRAM_CHAT_BURST": "1000000",
+})
+CHAT_BASE = 10_000
+
+
+def post_updates(port, path, update_ids):
+    """One keep-alive connection; returns (update_id, sent_at, ack_seconds, status) per POST"""
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": SECRET}
+    results = []
+    for update_id in update_ids:
+        body = json.dumps(make_update(update_id, CHAT_BASE + update_id, "/time"))
+        start = time.monotonic()
+        conn.request("POST", path, body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        results.append((update_id, start, time.monotonic() - start, response.status))
+    return results
+
+
+def poster_process(args):
+    port, path, update_ids, connections = args
+    chunks = [update_ids[i::connections] for i in range(connections)]
+    results = [None] * connections
+
+    def run(i):
+        results[i] = post_updates(port, path, chunks[i])
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [row for chunk in results for row in chunk]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--posters", type=int, default=4, help="poster processes")
+    parser.add_argument("--connections", type=int, default=4, help="connections per poster")
+    args = parser.parse_args()
+
+    telegram = FakeTelegram().start()
+    import telebot
+    telebot.apihelper.API_URL = telegram.api_url
+
+    import bot
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    quiet = io.StringIO()
+    with contextlib.redirect_stdout(quiet):
+        bot.start_workers()
+        server = make_server("127.0.0.1", 0, bot.create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    update_ids = list(range(1, args.updates + 1))
+    jobs = [(server.server_port, bot.WEBHOOK_PATH, update_ids[i::args.posters], args.connections)
+            for i in range(args.posters)]
+    with contextlib.redirect_stdout(quiet):
+        with multiprocessing.get_context("fork").Pool(args.posters) as pool:
+            start = time.monotonic()
+            posted = [row for rows in pool.map(poster_process, jobs) for row in rows]
+            ingest_elapsed = time.monotonic() - start
+
+        accepted = sum(1 for row in posted if row[3] == 200)
+        deadline = time.time() + 60
+        while len(telegram.calls_to("sendMessage")) < accepted and time.time() < deadline:
+            time.sleep(0.05)
+
+    # FakeTelegram stamps calls with perf_counter; convert to the monotonic
+    # clock the posters used.
+    offset = time.monotonic() - time.perf_counter()
+    sent_at = {CHAT_BASE + row[0]: row[1] for row in posted}
+    replies = telegram.calls_to("sendMessage")
+    end_to_end = [at + offset - sent_at[int(params["chat_id"])] for at, _, params in replies]
+    results = {
+        "updates": args.updates,
+        "connections": args.posters * args.connections,
+        "accepted": accepted,
+        "rejected_503": sum(1 for row in posted if row[3] == 503),
+        "webhook_ack": summarize([row[2] for row in posted], ingest_elapsed),
+        "replies": len(replies),
+        "end_to_end": summarize(end_to_end, max(end_to_end, default=0) and
+                                max(at for at, _, _ in replies) + offset - start),
+        "webhook_stats": dict(bot.webhook_stats),
+    }
+    report("webhook", results)
+    server.shutdown()
+    telegram.stop()
+    remove_db(DB_FILE)
+    if len(replies) < accepted:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Shared helpers for the benchmark scripts.
+
+Every script imports ``bot`` from the repo root with throwaway credentials and
+a scratch database, so nothing here ever talks to the real Telegram or OpenAI.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_env(db_file=None):
+    """Point the bot at a scratch DB and fake credentials, then return the DB path"""
+    if db_file is None:
+        fd, db_file = tempfile.mkstemp(prefix="bench_", suffix=".db")
+        os.close(fd)
+        os.remove(db_file)
+    os.environ["DB_FILE"] = db_file
+    os.environ.setdefault("TELEGRAM_TOKEN", "123456:bench-token")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    return db_file
+
+
+def remove_db(db_file):
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(db_file + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def summarize(samples, elapsed=None):
+    """Latency summary in milliseconds for a list of per-call durations in seconds"""
+    result = {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 4),
+        "p95_ms": round(percentile(samples, 95) * 1000, 4),
+        "p99_ms": round(percentile(samples, 99) * 1000, 4),
+        "max_ms": round(max(samples) * 1000, 4) if samples else 0.0,
+    }
+    if elapsed:
+        result["ops_per_sec"] = round(len(samples) / elapsed, 1)
+    return result
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def wait_for_quiet(bot, telegram, quiet_seconds=0.5, timeout=120):
+    """Wait until nothing is queued and Telegram saw no call for quiet_seconds; returns the last call time"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with telegram._lock:
+            last = telegram.calls[-1][0] if telegram.calls else 0.0
+        busy = (bot.chat_dispatcher.queue_depth() or bot.outbound.queue_depth() or bot.outbox.inflight()
+                or bot.count_outbox_pending())
+        if not busy and time.perf_counter() - last >= quiet_seconds:
+            return last
+        time.sleep(0.05)
+    return None
+
+
+def report(name, results):
+    """Print the results; run_all.py also collects them from BENCH_OUTPUT as JSON lines"""
+    print(json.dumps({"benchmark": name, "results": results}, indent=2, ensure_ascii=False))
+    output = os.getenv("BENCH_OUTPUT")
+    if output:
+        with open(output, "a") as f:
+            f.write(json.dumps({"benchmark": name, "results": results}, ensure_ascii=False) + "\n")
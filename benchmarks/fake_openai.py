@@ -0,0 +1,155 @@
+"""A local stand-in for the OpenAI chat completions API.
+
+Answers POST /v1/chat/completions with a canned reply, either as one JSON
+body or as a server-sent event stream, after a configurable time-to-first-
+token and per-token delay, and POST /v1/audio/transcriptions with a canned
+transcript after transcribe_delay. With error_rate set, that fraction of requests
+gets a 429 or 500 error body instead (the SDK retries those itself). Point
+the bot at it with OPENAI_BASE_URL.
+
+    server = FakeOpenAI(ttft=0.4, token_delay=0.02).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "Have *2 multigrain rotis* with 1 cup of dal and a palm-sized portion of paneer. "
+    "Skip the ghee on top, fill half the plate with salad, and drink water 30 minutes "
+    "after the meal rather than with it. If you're still hungry, add cucumber, not a third roti. "
+) * 3
+DEFAULT_TRANSCRIPT = "mujhe dinner mein kya khana chahiye, I had poha for breakfast"
+
+
+class FakeOpenAI:
+    def __init__(self, reply=DEFAULT_REPLY, ttft=0.4, token_delay=0.02, port=0,
+                 error_rate=0.0, error_codes=(429, 500), transcript=DEFAULT_TRANSCRIPT,
+                 transcribe_delay=0.5):
+        self.reply = reply
+        self.transcript = transcript
+        self.transcribe_delay = transcribe_delay
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.error_codes = error_codes
+        self.requests = []
+        self.errors = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:%d/v1" % self._server.server_address[1]
+
+    def tokens(self):
+        """The reply split roughly the way the API streams it: one word per chunk"""
+        words = self.reply.split(" ")
+        return [w + (" " if i < len(words) - 1 else "") for i, w in enumerate(words)]
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                transcription = self.path.endswith("/audio/transcriptions")
+                if not transcription and not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                # Transcriptions are multipart uploads; only record their size.
+                body = {"audio_bytes": len(raw)} if transcription else json.loads(raw or b"{}")
+                fake.requests.append(body)
+                if fake.error_rate and random.random() < fake.error_rate:
+                    fake.errors += 1
+                    self._error(random.choice(fake.error_codes))
+                    return
+                if transcription:
+                    self._transcribe()
+                    return
+                time.sleep(fake.ttft)
+                if body.get("stream"):
+                    self._stream(body)
+                else:
+                    self._complete(body)
+
+            def _complete(self, body):
+                tokens = fake.tokens()
+                time.sleep(fake.token_delay * len(tokens))
+                payload = json.dumps({
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": fake.reply}}],
+                    "usage": {"prompt_tokens": 600, "completion_tokens": len(tokens),
+                              "total_tokens": 600 + len(tokens)},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _transcribe(self):
+                time.sleep(fake.transcribe_delay)
+                payload = fake.transcript.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _error(self, code):
+                kind = "rate_limit_exceeded" if code == 429 else "server_error"
+                payload = json.dumps({"error": {"message": f"Fake {code}", "type": kind,
+                                                "code": kind}}).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if code == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, body):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def chunk(delta, finish_reason=None):
+                    return {"id": "chatcmpl-fake", "object": "chat.completion.chunk",
+                            "created": int(time.time()), "model": body.get("model", "fake"),
+                            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+                events = [chunk({"role": "assistant", "content": ""})]
+                events += [chunk({"content": token}) for token in fake.tokens()]
+                events.append(chunk({}, "stop"))
+                for i, event in enumerate(events):
+                    if i > 1:
+                        time.sleep(fake.token_delay)
+                    self._write(b"data: " + json.dumps(event).encode("utf-8") + b"\n\n")
+                self._write(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+            def _write(self, data):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,164 @@
+"""A local stand-in for the Telegram Bot API.
+
+Answers POST /bot<token>/<method> like Telegram would for the methods the
+bot uses, serves voice note downloads from /file/bot<token>/<path>, and
+records every call with a timestamp. With error_rate set, that
+fraction of calls is refused with a 429 (retry_after seconds) or a 500, the
+way Telegram refuses them under load. Point telebot at it with
+
+    server = FakeTelegram().start()
+    telebot.apihelper.API_URL = server.api_url
+    telebot.apihelper.FILE_URL = server.file_url
+
+make_update() and make_voice_update() build the JSON body Telegram would
+POST to a webhook.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def make_update(update_id, chat_id, text, message_id=None):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": message_id or update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "Load"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Load"},
+            "text": text,
+        },
+    }
+
+
+def make_voice_update(update_id, chat_id, duration=5, file_unique_id=None, message_id=None):
+    file_unique_id = file_unique_id or f"voice{update_id}"
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": message_id or update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "Load"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Load"},
+            "voice": {"file_id": f"file-{file_unique_id}", "file_unique_id": file_unique_id,
+                      "duration": duration, "mime_type": "audio/ogg", "file_size": duration * 2000},
+        },
+    }
+
+
+class FakeTelegram:
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, error_codes=(429,), retry_after=1):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_codes = error_codes
+        self.retry_after = retry_after
+        self.calls = []
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._message_ids = iter(range(1, 10 ** 12))
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def api_url(self):
+        return "http://127.0.0.1:%d/bot{0}/{1}" % self._server.server_address[1]
+
+    @property
+    def file_url(self):
+        return "http://127.0.0.1:%d/file/bot{0}/{1}" % self._server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def calls_to(self, method):
+        with self._lock:
+            return [call for call in self.calls if call[1] == method]
+
+    def _result(self, method, params):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        if method in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id", 0))
+            with self._lock:
+                message_id = int(params.get("message_id") or next(self._message_ids))
+            return {"message_id": message_id, "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", "")}
+        if method == "getFile":
+            file_id = params.get("file_id", "")
+            return {"file_id": file_id, "file_unique_id": file_id.replace("file-", "", 1),
+                    "file_size": 10000, "file_path": f"voice/{file_id}.oga"}
+        return True
+
+    def _error(self):
+        """An error response body for this call, or None to answer normally"""
+        if not self.error_rate or random.random() >= self.error_rate:
+            return None
+        code = random.choice(self.error_codes)
+        with self._lock:
+            self.errors += 1
+        if code == 429:
+            return code, {"ok": False, "error_code": 429,
+                          "description": f"Too Many Requests: retry after {self.retry_after}",
+                          "parameters": {"retry_after": self.retry_after}}
+        return code, {"ok": False, "error_code": code, "description": "Internal Server Error"}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if not self.path.startswith("/file/"):
+                    self.do_POST()
+                    return
+                if fake.latency:
+                    time.sleep(fake.latency)
+                with fake._lock:
+                    fake.calls.append((time.perf_counter(), "download", {"path": self.path}))
+                payload = b"OggS" + b"\0" * 10000
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                # telebot sends parameters in the query string; accept form
+                # and JSON bodies too.
+                url = urlsplit(self.path)
+                method = url.path.rsplit("/", 1)[-1]
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    params.update(json.loads(raw or "{}"))
+                elif raw:
+                    params.update({k: v[0] for k, v in parse_qs(raw).items()})
+                if fake.latency:
+                    time.sleep(fake.latency)
+                error = fake._error()
+                if error:
+                    status, body = error
+                else:
+                    with fake._lock:
+                        fake.calls.append((time.perf_counter(), method, params))
+                    status, body = 200, {"ok": True, "result": fake._result(method, params)}
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
@@ -0,0 +1,286 @@
+"""Replay recorded Telegram updates, or generate synthetic ones, through the bot.
+
+Updates go through the same dispatch path as long polling: telebot's
+process_new_updates, whose handlers queue text for handle_all_messages and
+voice notes for handle_voice on the bot's chat dispatcher. Telegram and OpenAI are the local
+fakes in this directory. Latency is measured from ingress (the moment the
+update is handed to telebot) to the first outbound sendMessage for that
+chat ("first_reply") and to the last Telegram call it caused ("complete",
+which covers streamed edits and the voice round trip). It is split by
+command and by path (command, reminder, workout, llm, voice).
+
+Recorded files are JSON lines, each either a raw Telegram update (timed by
+message.date) or {"at": seconds, "update": {...}}. --speed 1 replays at the
+recorded pace, --speed 10 ten times faster, --speed 0 as fast as possible.
+--users/--rate/--duration add Poisson-timed synthetic traffic from that many
+chats, and --record saves the merged stream for an exact re-run.
+
+    python benchmarks/replay.py --file updates.jsonl --speed 5
+    python benchmarks/replay.py --users 500 --rate 20 --duration 30 --mix command=4,reminder=2,llm=3,voice=1
+    python benchmarks/replay.py --users 200 --rate 10 --duration 20 --record load.jsonl
+
+Calls are attributed to the chat's latest update at the time they are made,
+so when a chat sends again before its previous reply lands the earlier
+update's tail is counted against the newer one; "overlapping" reports how
+often that happened.
+"""
+import argparse
+import collections
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+from common import remove_db, report, setup_env, summarize, wait_for_quiet
+from fake_openai import FakeOpenAI
+from fake_telegram import FakeTelegram, make_update, make_voice_update
+
+DB_FILE = setup_env()
+os.environ.setdefault("TELEGRAM_GLOBAL_RATE", "1000000")
+os.environ.setdefault("TELEGRAM_CHAT_RATE", "1000000")
+os.environ.setdefault("TELEGRAM_CHAT_BURST", "1000000")
+
+CHAT_BASE = 20_000
+PATHS = ("command", "reminder", "workout", "llm", "voice")
+COMMANDS = ["/start", "/time", "/tasks", "/status", "/usage"]
+REMINDERS = [
+    "Remind me to drink water at 5 PM tomorrow",
+    "Remind me to call the dietician tomorrow at 10 AM",
+    "remember to buy oats on December 5 at 3 PM",
+    "Remind me to take vitamin D in 3 hours",
+]
+QUESTIONS = [
+    "What should I eat after a {n} minute evening walk if dinner was rajma chawal?",
+    "Is {n} grams of paneer too much for a late dinner?",
+    "How many almonds can I have if I skipped {n} minutes of cardio?",
+]
+
+
+def classify(bot, update):
+    """(path, command label) for an update, the way the bot will route it (see bot.chat_lane)"""
+    message = update.get("message") or {}
+    if "voice" in message:
+        return "voice", "voice"
+    text = (message.get("text") or "").strip()
+    lower = text.lower()
+    if text.startswith("/"):
+        return "command", text.split()[0]
+    if lower in bot.WORKOUT_KEYWORDS:
+        return "workout", "workout"
+    if any(trigger in lower for trigger in bot.REMINDER_TRIGGERS):
+        return "reminder", "reminder"
+    return "llm", "chat"
+
+
+def load_recorded(path):
+    """[(offset seconds, update)] from a JSONL file, offsets relative to the first update"""
+    rows = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if "update" in row:
+                rows.append((float(row.get("at", 0)), row["update"]))
+            else:
+                rows.append((float((row.get("message") or {}).get("date", 0)), row))
+    rows.sort(key=lambda row: row[0])
+    first = rows[0][0] if rows else 0.0
+    return [(at - first, update) for at, update in rows]
+
+
+def synthesize(users, rate, duration, weights, first_update_id):
+    """Poisson arrivals at `rate` updates/s for `duration` seconds from `users` chats"""
+    rows = []
+    at = 0.0
+    update_id = first_update_id
+    paths = list(weights)
+    while True:
+        at += random.expovariate(rate)
+        if at >= duration:
+            return rows
+        update_id += 1
+        chat_id = CHAT_BASE + random.randrange(users)
+        path = random.choices(paths, weights=[weights[p] for p in paths])[0]
+        if path == "voice":
+            update = make_voice_update(update_id, chat_id, duration=random.randint(2, 20))
+        elif path == "command":
+            update = make_update(update_id, chat_id, random.choice(COMMANDS))
+        elif path == "reminder":
+            update = make_update(update_id, chat_id, random.choice(REMINDERS))
+        elif path == "workout":
+            update = make_update(update_id, chat_id, "workout done")
+        else:
+            update = make_update(update_id, chat_id, random.choice(QUESTIONS).format(n=random.randint(10, 300)))
+        rows.append((at, update))
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        path, _, weight = part.partition("=")
+        if path not in PATHS:
+            raise SystemExit(f"unknown path in --mix: {path} (expected one of {', '.join(PATHS)})")
+        weights[path] = float(weight or 1)
+    return weights
+
+
+def attribute(ingress, calls):
+    """Per update: (first sendMessage, last call) offsets from ingress, or None if it got no reply"""
+    by_chat = collections.defaultdict(list)
+    for update_id, chat_id, at in ingress:
+        by_chat[chat_id].append((at, update_id))
+    first_reply, last_call = {}, {}
+    for at, method, params in calls:
+        if method == "download":
+            continue
+        try:
+            chat_id = int(params.get("chat_id"))
+        except (TypeError, ValueError):
+            continue
+        owner = None
+        for ingress_at, update_id in by_chat.get(chat_id, ()):
+            if ingress_at > at:
+                break
+            owner = (ingress_at, update_id)
+        if owner is None:
+            continue
+        ingress_at, update_id = owner
+        if method == "sendMessage" and update_id not in first_reply:
+            first_reply[update_id] = at - ingress_at
+        last_call[update_id] = at - ingress_at
+    return first_reply, last_call
+
+
+def overlapping(ingress, first_reply):
+    """Updates that arrived while the same chat's previous update had no reply yet"""
+    count = 0
+    previous = {}
+    for update_id, chat_id, at in ingress:
+        before = previous.get(chat_id)
+        if before is not None:
+            before_id, before_at = before
+            replied_at = first_reply.get(before_id)
+            if replied_at is None or before_at + replied_at > at:
+                count += 1
+        previous[chat_id] = (update_id, at)
+    return count
+
+
+def split(samples_by_key):
+    return {key: summarize(samples) for key, samples in sorted(samples_by_key.items())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--file", help="JSONL of recorded updates to replay")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = recorded pace, N = N times faster, 0 = no waits")
+    parser.add_argument("--users", type=int, default=0, help="synthetic chats (0 = no synthetic load)")
+    parser.add_argument("--rate", type=float, default=10.0, help="synthetic updates per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of synthetic traffic")
+    parser.add_argument("--mix", default="command=4,reminder=2,workout=1,llm=3,voice=1")
+    parser.add_argument("--record", help="write the merged update stream here as JSONL")
+    parser.add_argument("--telegram-latency", type=float, default=0.03, help="seconds per fake Telegram call")
+    parser.add_argument("--telegram-error-rate", type=float, default=0.0)
+    parser.add_argument("--ttft", type=float, default=0.4, help="fake OpenAI time to first token, seconds")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="fake OpenAI delay per token, seconds")
+    parser.add_argument("--transcribe-delay", type=float, default=0.8, help="fake Whisper time, seconds")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+    if not args.file and not args.users:
+        parser.error("give --file, --users or both")
+    random.seed(args.seed)
+
+    stream = load_recorded(args.file) if args.file else []
+    if args.users:
+        last_id = max((u.get("update_id", 0) for _, u in stream), default=0)
+        stream += synthesize(args.users, args.rate, args.duration, parse_mix(args.mix), last_id)
+        stream.sort(key=lambda row: row[0])
+    if args.record:
+        with open(args.record, "w") as f:
+            for at, update in stream:
+                f.write(json.dumps({"at": round(at, 4), "update": update}) + "\n")
+
+    telegram = FakeTelegram(latency=args.telegram_latency, error_rate=args.telegram_error_rate,
+                            error_codes=(429, 500), retry_after=0).start()
+    openai = FakeOpenAI(ttft=args.ttft, token_delay=args.token_delay, transcribe_delay=args.transcribe_delay,
+                        error_rate=args.openai_error_rate).start()
+    os.environ["OPENAI_BASE_URL"] = openai.base_url
+    import telebot
+    telebot.apihelper.API_URL = telegram.api_url
+    telebot.apihelper.FILE_URL = telegram.file_url
+
+    import bot
+    quiet = io.StringIO()
+    with contextlib.redirect_stdout(quiet):
+        bot.init_database()
+        bot.task_store.start()
+        bot.outbound.start()
+        bot.outbox.start()
+        bot.chat_dispatcher.start()
+        dispatcher = bot.get_bot()
+
+        ingress = []
+        start = time.perf_counter()
+        for at, update in stream:
+            if args.speed:
+                delay = start + at / args.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            parsed = telebot.types.Update.de_json(update)
+            ingress.append((update["update_id"], update["message"]["chat"]["id"], time.perf_counter()))
+            dispatcher.process_new_updates([parsed])
+        fed = time.perf_counter() - start
+        last = wait_for_quiet(bot, telegram, quiet_seconds=2.0, timeout=600)
+
+    with telegram._lock:
+        calls = list(telegram.calls)
+    first_reply, last_call = attribute(ingress, calls)
+    by_path = {"first_reply": collections.defaultdict(list), "complete": collections.defaultdict(list)}
+    by_command = {"first_reply": collections.defaultdict(list), "complete": collections.defaultdict(list)}
+    unanswered = collections.Counter()
+    for at, update in stream:
+        path, command = classify(bot, update)
+        update_id = update["update_id"]
+        if update_id not in first_reply:
+            unanswered[path] += 1
+            continue
+        by_path["first_reply"][path].append(first_reply[update_id])
+        by_path["complete"][path].append(last_call[update_id])
+        by_command["first_reply"][command].append(first_reply[update_id])
+        by_command["complete"][command].append(last_call[update_id])
+
+    results = {
+        "source": {"file": args.file, "synthetic_users": args.users, "speed": args.speed},
+        "updates": len(stream),
+        "fed_seconds": round(fed, 2),
+        "drained_seconds": round(last - start, 2) if last else None,
+        "updates_per_sec": round(len(stream) / (last - start), 1) if last and last > start else None,
+        "first_reply_by_path": split(by_path["first_reply"]),
+        "complete_by_path": split(by_path["complete"]),
+        "first_reply_by_command": split(by_command["first_reply"]),
+        "complete_by_command": split(by_command["complete"]),
+        "unanswered": dict(unanswered),
+        "overlapping": overlapping(ingress, first_reply),
+        "telegram_calls": len(calls),
+        "telegram_errors_injected": telegram.errors,
+        "openai_requests": len(openai.requests),
+        "openai_errors_injected": openai.errors,
+        "dispatcher": dict(bot.outbound.counters),
+        "chat_dispatcher": bot.chat_dispatcher.stats(),
+    }
+    report("replay", results)
+    telegram.stop()
+    openai.stop()
+    remove_db(DB_FILE)
+    if last is None:
+        print("❌ the bot never went quiet; replies were still being sent at the timeout")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
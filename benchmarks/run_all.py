@@ -0,0 +1,170 @@
+"""Run the benchmark suite and save every result as one JSON file per commit.
+
+Each script runs in its own process with a scratch database and the fake
+Telegram/OpenAI servers where it needs them; their report() output is
+collected into benchmarks/results/<commit>.json along with the commit, the
+Python version and the wall time of each script. --compare prints the
+latency and throughput figures that moved between two result files.
+
+    python benchmarks/run_all.py                      # quick sizes, all scripts
+    python benchmarks/run_all.py --full               # each script's own defaults
+    python benchmarks/run_all.py --only handlers db
+    python benchmarks/run_all.py --compare results/abc1234.json results/def5678.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# Script -> arguments for the quick run; --full drops them.
+SUITE = {
+    "bench_handlers.py": ["--messages", "1000"],
+    "bench_parser.py": ["--rounds", "5"],
+    "bench_templates.py": ["--subscribers", "2000"],
+    "bench_db.py": ["--seconds", "1"],
+    "bench_indexes.py": ["--sizes", "10000", "100000"],
+    "bench_conversation.py": ["--turns", "100", "10000"],
+    "bench_task_sweep.py": ["--tasks", "1000"],
+    "bench_task_store.py": ["--tasks", "5000", "--ops", "2000"],
+    "bench_archive.py": ["--history", "20000"],
+    "bench_streaming.py": ["--runs", "3"],
+    "bench_webhook.py": ["--updates", "2000"],
+    "bench_ping.py": ["--seconds", "5", "--tasks", "10000"],
+    "bench_startup.py": ["--runs", "3"],
+    "sim_scheduler_day.py": [],
+    "sim_outbox_restart.py": ["--chats", "1000"],
+    "sim_migrate_legacy_db.py": ["--rows", "20000"],
+    "replay.py": ["--users", "50", "--rate", "1", "--duration", "15"],
+}
+# Leaf keys worth comparing between runs, and whether bigger is better.
+COMPARED = {"_ms": False, "_seconds": False, "per_sec": True}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_script(script, extra, timeout):
+    fd, output = tempfile.mkstemp(prefix="bench_", suffix=".jsonl")
+    os.close(fd)
+    started = time.perf_counter()
+    try:
+        proc = subprocess.run([sys.executable, os.path.join(HERE, script)] + extra, cwd=HERE,
+                              env=dict(os.environ, BENCH_OUTPUT=output), capture_output=True,
+                              text=True, timeout=timeout)
+        status, tail = proc.returncode, proc.stdout[-2000:] + proc.stderr[-2000:]
+    except subprocess.TimeoutExpired:
+        status, tail = "timeout", ""
+    with open(output) as f:
+        reports = [json.loads(line) for line in f if line.strip()]
+    os.remove(output)
+    entry = {"args": extra, "status": status, "seconds": round(time.perf_counter() - started, 2),
+             "reports": reports}
+    if status != 0:
+        entry["output_tail"] = tail
+    return entry
+
+
+def flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, child in value.items():
+            yield from flatten(child, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, list):
+        for i, child in enumerate(value):
+            yield from flatten(child, f"{prefix}[{i}]")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def metrics(result_file):
+    with open(result_file) as f:
+        data = json.load(f)
+    found = {}
+    for script, entry in data["scripts"].items():
+        for i, rep in enumerate(entry["reports"]):
+            name = rep["benchmark"] if i == 0 else f"{rep['benchmark']}#{i}"
+            for path, value in flatten(rep["results"]):
+                for suffix, higher_better in COMPARED.items():
+                    if path.endswith(suffix):
+                        found[f"{name}:{path}"] = (value, higher_better)
+    return data.get("commit"), found
+
+
+def compare(old_file, new_file, threshold):
+    old_commit, old = metrics(old_file)
+    new_commit, new = metrics(new_file)
+    print(f"{old_commit} -> {new_commit}, showing changes over {threshold:.0%}")
+    for key in sorted(old.keys() & new.keys()):
+        (before, higher_better), (after, _) = old[key], new[key]
+        if not before:
+            continue
+        change = (after - before) / before
+        if abs(change) < threshold:
+            continue
+        better = (change > 0) == higher_better
+        print(f"{'✅' if better else '⚠️'} {key}: {before} -> {after} ({change:+.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", metavar="NAME",
+                        help="scripts to run, e.g. handlers, replay.py or bench_db.py")
+    parser.add_argument("--full", action="store_true", help="use each script's default sizes")
+    parser.add_argument("--out", help="result file (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--timeout", type=float, default=1800, help="seconds allowed per script")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two result files and exit")
+    parser.add_argument("--threshold", type=float, default=0.1, help="smallest relative change --compare shows")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare, args.threshold)
+        return
+
+    scripts = list(SUITE)
+    if args.only:
+        scripts = [s for s in scripts if any(
+            s in (name, f"bench_{name}.py", f"sim_{name}.py") for name in args.only)]
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "mode": "full" if args.full else "quick",
+        "scripts": {},
+    }
+    failed = []
+    for script in scripts:
+        print(f"▶️ {script}", flush=True)
+        entry = run_script(script, [] if args.full else SUITE[script], args.timeout)
+        results["scripts"][script] = entry
+        mark = "✅" if entry["status"] == 0 else "❌"
+        print(f"{mark} {script} in {entry['seconds']}s", flush=True)
+        if entry["status"] != 0:
+            failed.append(script)
+
+    out = args.out or os.path.join(HERE, "results", f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"📄 Results written to {out}")
+    if failed:
+        print(f"❌ Failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
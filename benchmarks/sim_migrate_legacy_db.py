@@ -0,0 +1,166 @@
+"""Upgrade a pre-migration tasks database in place and check nothing was lost.
+
+Builds a tasks table in the old layout (ISO-8601 text times, with IST, UTC
+and naive values mixed in, plus the retired claim/retry columns), deletes the
+newest rows so the AUTOINCREMENT counter is ahead of MAX(id), then runs
+bot.init_database() on it. Checks every row converted to the right epoch
+second, ids and the id counter survived, the sweep queries use their indexes
+and a second start applies nothing. Also times the old text sweep query
+against the new integer one on the same data. Exits non-zero on any mismatch.
+
+    python benchmarks/sim_migrate_legacy_db.py --rows 200000
+"""
+import argparse
+import datetime
+import random
+import sqlite3
+import sys
+import time
+
+from common import remove_db, report, setup_env, summarize
+
+DB_FILE = setup_env()
+
+import bot  # noqa: E402
+
+LEGACY_SCHEMA = '''
+    CREATE TABLE tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        task_description TEXT NOT NULL,
+        target_datetime TEXT NOT NULL,
+        reminder_datetime TEXT NOT NULL,
+        followup_datetime TEXT NOT NULL,
+        reminder_sent BOOLEAN DEFAULT 0,
+        followup_sent BOOLEAN DEFAULT 0,
+        completed BOOLEAN DEFAULT 0,
+        created_at TEXT NOT NULL,
+        claim_token TEXT,
+        send_attempts INTEGER DEFAULT 0,
+        retry_at TEXT
+    )
+'''
+LEGACY_SWEEP = '''
+    SELECT id, chat_id, task_description, target_datetime, reminder_datetime
+    FROM tasks
+    WHERE reminder_sent = 0 AND reminder_datetime <= ? AND completed = 0
+'''
+LEGACY_INDEX = '''
+    CREATE INDEX idx_tasks_reminder_due ON tasks (reminder_datetime)
+    WHERE reminder_sent = 0 AND completed = 0
+'''
+
+
+def check(name, condition, detail=""):
+    if not condition:
+        print(f"❌ {name}: {detail}")
+        sys.exit(1)
+
+
+def as_text(dt, style):
+    """An ISO string the way some past version of the bot might have written it"""
+    if style == "utc":
+        return dt.astimezone(datetime.timezone.utc).isoformat()
+    if style == "naive":
+        return dt.replace(tzinfo=None).isoformat()
+    return dt.isoformat()
+
+
+def build_legacy_db(rows, deleted):
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute(LEGACY_SCHEMA)
+    conn.execute(LEGACY_INDEX)
+    now = datetime.datetime.now(bot.IST).replace(microsecond=0)
+    expected = {}
+    batch = []
+    for task_id in range(1, rows + 1):
+        target = now + datetime.timedelta(minutes=random.randint(-60 * 24 * 30, 60 * 24 * 30))
+        style = random.choice(("ist", "ist", "utc", "naive"))
+        times = (target, target - datetime.timedelta(hours=1), target + datetime.timedelta(minutes=15),
+                 now - datetime.timedelta(days=1))
+        done = target < now
+        batch.append((task_id, task_id % 500, f"legacy task {task_id}") +
+                     tuple(as_text(t, style) for t in times) + (int(done), int(done), int(done)))
+        expected[task_id] = tuple(int(t.timestamp()) for t in times)
+    conn.executemany('''
+        INSERT INTO tasks (id, chat_id, task_description, target_datetime, reminder_datetime,
+                           followup_datetime, created_at, reminder_sent, followup_sent, completed)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', batch)
+    conn.execute("DELETE FROM tasks WHERE id > ?", (rows - deleted,))
+    conn.commit()
+    for task_id in range(rows - deleted + 1, rows + 1):
+        del expected[task_id]
+
+    now_text = now.isoformat()
+    legacy_sweep = [timed(conn, LEGACY_SWEEP, (now_text,)) for _ in range(50)]
+    legacy_due = len(conn.execute(LEGACY_SWEEP, (now_text,)).fetchall())
+    conn.close()
+    return expected, legacy_sweep, legacy_due, now
+
+
+def timed(conn, sql, params):
+    start = time.perf_counter()
+    conn.execute(sql, params).fetchall()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--deleted", type=int, default=25, help="newest rows deleted before upgrading")
+    args = parser.parse_args()
+    random.seed(7)
+
+    expected, legacy_sweep, legacy_due, now = build_legacy_db(args.rows, args.deleted)
+
+    start = time.perf_counter()
+    bot.init_database()
+    migrate_seconds = time.perf_counter() - start
+
+    conn = bot.get_db()
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(tasks)")]
+    retired = {"claim_token", "send_attempts", "retry_at"} & set(columns)
+    check("retired columns dropped", not retired, sorted(retired))
+    check("columns", columns == ["id", "chat_id", "task_description", "target_at", "reminder_at",
+                                 "followup_at", "reminder_sent", "followup_sent", "completed",
+                                 "created_at"], columns)
+    got = {row[0]: row[1:] for row in conn.execute(
+        "SELECT id, target_at, reminder_at, followup_at, created_at FROM tasks")}
+    check("row count", len(got) == len(expected), f"{len(got)} != {len(expected)}")
+    wrong = [task_id for task_id, times in expected.items() if got.get(task_id) != times]
+    check("converted times", not wrong, f"{len(wrong)} rows differ, e.g. {wrong[:5]}")
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'").fetchone()[0]
+    check("id counter kept", seq == args.rows, f"seq {seq}, expected {args.rows}")
+    version = conn.execute(bot.SQL_SCHEMA_VERSION).fetchone()[0]
+    check("schema version", version == bot.MIGRATIONS[-1][0], version)
+
+    for name, index in (("SQL_PENDING_REMINDERS", "idx_tasks_reminder_due"),
+                        ("SQL_PENDING_FOLLOWUPS", "idx_tasks_followup_due"),
+                        ("SQL_USER_TASKS_PENDING", "idx_tasks_chat")):
+        sql = getattr(bot, name)
+        plan = " | ".join(row[3] for row in conn.execute(
+            "EXPLAIN QUERY PLAN " + sql, (0,) * sql.count("?")))
+        check(f"{name} plan", index in plan, plan)
+
+    before = conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0]
+    bot.run_migrations(conn)
+    check("second start is a no-op",
+          conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == before)
+
+    now_epoch = bot.to_epoch(now)
+    epoch_sweep = [timed(conn, bot.SQL_PENDING_REMINDERS, (now_epoch,)) for _ in range(50)]
+    report("migrate_legacy_db", {
+        "rows": len(expected),
+        "migrate_seconds": round(migrate_seconds, 3),
+        "reminder_sweep_text": summarize(legacy_sweep),
+        "reminder_sweep_epoch": summarize(epoch_sweep),
+        # Text comparison mis-orders UTC and naive strings against IST ones.
+        "due_rows_text_compare": legacy_due,
+        "due_rows_epoch_compare": len(conn.execute(bot.SQL_PENDING_REMINDERS, (now_epoch,)).fetchall()),
+    })
+    remove_db(DB_FILE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Kill the bot mid fan-out and check the outbox picks up where it left off.
+
+A child process subscribes --chats chats, queues one meal slot for all of
+them and starts sending to a stub that logs each delivery to a file. The
+parent SIGKILLs it part-way through, then starts a second child on the same
+database that re-queues the same slot (as the scheduler would after a
+restart) and drains the outbox. Every chat must end up with the message; the
+only repeats allowed are sends that were in flight at the moment of the kill,
+so there can be no more of them than the sender keeps claimed at once
+(OUTBOX_MAX_INFLIGHT, and at most an outbox batch per send worker). Exits
+non-zero on a lost message or on more repeats than that.
+
+    python benchmarks/sim_outbox_restart.py --chats 2000 --kill-after 0.4
+"""
+import argparse
+import collections
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import remove_db, report, setup_env
+
+MEAL = "lunch"
+
+
+def child(db_file, log_file, chats, latency, subscribe):
+    # The stub has no rate limit; don't let the dispatcher's pacing dominate.
+    os.environ.setdefault("TELEGRAM_GLOBAL_RATE", "1000000")
+    setup_env(db_file)
+    import bot
+
+    bot.print = lambda *a, **k: None
+    bot.init_database()
+    if subscribe:
+        for chat_id in range(1, chats + 1):
+            bot.subscribe_chat(chat_id)
+
+    log = open(log_file, "a", buffering=1)
+
+    def send_message(chat_id, text, **kwargs):
+        if latency:
+            time.sleep(latency)
+        log.write(f"{chat_id}\n")
+
+    bot.get_bot().send_message = send_message
+    bot.outbound.start()
+    bot.outbox.start()
+    started = time.perf_counter()
+    fire_at = bot.slot_datetime(bot.get_ist_time().replace(year=2026, month=3, day=10),
+                                bot.meal_schedule[MEAL])
+    queued, total = bot.send_meal_to_subscribers(MEAL, fire_at)
+    while bot.outbox.inflight() or bot.count_outbox_pending():
+        time.sleep(0.01)
+    sys.__stdout__.write(json.dumps({
+        "queued": queued, "total": total, "drain_seconds": round(time.perf_counter() - started, 3),
+        "inflight_window": min(bot.OUTBOX_MAX_INFLIGHT, bot.OUTBOX_BATCH_SIZE * bot.SEND_WORKERS),
+    }) + "\n")
+
+
+def run_child(db_file, log_file, args, subscribe):
+    return subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--child", "--db", db_file, "--log", log_file,
+         "--chats", str(args.chats), "--latency", str(args.latency)] + (["--subscribe"] if subscribe else []),
+        stdout=subprocess.PIPE, text=True)
+
+
+def deliveries(log_file):
+    with open(log_file) as f:
+        return collections.Counter(int(line) for line in f if line.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.001, help="seconds per simulated send")
+    parser.add_argument("--kill-after", type=float, default=0.4,
+                        help="fraction of chats delivered before the first process is killed")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--subscribe", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--log", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.db, args.log, args.chats, args.latency, args.subscribe)
+        return
+
+    db_file = setup_env()
+    fd, log_file = tempfile.mkstemp(prefix="outbox_", suffix=".log")
+    os.close(fd)
+
+    first = run_child(db_file, log_file, args, subscribe=True)
+    while sum(deliveries(log_file).values()) < args.chats * args.kill_after:
+        if first.poll() is not None:
+            print("❌ first process finished before it could be killed; raise --chats or --latency")
+            sys.exit(1)
+        time.sleep(0.005)
+    first.send_signal(signal.SIGKILL)
+    first.wait()
+    before_restart = deliveries(log_file)
+
+    second = run_child(db_file, log_file, args, subscribe=False)
+    out, _ = second.communicate(timeout=600)
+    restart = json.loads(out.strip().splitlines()[-1])
+    delivered = deliveries(log_file)
+
+    missing = [chat_id for chat_id in range(1, args.chats + 1) if chat_id not in delivered]
+    repeats = {chat_id: count for chat_id, count in delivered.items() if count > 1}
+    extra_sends = sum(count - 1 for count in repeats.values())
+    report("outbox_restart", {
+        "chats": args.chats,
+        "delivered_before_kill": sum(before_restart.values()),
+        "requeued_after_restart": restart["queued"],
+        "delivered_total": sum(delivered.values()),
+        "missing": len(missing),
+        "repeated": len(repeats),
+        "extra_sends": extra_sends,
+        "inflight_window": restart["inflight_window"],
+        "restart_drain_seconds": restart["drain_seconds"],
+    })
+    os.remove(log_file)
+    remove_db(db_file)
+    if missing:
+        print(f"❌ {len(missing)} chats never got {MEAL}, e.g. {missing[:10]}")
+        sys.exit(1)
+    if extra_sends > restart["inflight_window"]:
+        print(f"❌ {extra_sends} repeated sends, more than the {restart['inflight_window']} that can be in flight")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
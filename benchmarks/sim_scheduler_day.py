@@ -0,0 +1,141 @@
+"""Run the meal scheduler through whole simulated days in milliseconds.
+
+bot.scheduler() takes an injectable clock; SimulatedClock jumps straight to
+each wake-up time instead of sleeping, and can stall (GC pause, slow host)
+at chosen moments. Each scenario asserts which slots were sent and exits
+non-zero on any mismatch.
+
+    python benchmarks/sim_scheduler_day.py
+"""
+import contextlib
+import datetime
+import io
+import sys
+import time
+
+from common import remove_db, report, setup_env
+
+DB_FILE = setup_env()
+
+import bot  # noqa: E402
+
+
+class SimulatedClock:
+    def __init__(self, start, stalls=None):
+        self.current = start
+        # {when: seconds}: the first sleep that reaches `when` overshoots by that much
+        self.stalls = dict(stalls or {})
+
+    def now(self):
+        return self.current
+
+    def sleep(self, seconds):
+        target = self.current + datetime.timedelta(seconds=seconds)
+        for when in sorted(self.stalls):
+            if self.current <= when <= target:
+                target += datetime.timedelta(seconds=self.stalls.pop(when))
+        self.current = target
+
+    def advance(self, seconds):
+        self.current += datetime.timedelta(seconds=seconds)
+
+
+def at(day, hhmm, second=0):
+    return bot.slot_datetime(day, hhmm) + datetime.timedelta(seconds=second)
+
+
+def run(clock, until, send_seconds=0.0, policy="all", grace=600):
+    """Run the scheduler until `until`; returns [(sent_at, meal)]"""
+    bot.MEAL_CATCHUP_POLICY = policy
+    bot.MEAL_MISFIRE_GRACE_SECONDS = grace
+    fired = []
+
+    def fake_send(meal, fire_at=None):
+        fired.append((clock.now(), meal))
+        clock.advance(send_seconds)
+        return 1, 1
+
+    bot.send_meal_to_subscribers = fake_send
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot.scheduler(clock=clock, until=until)
+    return fired
+
+
+def reset_fires():
+    conn = bot.get_db()
+    with conn:
+        conn.execute("DELETE FROM meal_fires")
+
+
+def lags(fired, day):
+    """Seconds each send happened after its meal_schedule slot"""
+    return {meal: (sent_at - at(day, bot.meal_schedule[meal])).total_seconds() for sent_at, meal in fired}
+
+
+def check(name, condition, detail=""):
+    if not condition:
+        print(f"❌ {name}: {detail}")
+        sys.exit(1)
+
+
+def main():
+    bot.init_database()
+    day = bot.get_ist_time().replace(year=2026, month=3, day=10)
+    every_meal = set(bot.meal_schedule)
+    results = {}
+    started = time.perf_counter()
+
+    # 1. A normal day: every slot exactly once, on the second.
+    reset_fires()
+    bot.workout_done_today.add(42)
+    fired = run(SimulatedClock(at(day, "00:00", 5)), at(day, "00:00", 5) + datetime.timedelta(days=1))
+    check("normal day", sorted(m for _, m in fired) == sorted(every_meal), fired)
+    check("normal day lag", max(lags(fired, day).values()) == 0, lags(fired, day))
+    check("midnight reset", not bot.workout_done_today, bot.workout_done_today)
+    results["normal_day"] = {"sent": len(fired), "max_lag_s": max(lags(fired, day).values())}
+
+    # 2. Slow sends (90 s each) and a 4 minute stall just before lunch.
+    reset_fires()
+    clock = SimulatedClock(at(day, "06:00"), stalls={at(day, "12:58"): 240})
+    fired = run(clock, at(day, "23:00"), send_seconds=90)
+    check("slow day", sorted(m for _, m in fired) == sorted(every_meal), fired)
+    slot_lags = lags(fired, day)
+    check("lunch caught up", 0 < slot_lags["lunch"] <= 600, slot_lags)
+    results["slow_sends_and_stall"] = {"sent": len(fired), "max_lag_s": max(slot_lags.values()),
+                                       "lunch_lag_s": slot_lags["lunch"]}
+
+    # 3. A 25 minute stall across post_workout (08:30) and breakfast (08:45):
+    #    post_workout is beyond the 10 min grace, breakfast is within it.
+    reset_fires()
+    clock = SimulatedClock(at(day, "08:20"), stalls={at(day, "08:25"): 25 * 60})
+    fired = run(clock, at(day, "09:00"))
+    check("grace window", [m for _, m in fired] == ["breakfast"], fired)
+    results["grace_window"] = {"sent": [m for _, m in fired]}
+
+    # 4. Same stall with a 30 minute grace. morning_routine (08:00) is caught
+    #    up at start; after the stall "all" sends both overdue slots and
+    #    "latest" only breakfast.
+    for policy, expected in (("all", ["morning_routine", "post_workout", "breakfast"]),
+                             ("latest", ["morning_routine", "breakfast"])):
+        reset_fires()
+        clock = SimulatedClock(at(day, "08:20"), stalls={at(day, "08:25"): 25 * 60})
+        fired = run(clock, at(day, "09:00"), policy=policy, grace=1800)
+        check(f"policy {policy}", [m for _, m in fired] == expected, fired)
+        results[f"policy_{policy}"] = {"sent": [m for _, m in fired]}
+
+    # 5. Restart at 13:05: lunch (13:00) is caught up, 12:00 water is not;
+    #    a second restart at 13:07 must not send lunch again.
+    reset_fires()
+    fired = run(SimulatedClock(at(day, "13:05")), at(day, "13:06"))
+    check("restart catch-up", [m for _, m in fired] == ["lunch"], fired)
+    fired_again = run(SimulatedClock(at(day, "13:07")), at(day, "13:08"))
+    check("restart no duplicate", fired_again == [], fired_again)
+    results["restart"] = {"caught_up": [m for _, m in fired], "after_second_restart": fired_again}
+
+    results["wall_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    report("scheduler_simulation", results)
+    remove_db(DB_FILE)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,92 @@
 import os
+import json
+import random
+import re
+import bisect
+import functools
+import io
+import hashlib
 import time
 import threading
-import telebot
+import signal
 import datetime
+import collections
+import itertools
+import copy
+import heapq
+import hmac
+import queue
 import pytz
 import sqlite3
-import dateparser
-from openai import OpenAI
-from flask import Flask
+import weakref
 from threading import Thread
+from concurrent.futures import Future
+
+from prompts import (
+    CHAT_MODEL, CHAT_MAX_TOKENS, CHAT_TEMPERATURE, SUMMARY_TEMPERATURE, TRANSCRIBE_MODEL,
+    SYSTEM_PROMPT, PROMPT_VERSION, chat_messages, summary_messages
+)
 
 # ==========================================
 # CONFIGURATION
 # ==========================================
+# telebot, openai, flask and dateparser are slow to import, so none of them
+# are imported here: they load on first use, and importing this module has no
+# side effects. main() wires everything up.
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+READY_TIMEOUT = int(os.getenv("READY_TIMEOUT", "60"))
+
+bot = None
+client = None
+_clients_lock = threading.Lock()
 
-if not TELEGRAM_TOKEN:
-    raise ValueError("TELEGRAM_TOKEN not found in environment variables!")
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY not found in environment variables!")
+def check_config():
+    if not TELEGRAM_TOKEN:
+        raise ValueError("TELEGRAM_TOKEN not found in environment variables!")
+    if not OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY not found in environment variables!")
+    if BOT_MODE not in ("polling", "webhook"):
+        raise ValueError(f"BOT_MODE must be 'polling' or 'webhook', not {BOT_MODE!r}")
+    if TASK_STORE not in ("sqlite", "memory"):
+        raise ValueError(f"TASK_STORE must be 'sqlite' or 'memory', not {TASK_STORE!r}")
+    if HTTP_SERVER not in ("waitress", "flask"):
+        raise ValueError(f"HTTP_SERVER must be 'waitress' or 'flask', not {HTTP_SERVER!r}")
+    if BOT_MODE == "webhook" and not (WEBHOOK_URL and WEBHOOK_SECRET):
+        raise ValueError("BOT_MODE=webhook needs WEBHOOK_URL and WEBHOOK_SECRET")
 
-bot = telebot.TeleBot(TELEGRAM_TOKEN, parse_mode=None)
-client = OpenAI(api_key=OPENAI_API_KEY)
+def get_bot():
+    """The TeleBot instance, created with its handlers on first use"""
+    global bot
+    if bot is None:
+        with _clients_lock:
+            if bot is None:
+                import telebot
+                if not TELEGRAM_TOKEN:
+                    raise ValueError("TELEGRAM_TOKEN not found in environment variables!")
+                # The registered handlers only hand updates to chat_dispatcher,
+                # so they run inline rather than on telebot's own threads.
+                new_bot = telebot.TeleBot(TELEGRAM_TOKEN, parse_mode=None, threaded=False)
+                new_bot.register_message_handler(dispatch_voice, content_types=['voice'])
+                new_bot.register_message_handler(dispatch_message, func=lambda message: True)
+                bot = new_bot
+    return bot
+
+def get_openai_client():
+    global client
+    if client is None:
+        with _clients_lock:
+            if client is None:
+                from openai import OpenAI
+                if not OPENAI_API_KEY:
+                    raise ValueError("OPENAI_API_KEY not found in environment variables!")
+                client = OpenAI(api_key=OPENAI_API_KEY)
+    return client
 
 IST = pytz.timezone('Asia/Kolkata')
 CHAT_ID_FILE = "/tmp/chat_id.txt"
-DB_FILE = "/tmp/tasks.db"
-active_chat_id = None
-workout_done_today = False
+DB_FILE = os.getenv("DB_FILE", "/tmp/tasks.db")
+workout_done_today = set()  # chat_ids that logged a workout today
 
 scheduler_status = {
     "last_check": None,
@@ -56,32 +114,928 @@ meal_schedule = {
     "night_craving": "21:00"
 }
 
+# ==========================================
+# METRICS
+# ==========================================
+# Prometheus histograms for the hot paths, served at /metrics. observe()
+# takes no lock: every thread counts into its own shard, and a scrape adds
+# the shards up. Shards of threads that have exited are folded into a
+# retired total so per-request threads don't pile up.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+LAG_BUCKETS = (0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+_metrics = []
+_gauges = []
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+               for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards = []  # (thread, {labels: [bucket counts..., +Inf count, sum]})
+        self._retired = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _new_cell(self):
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def _merge(self, into, shard):
+        for labels, cell in shard.items():
+            total = into.setdefault(labels, self._new_cell())
+            for i, value in enumerate(cell):
+                total[i] += value
+
+    def _fold_dead_shards(self):
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = live
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._fold_dead_shards()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        cell = shard.get(labels)
+        if cell is None:
+            cell = shard[labels] = self._new_cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def time(self, *labels):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+    def collect(self):
+        with self._lock:
+            self._fold_dead_shards()
+            totals = {}
+            self._merge(totals, self._retired)
+            for _, shard in self._shards:
+                self._merge(totals, dict(shard))
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, cell in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), cell):
+                cumulative += count
+                label_str = _format_labels(self.labelnames, labels, [("le", bound)])
+                lines.append(f"{self.name}_bucket{label_str} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {cell[-1]:.6f}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+def register_gauge(name, help_text, read, metric_type="gauge", labelname=None):
+    """Expose a value read at scrape time; read() returns a number or {label: number}"""
+    _gauges.append((name, help_text, read, metric_type, labelname))
+
+def render_metrics():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.collect())
+    for name, help_text, read, metric_type, labelname in _gauges:
+        try:
+            value = read()
+        except Exception as e:
+            print(f"⚠️ Metric {name} failed: {e}")
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        if isinstance(value, dict):
+            for label, number in sorted(value.items()):
+                lines.append(f"{name}{_format_labels((labelname,), (label,))} {number}")
+        else:
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+TELEGRAM_SEND_SECONDS = Histogram(
+    "telegram_request_seconds", "Telegram Bot API call latency", ["method"])
+OPENAI_SECONDS = Histogram(
+    "openai_request_seconds", "OpenAI call latency (chat, summary, transcription)", ["kind"])
+DB_SECONDS = Histogram(
+    "sqlite_query_seconds", "Time spent in SQLite helper functions", ["helper"], DB_BUCKETS)
+SCHEDULER_LAG_SECONDS = Histogram(
+    "scheduler_lag_seconds", "Meal reminder fire time minus its meal_schedule time", [], LAG_BUCKETS)
+REMINDER_LAG_SECONDS = Histogram(
+    "reminder_lag_seconds", "Outbox delivery time minus due time (meal, reminder, followup)",
+    ["kind"], LAG_BUCKETS)
+HANDLER_SECONDS = Histogram(
+    "handler_duration_seconds", "Time to handle an incoming message, by command", ["command"])
+CHAT_QUEUE_WAIT_SECONDS = Histogram(
+    "chat_queue_wait_seconds", "Time an update waited in the chat dispatcher, by lane", ["lane"])
+
+def timed_db(func):
+    """Record a SQLite helper's duration under its own name"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - started, func.__name__)
+    return wrapper
+
 # ==========================================
 # DATABASE SETUP
 # ==========================================
-def init_database():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tasks (
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "8192"))
+# Finished tasks are archived into tasks_archive in the main file, or in a
+# separate database file attached as "archive" when TASK_ARCHIVE_DB is set.
+TASK_ARCHIVE_DB = os.getenv("TASK_ARCHIVE_DB")
+ARCHIVE_SCHEMA = "archive." if TASK_ARCHIVE_DB else ""
+
+_db_local = threading.local()
+_db_idle = []
+_db_idle_lock = threading.Lock()
+
+def _open_connection():
+    # check_same_thread is off only so a connection can be handed to another
+    # thread after its owner exits; it is never shared by two live threads.
+    conn = sqlite3.connect(DB_FILE, timeout=10, check_same_thread=False, cached_statements=128)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    if TASK_ARCHIVE_DB:
+        conn.execute("ATTACH DATABASE ? AS archive", (TASK_ARCHIVE_DB,))
+    return conn
+
+def _release_connection(conn):
+    with _db_idle_lock:
+        if len(_db_idle) < DB_POOL_SIZE:
+            _db_idle.append(conn)
+            return
+    conn.close()
+
+def get_db():
+    """Return the calling thread's long-lived connection.
+
+    Each thread keeps one connection for its whole life, so statements stay in
+    that connection's prepared-statement cache. When the thread goes away the
+    connection goes back to a small idle pool for the next short-lived thread
+    (e.g. Flask request threads) instead of being closed.
+    """
+    conn = getattr(_db_local, "conn", None)
+    if conn is None:
+        with _db_idle_lock:
+            conn = _db_idle.pop() if _db_idle else None
+        if conn is None:
+            conn = _open_connection()
+        _db_local.conn = conn
+        weakref.finalize(threading.current_thread(), _release_connection, conn)
+    return conn
+
+# Task times (target_at, reminder_at, followup_at, created_at) are UTC epoch
+# seconds, so comparisons are plain integer compares whatever the offset.
+def to_epoch(dt):
+    return int(dt.timestamp())
+
+def from_epoch(ts):
+    return datetime.datetime.fromtimestamp(ts, IST)
+
+# Statement text is kept in constants so every call reuses the cached
+# prepared statement instead of compiling a new one.
+SQL_INSERT_TASK = '''
+    INSERT INTO tasks (chat_id, task_description, target_at,
+                     reminder_at, followup_at, created_at, reminder_sent)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_PENDING_REMINDERS = '''
+    SELECT id, chat_id, task_description, target_at, reminder_at
+    FROM tasks
+    WHERE reminder_sent = 0 AND reminder_at <= ? AND completed = 0
+'''
+SQL_PENDING_FOLLOWUPS = '''
+    SELECT id, chat_id, task_description, target_at, followup_at
+    FROM tasks
+    WHERE followup_sent = 0 AND reminder_sent = 1 AND followup_at <= ? AND completed = 0
+'''
+SQL_MARK_REMINDER_SENT = 'UPDATE tasks SET reminder_sent = 1 WHERE id = ?'
+SQL_MARK_FOLLOWUP_SENT = 'UPDATE tasks SET followup_sent = 1 WHERE id = ?'
+SQL_MARK_COMPLETED = 'UPDATE tasks SET completed = 1 WHERE id = ?'
+SQL_USER_TASKS_ALL = '''
+    SELECT id, task_description, target_at, completed
+    FROM tasks
+    WHERE chat_id = ?
+    ORDER BY target_at DESC
+    LIMIT 10
+'''
+SQL_USER_TASKS_PENDING = '''
+    SELECT id, task_description, target_at, completed
+    FROM tasks
+    WHERE chat_id = ? AND completed = 0
+    ORDER BY target_at ASC
+'''
+SQL_ARCHIVED_USER_TASKS = f'''
+    SELECT id, task_description, target_at, completed
+    FROM {ARCHIVE_SCHEMA}tasks_archive
+    WHERE chat_id = ?
+    ORDER BY target_at DESC
+    LIMIT 10
+'''
+# History only: UNION rather than UNION ALL so a row caught in both tables by
+# an interrupted archive move shows once.
+SQL_USER_TASKS_HISTORY = f'''
+    SELECT * FROM ({SQL_USER_TASKS_ALL})
+    UNION
+    SELECT * FROM ({SQL_ARCHIVED_USER_TASKS})
+    ORDER BY target_at DESC
+    LIMIT 10
+'''
+# Finished = completed, or followed up so nothing else will ever fire.
+SQL_ARCHIVE_FINISHED = '''
+    SELECT id, chat_id, task_description, target_at, reminder_at, followup_at,
+           reminder_sent, followup_sent, completed, created_at
+    FROM tasks
+    WHERE (completed = 1 OR followup_sent = 1) AND target_at < ?
+    LIMIT ?
+'''
+SQL_ARCHIVE_DELETE = 'DELETE FROM tasks WHERE id = ?'
+SQL_ARCHIVE_INSERT = f'''
+    INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}tasks_archive
+        (id, chat_id, task_description, target_at, reminder_at, followup_at,
+         reminder_sent, followup_sent, completed, created_at, archived_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# ------------------------------------------
+# Migrations
+# ------------------------------------------
+# Each migration runs once, in order, inside its own transaction, and is
+# recorded in schema_version; if it fails nothing it did is kept. Append new
+# ones to MIGRATIONS and never edit one that has shipped.
+SQL_SCHEMA_VERSION = 'SELECT COALESCE(MAX(version), 0) FROM schema_version'
+SQL_RECORD_MIGRATION = 'INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)'
+
+def _table_exists(conn, name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+def _iso_to_epoch(value):
+    """Epoch seconds for a stored ISO-8601 string; naive values were written in IST"""
+    if isinstance(value, int):
+        return value
+    dt = datetime.datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = IST.localize(dt)
+    return to_epoch(dt)
+
+def _migrate_tasks_to_epoch(conn):
+    """Rebuild tasks with integer UTC epoch times.
+
+    The rebuilt table leaves out claim_token, send_attempts and retry_at, which
+    the task sweep stopped using when delivery moved to the outbox.
+    """
+    conn.execute('''
+        CREATE TABLE tasks_v1 (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             chat_id INTEGER NOT NULL,
             task_description TEXT NOT NULL,
-            target_datetime TEXT NOT NULL,
-            reminder_datetime TEXT NOT NULL,
-            followup_datetime TEXT NOT NULL,
-            reminder_sent BOOLEAN DEFAULT 0,
-            followup_sent BOOLEAN DEFAULT 0,
-            completed BOOLEAN DEFAULT 0,
-            created_at TEXT NOT NULL
+            target_at INTEGER NOT NULL,
+            reminder_at INTEGER NOT NULL,
+            followup_at INTEGER NOT NULL,
+            reminder_sent INTEGER NOT NULL DEFAULT 0,
+            followup_sent INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            created_at INTEGER NOT NULL
         )
     ''')
-    conn.commit()
-    conn.close()
+    last_id = 0
+    if _table_exists(conn, "tasks"):
+        rows = conn.execute('''
+            SELECT id, chat_id, task_description, target_datetime, reminder_datetime,
+                   followup_datetime, reminder_sent, followup_sent, completed, created_at
+            FROM tasks
+        ''')
+        conn.executemany('''
+            INSERT INTO tasks_v1 (id, chat_id, task_description, target_at, reminder_at, followup_at,
+                                  reminder_sent, followup_sent, completed, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', ((task_id, chat_id, desc, _iso_to_epoch(target), _iso_to_epoch(reminder),
+               _iso_to_epoch(followup), reminder_sent or 0, followup_sent or 0, completed or 0,
+               _iso_to_epoch(created))
+              for task_id, chat_id, desc, target, reminder, followup, reminder_sent, followup_sent,
+                  completed, created in rows.fetchall()))
+        # Task ids key outbox rows, so deleted ids must not be handed out again.
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'").fetchone()
+        last_id = row[0] if row else 0
+        conn.execute("DROP TABLE tasks")
+    conn.execute("ALTER TABLE tasks_v1 RENAME TO tasks")
+    conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'tasks'", (last_id,))
+    # The sweep indexes are partial so they only hold rows that can still
+    # fire. Their WHERE clauses must stay implied by the sweep queries above,
+    # otherwise SQLite will not use them.
+    conn.execute('''
+        CREATE INDEX idx_tasks_reminder_due ON tasks (reminder_at)
+        WHERE reminder_sent = 0 AND completed = 0
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_tasks_followup_due ON tasks (followup_at)
+        WHERE followup_sent = 0 AND reminder_sent = 1 AND completed = 0
+    ''')
+    conn.execute('CREATE INDEX idx_tasks_chat ON tasks (chat_id, completed, target_at)')
+
+def _migrate_usage_estimated_calls(conn):
+    """Count the calls whose token figures are estimates rather than the API's"""
+    if _table_exists(conn, "llm_usage"):
+        conn.execute("ALTER TABLE llm_usage ADD COLUMN estimated_calls INTEGER NOT NULL DEFAULT 0")
+
+MIGRATIONS = [
+    (1, "tasks: ISO datetime text to UTC epoch seconds", _migrate_tasks_to_epoch),
+    (2, "llm_usage: estimated_calls", _migrate_usage_estimated_calls),
+]
+
+def run_migrations(conn):
+    """Apply every migration newer than the database's schema_version"""
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at INTEGER NOT NULL
+            )
+        ''')
+    current = conn.execute(SQL_SCHEMA_VERSION).fetchone()[0]
+    for version, name, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        started = time.perf_counter()
+        with conn:
+            # sqlite3 doesn't open a transaction for DDL on its own.
+            conn.execute("BEGIN IMMEDIATE")
+            migrate(conn)
+            conn.execute(SQL_RECORD_MIGRATION, (version, name, int(time.time())))
+        print(f"✅ Migrated database to v{version} ({name}) in {time.perf_counter() - started:.2f}s")
+
+def enable_incremental_vacuum(conn):
+    """Switch the file to auto_vacuum=INCREMENTAL so freed pages can be given back.
+
+    The setting only changes through a full VACUUM, so existing databases pay
+    for one rewrite on the first start after upgrading.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    started = time.perf_counter()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    print(f"✅ Enabled incremental vacuum in {time.perf_counter() - started:.2f}s")
+
+def init_database():
+    conn = get_db()
+    enable_incremental_vacuum(conn)
+    run_migrations(conn)
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                chat_id INTEGER PRIMARY KEY,
+                active INTEGER NOT NULL DEFAULT 1,
+                subscribed_at TEXT NOT NULL,
+                unsubscribed_at TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_subscriptions_active
+            ON subscriptions (chat_id) WHERE active = 1
+        ''')
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS response_cache (
+                cache_key TEXT PRIMARY KEY,
+                prompt_version TEXT NOT NULL,
+                question TEXT NOT NULL,
+                response TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                last_hit_at TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_response_cache_lru
+            ON response_cache (last_hit_at)
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS voice_transcripts (
+                file_unique_id TEXT PRIMARY KEY,
+                transcript TEXT NOT NULL,
+                duration INTEGER,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                summarized INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_conversation_live
+            ON conversation_messages (chat_id, id) WHERE summarized = 0
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_state (
+                chat_id INTEGER PRIMARY KEY,
+                summary TEXT NOT NULL DEFAULT '',
+                summary_tokens INTEGER NOT NULL DEFAULT 0,
+                live_tokens INTEGER NOT NULL DEFAULT 0,
+                last_turn_at TEXT NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_usage (
+                day TEXT NOT NULL,
+                chat_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                calls INTEGER NOT NULL DEFAULT 0,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                cached_tokens INTEGER NOT NULL DEFAULT 0,
+                audio_seconds INTEGER NOT NULL DEFAULT 0,
+                latency_ms INTEGER NOT NULL DEFAULT 0,
+                estimated_calls INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, chat_id, kind)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS meal_fires (
+                fire_date TEXT NOT NULL,
+                meal TEXT NOT NULL,
+                fired_at TEXT NOT NULL,
+                PRIMARY KEY (fire_date, meal)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS chat_prefs (
+                chat_id INTEGER PRIMARY KEY,
+                response_cache INTEGER NOT NULL DEFAULT 1
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                chat_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                ref TEXT,
+                priority INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                parse_mode TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                due_at TEXT NOT NULL,
+                next_attempt_at TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                sent_at TEXT,
+                message_id INTEGER,
+                last_error TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_outbox_pending
+            ON outbox (priority, id) WHERE status = 'pending'
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_outbox_sending
+            ON outbox (id) WHERE status = 'sending'
+        ''')
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}tasks_archive (
+                id INTEGER PRIMARY KEY,
+                chat_id INTEGER NOT NULL,
+                task_description TEXT NOT NULL,
+                target_at INTEGER NOT NULL,
+                reminder_at INTEGER NOT NULL,
+                followup_at INTEGER NOT NULL,
+                reminder_sent INTEGER NOT NULL,
+                followup_sent INTEGER NOT NULL,
+                completed INTEGER NOT NULL,
+                created_at INTEGER NOT NULL,
+                archived_at INTEGER NOT NULL
+            )
+        ''')
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}idx_tasks_archive_chat
+            ON tasks_archive (chat_id, target_at)
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS workouts (
+                day TEXT NOT NULL,
+                chat_id INTEGER NOT NULL,
+                logged_at TEXT NOT NULL,
+                PRIMARY KEY (day, chat_id)
+            ) WITHOUT ROWID
+        ''')
     print("✅ Database initialized")
 
-init_database()
+# ==========================================
+# TASK STORE
+# ==========================================
+# add_task() and friends go through task_store, picked by TASK_STORE:
+#   sqlite - the tasks table, queried on every call (default)
+#   memory - MemoryTaskStore: everything in RAM, made durable by an
+#            append-only log plus periodic snapshots into the tasks table
+# Both stores return rows shaped like the SQL_* queries above.
+TASK_STORE = os.getenv("TASK_STORE", "sqlite").lower()
+TASK_LOG_FILE = os.getenv("TASK_LOG_FILE", DB_FILE + ".tasklog")
+TASK_LOG_FSYNC = os.getenv("TASK_LOG_FSYNC", "0") == "1"
+TASK_SNAPSHOT_SECONDS = int(os.getenv("TASK_SNAPSHOT_SECONDS", "300"))
+
+SQL_SNAPSHOT_LOAD = '''
+    SELECT id, chat_id, task_description, target_at, reminder_at, followup_at,
+           reminder_sent, followup_sent, completed, created_at
+    FROM tasks
+'''
+SQL_SNAPSHOT_INSERT = '''
+    INSERT INTO tasks (id, chat_id, task_description, target_at, reminder_at,
+                       followup_at, reminder_sent, followup_sent, completed, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+# Highest task id ever handed out. Archived ids never come back to the tasks
+# table, and task ids key outbox rows and archive rows, so none may be reused.
+SQL_TASK_ID_HIGH_WATER = f'''
+    SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'tasks'), 0),
+               COALESCE((SELECT MAX(id) FROM tasks), 0),
+               COALESCE((SELECT MAX(id) FROM {ARCHIVE_SCHEMA}tasks_archive), 0))
+'''
+SQL_TASK_SEQ_ENSURE = '''
+    INSERT INTO sqlite_sequence (name, seq)
+    SELECT 'tasks', 0 WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'tasks')
+'''
+SQL_TASK_SEQ_RAISE = "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'tasks'"
+
+# Field positions in a MemoryTaskStore row (SQL_SNAPSHOT_LOAD order)
+(T_ID, T_CHAT, T_DESC, T_TARGET, T_REMINDER, T_FOLLOWUP,
+ T_REMINDER_SENT, T_FOLLOWUP_SENT, T_COMPLETED, T_CREATED) = range(10)
+_TASK_FLAGS = {"reminder_sent": T_REMINDER_SENT, "followup_sent": T_FOLLOWUP_SENT, "completed": T_COMPLETED}
+
+class SQLiteTaskStore:
+    """Tasks in the tasks table"""
+    def start(self):
+        pass
+
+    def add(self, task, outbox_rows=None):
+        """Insert a SQL_INSERT_TASK tuple; outbox_rows(task_id) is queued in the same transaction"""
+        conn = get_db()
+        with conn:
+            task_id = conn.execute(SQL_INSERT_TASK, task).lastrowid
+            if outbox_rows:
+                enqueue_outbox(conn, outbox_rows(task_id))
+        return task_id
+
+    def pending_reminders(self, now):
+        return get_db().execute(SQL_PENDING_REMINDERS, (now,)).fetchall()
+
+    def pending_followups(self, now):
+        return get_db().execute(SQL_PENDING_FOLLOWUPS, (now,)).fetchall()
+
+    def _update(self, sql, task_id):
+        conn = get_db()
+        with conn:
+            conn.execute(sql, (task_id,))
+
+    def mark_reminder_sent(self, task_id):
+        self._update(SQL_MARK_REMINDER_SENT, task_id)
+
+    def mark_followup_sent(self, task_id):
+        self._update(SQL_MARK_FOLLOWUP_SENT, task_id)
+
+    def mark_completed(self, task_id):
+        self._update(SQL_MARK_COMPLETED, task_id)
+
+    def user_tasks(self, chat_id, include_completed):
+        if include_completed:
+            return get_db().execute(SQL_USER_TASKS_HISTORY, (chat_id, chat_id)).fetchall()
+        return get_db().execute(SQL_USER_TASKS_PENDING, (chat_id,)).fetchall()
+
+    def archive_finished(self, cutoff, limit):
+        """Move up to `limit` tasks finished before `cutoff` into the archive; returns how many"""
+        conn = get_db()
+        archived_at = int(time.time())
+        rows = conn.execute(SQL_ARCHIVE_FINISHED, (cutoff, limit)).fetchall()
+        if not rows:
+            return 0
+        # Two transactions, archive first: with TASK_ARCHIVE_DB attached the
+        # commit spans two files, which WAL mode doesn't make atomic. A crash
+        # in between leaves a row in both tables, and the next run moves it
+        # again; INSERT OR REPLACE keeps one copy.
+        with conn:
+            conn.executemany(SQL_ARCHIVE_INSERT, [row + (archived_at,) for row in rows])
+        with conn:
+            conn.executemany(SQL_ARCHIVE_DELETE, [(row[0],) for row in rows])
+        return len(rows)
+
+    def count_pending(self):
+        return get_db().execute(SQL_PENDING_TASK_COUNT).fetchone()[0]
 
+    def upcoming(self, limit):
+        """Due times of the next `limit` reminders and `limit` follow-ups"""
+        conn = get_db()
+        return [due for sql in (SQL_UPCOMING_REMINDERS, SQL_UPCOMING_FOLLOWUPS)
+                for (due,) in conn.execute(sql, (limit,))]
+
+    def claim_due(self, now, outbox_rows):
+        """Flag every due reminder and follow-up sent and queue outbox_rows(claimed) atomically.
+
+        claimed holds (kind, id, chat_id, description, target, due) tuples.
+        """
+        conn = get_db()
+        with conn:
+            claimed = ([("reminder",) + row for row in conn.execute(SQL_CLAIM_REMINDERS, (now,))] +
+                       [("followup",) + row for row in conn.execute(SQL_CLAIM_FOLLOWUPS, (now,))])
+            enqueue_outbox(conn, outbox_rows(claimed))
+        return len(claimed)
+
+class MemoryTaskStore:
+    """Tasks held in memory, indexed by due time and by chat_id.
+
+    _reminders_due and _followups_due are sorted (due, id) lists holding only
+    rows that can still fire, mirroring the partial indexes of the SQLite
+    store; _by_chat maps chat_id to its task ids.
+
+    Each change is appended to the log before it is applied. Every
+    TASK_SNAPSHOT_SECONDS the whole set is rewritten into the tasks table and
+    the log starts over; on start the snapshot is loaded and the log replayed.
+    Replaying is idempotent, so a crash anywhere in that cycle loses nothing
+    the log already had.
+    """
+    def __init__(self, log_file=TASK_LOG_FILE):
+        self.log_file = log_file
+        self._lock = threading.RLock()
+        self._tasks = {}
+        self._by_chat = collections.defaultdict(set)
+        self._reminders_due = []
+        self._followups_due = []
+        self._open_count = 0
+        self._next_id = 1
+        self._log = None
+        self._started = False
+
+    # -- indexes --
+
+    def _due_index(self, task):
+        if task[T_COMPLETED]:
+            return None, None
+        if not task[T_REMINDER_SENT]:
+            return self._reminders_due, (task[T_REMINDER], task[T_ID])
+        if not task[T_FOLLOWUP_SENT]:
+            return self._followups_due, (task[T_FOLLOWUP], task[T_ID])
+        return None, None
+
+    def _index(self, task):
+        index, entry = self._due_index(task)
+        if index is not None:
+            bisect.insort(index, entry)
+        if not task[T_COMPLETED]:
+            self._open_count += 1
+
+    def _unindex(self, task):
+        index, entry = self._due_index(task)
+        if index is not None:
+            i = bisect.bisect_left(index, entry)
+            if i < len(index) and index[i] == entry:
+                del index[i]
+        if not task[T_COMPLETED]:
+            self._open_count -= 1
+
+    def _apply(self, change):
+        op, value = change
+        if op == "add":
+            task = list(value)
+            # Logs written before tasks moved to epoch seconds hold ISO strings.
+            for field in (T_TARGET, T_REMINDER, T_FOLLOWUP, T_CREATED):
+                task[field] = _iso_to_epoch(task[field])
+            old = self._tasks.get(task[T_ID])
+            if old is not None:
+                self._unindex(old)
+            self._tasks[task[T_ID]] = task
+            self._by_chat[task[T_CHAT]].add(task[T_ID])
+            self._index(task)
+            self._next_id = max(self._next_id, task[T_ID] + 1)
+            return
+        task = self._tasks.get(value)
+        if task is None:
+            return
+        self._unindex(task)
+        if op == "archive":
+            del self._tasks[value]
+            self._by_chat[task[T_CHAT]].discard(value)
+            return
+        task[_TASK_FLAGS[op]] = 1
+        self._index(task)
+
+    def _commit(self, changes):
+        """Append changes to the log, then apply them"""
+        self._log.write("".join(json.dumps(change) + "\n" for change in changes))
+        self._log.flush()
+        if TASK_LOG_FSYNC:
+            os.fsync(self._log.fileno())
+        for change in changes:
+            self._apply(change)
+
+    def _due(self, index, now):
+        return [self._tasks[task_id] for _, task_id in index[:bisect.bisect_right(index, (now, float("inf")))]]
+
+    # -- lifecycle --
+
+    def start(self):
+        """Load the last snapshot, replay the log on top and start snapshotting"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            conn = get_db()
+            for row in conn.execute(SQL_SNAPSHOT_LOAD):
+                self._apply(("add", row))
+            self._next_id = max(self._next_id, conn.execute(SQL_TASK_ID_HIGH_WATER).fetchone()[0] + 1)
+            replayed = 0
+            for path in (self.log_file + ".1", self.log_file):
+                if not os.path.exists(path):
+                    continue
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            self._apply(json.loads(line))
+                        except ValueError:
+                            # A write torn by the crash - nothing after it was committed.
+                            break
+                        replayed += 1
+            self._log = open(self.log_file, "a", encoding="utf-8")
+        print(f"✅ Task store: {len(self._tasks)} tasks in memory ({replayed} log entries replayed)")
+        if replayed:
+            self.snapshot()
+        threading.Thread(target=self._snapshotter, name="task-snapshots", daemon=True).start()
+
+    @timed_db
+    def snapshot(self):
+        """Rewrite the tasks table from memory and drop the log it covers"""
+        previous = self.log_file + ".1"
+        with self._lock:
+            rows = [tuple(task) for task in self._tasks.values()]
+            high_water = self._next_id - 1
+            self._log.close()
+            if os.path.exists(previous):
+                # The last snapshot never finished; keep its log too.
+                with open(previous, "a", encoding="utf-8") as old, open(self.log_file, encoding="utf-8") as f:
+                    old.write(f.read())
+                os.remove(self.log_file)
+            else:
+                os.replace(self.log_file, previous)
+            self._log = open(self.log_file, "a", encoding="utf-8")
+        conn = get_db()
+        with conn:
+            conn.execute("DELETE FROM tasks")
+            conn.executemany(SQL_SNAPSHOT_INSERT, rows)
+            # Ids added and archived since the last snapshot are in no table yet.
+            conn.execute(SQL_TASK_SEQ_ENSURE)
+            conn.execute(SQL_TASK_SEQ_RAISE, (high_water,))
+        os.remove(previous)
+
+    def _snapshotter(self):
+        while True:
+            time.sleep(TASK_SNAPSHOT_SECONDS)
+            try:
+                self.snapshot()
+            except Exception as e:
+                print(f"❌ Task snapshot error: {e}")
+
+    # -- store API --
+
+    def add(self, task, outbox_rows=None):
+        chat_id, description, target, reminder, followup, created, reminder_sent = task
+        with self._lock:
+            task_id = self._next_id
+            row = (task_id, chat_id, description, target, reminder, followup, 0, 0, 0, created)
+            # Logged unsent first: if we die before the outbox commit, the
+            # sweep sends it instead; the outbox key stops it going out twice.
+            self._commit([("add", row)])
+            if reminder_sent:
+                if outbox_rows:
+                    conn = get_db()
+                    with conn:
+                        enqueue_outbox(conn, outbox_rows(task_id))
+                self._commit([("reminder_sent", task_id)])
+        return task_id
+
+    def pending_reminders(self, now):
+        with self._lock:
+            return [(t[T_ID], t[T_CHAT], t[T_DESC], t[T_TARGET], t[T_REMINDER])
+                    for t in self._due(self._reminders_due, now)]
+
+    def pending_followups(self, now):
+        with self._lock:
+            return [(t[T_ID], t[T_CHAT], t[T_DESC], t[T_TARGET], t[T_FOLLOWUP])
+                    for t in self._due(self._followups_due, now)]
+
+    def _mark(self, op, task_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is not None and not task[_TASK_FLAGS[op]]:
+                self._commit([(op, task_id)])
+
+    def mark_reminder_sent(self, task_id):
+        self._mark("reminder_sent", task_id)
+
+    def mark_followup_sent(self, task_id):
+        self._mark("followup_sent", task_id)
+
+    def mark_completed(self, task_id):
+        self._mark("completed", task_id)
+
+    def user_tasks(self, chat_id, include_completed):
+        with self._lock:
+            tasks = [(t[T_ID], t[T_DESC], t[T_TARGET], t[T_COMPLETED])
+                     for t in (self._tasks[task_id] for task_id in self._by_chat.get(chat_id, ()))]
+        if include_completed:
+            archived = get_db().execute(SQL_ARCHIVED_USER_TASKS, (chat_id,)).fetchall()
+            return sorted(set(tasks).union(archived), key=lambda t: t[2], reverse=True)[:10]
+        return sorted((t for t in tasks if not t[3]), key=lambda t: t[2])
+
+    def archive_finished(self, cutoff, limit):
+        with self._lock:
+            finished = list(itertools.islice(
+                (t for t in self._tasks.values()
+                 if (t[T_COMPLETED] or t[T_FOLLOWUP_SENT]) and t[T_TARGET] < cutoff), limit))
+            if not finished:
+                return 0
+            # Archive first: a move interrupted before the log write is
+            # simply repeated, and INSERT OR REPLACE keeps one copy.
+            archived_at = int(time.time())
+            conn = get_db()
+            with conn:
+                conn.executemany(SQL_ARCHIVE_INSERT, [tuple(t) + (archived_at,) for t in finished])
+            self._commit([("archive", t[T_ID]) for t in finished])
+        return len(finished)
+
+    def count_pending(self):
+        return self._open_count
+
+    def upcoming(self, limit):
+        with self._lock:
+            return [due for index in (self._reminders_due, self._followups_due) for due, _ in index[:limit]]
+
+    def claim_due(self, now, outbox_rows):
+        with self._lock:
+            reminders = self._due(self._reminders_due, now)
+            # A reminder claimed now whose follow-up is also due goes in the same sweep.
+            followups = self._due(self._followups_due, now) + [t for t in reminders if t[T_FOLLOWUP] <= now]
+            claimed = ([("reminder", t[T_ID], t[T_CHAT], t[T_DESC], t[T_TARGET], t[T_REMINDER]) for t in reminders] +
+                       [("followup", t[T_ID], t[T_CHAT], t[T_DESC], t[T_TARGET], t[T_FOLLOWUP]) for t in followups])
+            if not claimed:
+                return 0
+            # Outbox first: if the log write is lost the next sweep claims
+            # these again and the outbox keys swallow the repeat.
+            conn = get_db()
+            with conn:
+                enqueue_outbox(conn, outbox_rows(claimed))
+            self._commit([("reminder_sent", t[T_ID]) for t in reminders] +
+                         [("followup_sent", t[T_ID]) for t in followups])
+        return len(claimed)
+
+task_store = MemoryTaskStore() if TASK_STORE == "memory" else SQLiteTaskStore()
+
+@timed_db
 def add_task(chat_id, task_description, target_datetime):
     """Add a new task to database with smart reminder timing"""
     try:
@@ -95,43 +1049,38 @@ def add_task(chat_id, task_description, target_datetime):
         # Check if task is less than 1 hour away
         send_reminder_immediately = time_until_task < 60
         
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO tasks (chat_id, task_description, target_datetime, 
-                             reminder_datetime, followup_datetime, created_at, reminder_sent)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        # Send immediate reminder if less than 1 hour away; the store queues
+        # it in the outbox together with the task, so it can't be lost or doubled.
+        if send_reminder_immediately:
+            target_display = target_datetime.strftime("%I:%M %p on %B %d, %Y")
+            minutes_away = int(time_until_task)
+
+            message = (
+                f"⏰ *IMMEDIATE TASK REMINDER*\n\n"
+                f"📋 {task_description}\n\n"
+                f"⏱️ Scheduled for: {target_display}\n"
+                f"🚨 Only {minutes_away} minutes away!\n\n"
+                f"I'm reminding you NOW since it's less than 1 hour away! 🔔"
+            )
+
+            def immediate_reminder(task_id):
+                return [(f"task_{task_id}_reminder", chat_id, "reminder", task_id,
+                         PRIORITY_REMINDER, message, "Markdown", current_time)]
+
+        task_id = task_store.add((
             chat_id,
             task_description,
-            target_datetime.isoformat(),
-            reminder_time.isoformat(),
-            followup_time.isoformat(),
-            current_time.isoformat(),
+            to_epoch(target_datetime),
+            to_epoch(reminder_time),
+            to_epoch(followup_time),
+            to_epoch(current_time),
             1 if send_reminder_immediately else 0  # Mark as sent if immediate
-        ))
-        task_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        # Send immediate reminder if less than 1 hour away
+        ), immediate_reminder if send_reminder_immediately else None)
+        notify_task_engine(followup_time if send_reminder_immediately else reminder_time)
+        status.invalidate("pending_tasks")
         if send_reminder_immediately:
-            try:
-                target_display = target_datetime.strftime("%I:%M %p on %B %d, %Y")
-                minutes_away = int(time_until_task)
-                
-                message = (
-                    f"⏰ *IMMEDIATE TASK REMINDER*\n\n"
-                    f"📋 {task_description}\n\n"
-                    f"⏱️ Scheduled for: {target_display}\n"
-                    f"🚨 Only {minutes_away} minutes away!\n\n"
-                    f"I'm reminding you NOW since it's less than 1 hour away! 🔔"
-                )
-                
-                bot.send_message(chat_id, message, parse_mode="Markdown")
-                print(f"✅ Sent IMMEDIATE reminder for task {task_id} (gap: {minutes_away} min)")
-            except Exception as e:
-                print(f"❌ Error sending immediate reminder: {e}")
+            outbox.wake()
+            print(f"✅ Queued IMMEDIATE reminder for task {task_id} (gap: {int(time_until_task)} min)")
         
         return task_id
         
@@ -140,164 +1089,258 @@ def add_task(chat_id, task_description, target_datetime):
         return None
 
 
+@timed_db
 def get_pending_reminders():
     try:
-        now = datetime.datetime.now(IST).isoformat()
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, chat_id, task_description, target_datetime, reminder_datetime
-            FROM tasks
-            WHERE reminder_sent = 0 AND reminder_datetime <= ? AND completed = 0
-        ''', (now,))
-        tasks = cursor.fetchall()
-        conn.close()
-        return tasks
+        return task_store.pending_reminders(int(time.time()))
     except Exception as e:
         print(f"❌ Error getting reminders: {e}")
         return []
 
+@timed_db
 def get_pending_followups():
     try:
-        now = datetime.datetime.now(IST).isoformat()
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, chat_id, task_description, target_datetime, followup_datetime
-            FROM tasks
-            WHERE followup_sent = 0 AND reminder_sent = 1 AND followup_datetime <= ? AND completed = 0
-        ''', (now,))
-        tasks = cursor.fetchall()
-        conn.close()
-        return tasks
+        return task_store.pending_followups(int(time.time()))
     except Exception as e:
         print(f"❌ Error getting follow-ups: {e}")
         return []
 
+@timed_db
 def mark_reminder_sent(task_id):
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute('UPDATE tasks SET reminder_sent = 1 WHERE id = ?', (task_id,))
-        conn.commit()
-        conn.close()
+        task_store.mark_reminder_sent(task_id)
     except Exception as e:
         print(f"❌ Error marking reminder sent: {e}")
 
+@timed_db
 def mark_followup_sent(task_id):
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute('UPDATE tasks SET followup_sent = 1 WHERE id = ?', (task_id,))
-        conn.commit()
-        conn.close()
+        task_store.mark_followup_sent(task_id)
     except Exception as e:
         print(f"❌ Error marking follow-up sent: {e}")
 
+@timed_db
 def mark_task_completed(task_id):
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute('UPDATE tasks SET completed = 1 WHERE id = ?', (task_id,))
-        conn.commit()
-        conn.close()
+        task_store.mark_completed(task_id)
+        notify_task_engine()
+        status.invalidate("pending_tasks")
     except Exception as e:
         print(f"❌ Error marking task completed: {e}")
 
+@timed_db
 def get_user_tasks(chat_id, include_completed=False):
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        if include_completed:
-            cursor.execute('''
-                SELECT id, task_description, target_datetime, completed
-                FROM tasks
-                WHERE chat_id = ?
-                ORDER BY target_datetime DESC
-                LIMIT 10
-            ''', (chat_id,))
-        else:
-            cursor.execute('''
-                SELECT id, task_description, target_datetime, completed
-                FROM tasks
-                WHERE chat_id = ? AND completed = 0
-                ORDER BY target_datetime ASC
-            ''', (chat_id,))
-        tasks = cursor.fetchall()
-        conn.close()
-        return tasks
+        return task_store.user_tasks(chat_id, include_completed)
     except Exception as e:
         print(f"❌ Error getting user tasks: {e}")
         return []
 
+# ==========================================
+# REMINDER PARSING
+# ==========================================
+# Common phrasings ("at 5pm", "in 20 minutes", "tomorrow at 9",
+# "on 12 March at 10:30", "next monday at 8am") are handled by the compiled
+# grammar below; dateparser is only the fallback for everything else.
+# Results are cached per (normalized phrase, current minute).
+REMINDER_PARSE_CACHE_SIZE = int(os.getenv("REMINDER_PARSE_CACHE_SIZE", "2048"))
+
+REMINDER_PREFIXES = ['remind me to ', 'remind me ', 'reminder to ', 'reminder ']
+
+_MONTHS = {}
+for _number, _name in enumerate(["january", "february", "march", "april", "may", "june", "july",
+                                 "august", "september", "october", "november", "december"], 1):
+    _MONTHS[_name] = _MONTHS[_name[:3]] = _number
+_MONTHS["sept"] = 9
+_WEEKDAYS = {name: number for number, name in enumerate(
+    ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"])}
+
+_TIME = r"(?P<hour>\d{1,2})(?:[:.](?P<minute>\d{2}))?\s*(?P<ampm>[ap]\.?m\.?)?"
+_TIME_INDICATOR_RE = re.compile(r" (at|on|tomorrow|today|next|in) ")
+_RELATIVE_RE = re.compile(
+    r"^in\s+(?P<count>\d+|an?)\s*(?P<unit>minutes?|mins?|m|hours?|hrs?|hr|h|days?|d)$")
+_DAY_TIME_RE = re.compile(r"^(?:(?P<day>today|tomorrow)\s+)?(?P<at>at\s+)?" + _TIME + r"$")
+_TIME_DAY_RE = re.compile(r"^at\s+" + _TIME + r"\s+(?P<day>today|tomorrow)$")
+_DATE_TIME_RE = re.compile(
+    r"^on\s+(?:(?P<day1>\d{1,2})(?:st|nd|rd|th)?\s+(?P<month1>[a-z]+)"
+    r"|(?P<month2>[a-z]+)\s+(?P<day2>\d{1,2})(?:st|nd|rd|th)?)"
+    r"(?:,?\s+(?P<year>\d{4}))?\s+at\s+" + _TIME + r"$")
+_WEEKDAY_TIME_RE = re.compile(
+    r"^(?:(?P<which>on|next)\s+)?(?P<weekday>[a-z]+)\s+at\s+" + _TIME + r"$")
+_RELATIVE_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+
+def _split_reminder_text(text):
+    """Split 'call mom at 5pm' into the task ('call mom') and the time phrase ('at 5pm')"""
+    text = text.lower()
+    for prefix in REMINDER_PREFIXES:
+        if text.startswith(prefix):
+            text = text[len(prefix):]
+            break
+
+    # Earliest of each indicator's last occurrence, same as the old rfind scan.
+    last_seen = {}
+    for match in _TIME_INDICATOR_RE.finditer(text):
+        last_seen[match.group(1)] = match.start()
+    if last_seen:
+        time_start_idx = min(last_seen.values())
+        return text, text[:time_start_idx].strip(), text[time_start_idx:].strip()
+    return text, text, text
+
+def _clock_time(match):
+    """(hour, minute) from a _TIME match, or None if it is not a valid time"""
+    hour = int(match.group("hour"))
+    minute = int(match.group("minute") or 0)
+    ampm = match.group("ampm")
+    if ampm:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if ampm.startswith("p") else 0)
+    if hour > 23 or minute > 59:
+        return None
+    return hour, minute
+
+def _fast_parse_time_phrase(time_phrase, ist_now):
+    match = _RELATIVE_RE.match(time_phrase)
+    if match:
+        count = match.group("count")
+        count = 1 if count in ("a", "an") else int(count)
+        unit = _RELATIVE_UNITS[match.group("unit")[0]]
+        return ("delta", datetime.timedelta(**{unit: count}))
+
+    match = _DAY_TIME_RE.match(time_phrase) or _TIME_DAY_RE.match(time_phrase)
+    if match:
+        day = match.group("day")
+        # A bare number is too ambiguous to be a time on its own.
+        if not day and not match.groupdict().get("at", True) and not match.group("ampm"):
+            return None
+        clock = _clock_time(match)
+        if clock is None:
+            return None
+        target = ist_now.replace(hour=clock[0], minute=clock[1], second=0, microsecond=0)
+        if day == "tomorrow" or target <= ist_now:
+            target = target + datetime.timedelta(days=1)
+        return ("at", target)
+
+    match = _DATE_TIME_RE.match(time_phrase)
+    if match:
+        month = _MONTHS.get(match.group("month1") or match.group("month2"))
+        clock = _clock_time(match)
+        if month is None or clock is None:
+            return None
+        day = int(match.group("day1") or match.group("day2"))
+        year = int(match.group("year") or ist_now.year)
+        try:
+            target = IST.localize(datetime.datetime(year, month, day, clock[0], clock[1]))
+            if target <= ist_now and not match.group("year"):
+                target = IST.localize(datetime.datetime(year + 1, month, day, clock[0], clock[1]))
+        except ValueError:
+            return None
+        return ("at", target)
+
+    match = _WEEKDAY_TIME_RE.match(time_phrase)
+    if match and match.group("weekday") in _WEEKDAYS:
+        clock = _clock_time(match)
+        if clock is None:
+            return None
+        days_ahead = (_WEEKDAYS[match.group("weekday")] - ist_now.weekday()) % 7
+        if days_ahead == 0 and match.group("which") == "next":
+            days_ahead = 7
+        target = IST.localize(datetime.datetime.combine(
+            ist_now.date() + datetime.timedelta(days=days_ahead), datetime.time(*clock)))
+        if target <= ist_now:
+            target = target + datetime.timedelta(days=7)
+        return ("at", target)
+
+    return None
+
+# Offset for telling relative phrases apart: their result moves with the base.
+_RELATIVE_PROBE = datetime.timedelta(seconds=37)
+
+def _dateparse_future(time_phrase, relative_base):
+    import dateparser
+
+    return dateparser.parse(
+        time_phrase,
+        settings={
+            'PREFER_DATES_FROM': 'future',
+            'RELATIVE_BASE': relative_base,
+            'RETURN_AS_TIMEZONE_AWARE': False  # Get naive datetime first
+        }
+    )
+
+def _dateparser_time_phrase(time_phrase, ist_now):
+    import dateparser
+
+    # Relative phrases are resolved against IST, not the server's local clock.
+    relative_base = ist_now.replace(tzinfo=None)
+    parsed_date = _dateparse_future(time_phrase, relative_base)
+
+    if parsed_date is None:
+        return None
+
+    # "in 90 seconds", "in 1.5 hours": an offset from now, not from the start
+    # of the cached minute.
+    shifted = _dateparse_future(time_phrase, relative_base + _RELATIVE_PROBE)
+    if shifted is not None and shifted - parsed_date == _RELATIVE_PROBE:
+        return ("delta", parsed_date - relative_base)
+
+    # Now convert to IST-aware datetime
+    target_time = IST.localize(parsed_date)
+
+    # Check if it's in the past
+    if target_time <= ist_now:
+        # If in past and no explicit date mentioned, assume user means today/tomorrow
+        if 'tomorrow' not in time_phrase and 'next' not in time_phrase:
+            # Try to extract just the time and apply it to today
+            time_only_parsed = dateparser.parse(
+                time_phrase,
+                settings={
+                    'PARSERS': ['absolute-time'],
+                    'RELATIVE_BASE': relative_base,
+                    'RETURN_AS_TIMEZONE_AWARE': False
+                }
+            )
+
+            if time_only_parsed:
+                # Apply this time to today's date
+                target_time = ist_now.replace(
+                    hour=time_only_parsed.hour,
+                    minute=time_only_parsed.minute,
+                    second=0,
+                    microsecond=0
+                )
+
+                # If still in past, add one day
+                if target_time <= ist_now:
+                    target_time = target_time + datetime.timedelta(days=1)
+
+    return ("at", target_time)
+
+@functools.lru_cache(maxsize=REMINDER_PARSE_CACHE_SIZE)
+def _resolve_time_phrase(time_phrase, minute_key):
+    """Parse a normalized time phrase as of the start of minute_key ('%Y-%m-%d %H:%M').
+
+    Returns ("delta", timedelta) for relative phrases, so a cached answer stays
+    exact for the rest of the minute, ("at", datetime) for absolute ones, or None.
+    """
+    ist_now = IST.localize(datetime.datetime.strptime(minute_key, "%Y-%m-%d %H:%M"))
+    return _fast_parse_time_phrase(time_phrase, ist_now) or _dateparser_time_phrase(time_phrase, ist_now)
+
 def parse_reminder_request(text):
     """Parse natural language reminder request"""
     try:
-        text = text.lower()
-        for prefix in ['remind me to ', 'remind me ', 'reminder to ', 'reminder ']:
-            if text.startswith(prefix):
-                text = text[len(prefix):]
-                break
-        
-        time_indicators = ['at', 'on', 'tomorrow', 'today', 'next', 'in']
-        
-        time_start_idx = len(text)
-        for indicator in time_indicators:
-            idx = text.rfind(' ' + indicator + ' ')
-            if idx != -1 and idx < time_start_idx:
-                time_start_idx = idx
-        
-        if time_start_idx < len(text):
-            task_desc = text[:time_start_idx].strip()
-            time_phrase = text[time_start_idx:].strip()
-        else:
-            task_desc = text
-            time_phrase = text
-        
+        text, task_desc, time_phrase = _split_reminder_text(text)
+        normalized_phrase = " ".join(time_phrase.split()).rstrip(".!?")
+
         # Get current IST time
         ist_now = datetime.datetime.now(IST)
-        
-        # Parse the date/time - let dateparser handle it first
-        parsed_date = dateparser.parse(
-            time_phrase,
-            settings={
-                'PREFER_DATES_FROM': 'future',
-                'RETURN_AS_TIMEZONE_AWARE': False  # Get naive datetime first
-            }
-        )
-        
-        if parsed_date is None:
+
+        parsed = _resolve_time_phrase(normalized_phrase, ist_now.strftime("%Y-%m-%d %H:%M"))
+        if parsed is None:
             return None, None
-        
-        # Now convert to IST-aware datetime
-        target_time = IST.localize(parsed_date)
-        
-        # Check if it's in the past
-        if target_time <= ist_now:
-            # If in past and no explicit date mentioned, assume user means today/tomorrow
-            if 'tomorrow' not in time_phrase.lower() and 'next' not in time_phrase.lower():
-                # Try to extract just the time and apply it to today
-                time_only_parsed = dateparser.parse(
-                    time_phrase,
-                    settings={
-                        'PARSERS': ['absolute-time'],
-                        'RETURN_AS_TIMEZONE_AWARE': False
-                    }
-                )
-                
-                if time_only_parsed:
-                    # Apply this time to today's date
-                    target_time = ist_now.replace(
-                        hour=time_only_parsed.hour,
-                        minute=time_only_parsed.minute,
-                        second=0,
-                        microsecond=0
-                    )
-                    
-                    # If still in past, add one day
-                    if target_time <= ist_now:
-                        target_time = target_time + datetime.timedelta(days=1)
-        
+        kind, value = parsed
+        target_time = ist_now + value if kind == "delta" else value
+
         # Extract task description if empty
         if not task_desc or len(task_desc) < 3:
             original_lower = text.lower()
@@ -306,434 +1349,2086 @@ def parse_reminder_request(text):
                 if idx > 0:
                     task_desc = text[:idx].strip()
                     break
-        
+
         # Final check - make sure we have a valid future time
         if target_time <= ist_now:
             return None, None
-        
+
         return task_desc, target_time
-        
+
     except Exception as e:
         print(f"❌ Error parsing reminder: {e}")
         import traceback
         traceback.print_exc()
         return None, None
 
-# ==========================================
-# HELPER FUNCTIONS
-# ==========================================
-def get_ist_time():
-    return datetime.datetime.now(IST)
+# ==========================================
+# HELPER FUNCTIONS
+# ==========================================
+def get_ist_time():
+    return datetime.datetime.now(IST)
+
+def get_ist_time_str():
+    return get_ist_time().strftime("%H:%M")
+
+def get_ist_display():
+    return get_ist_time().strftime("%I:%M:%S %p IST")
+
+# ==========================================
+# OUTBOUND MESSAGES
+# ==========================================
+# Every Telegram call goes through one dispatcher: a bounded priority queue
+# drained by a worker pool that keeps under Telegram's flood limits (~30 msg/s
+# overall, ~1 msg/s per chat) and backs off on 429s. Interactive replies
+# overtake queued reminders and bulk meal fan-out. A message that would go
+# over its chat's limit is set aside until its slot comes round rather than
+# holding a worker asleep.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REMINDER = 1
+PRIORITY_BULK = 2
+
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", "8"))
+SEND_QUEUE_SIZE = int(os.getenv("SEND_QUEUE_SIZE", "5000"))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+SEND_MAX_RATE_LIMIT_RETRIES = 5
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take one token and return how long to wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def idle(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.updated
+            return self.tokens + elapsed * self.rate >= self.capacity
+
+class OutboundDispatcher:
+    def __init__(self, workers, maxsize):
+        self.maxsize = maxsize
+        self._heap = []
+        # (not_before, seq, item) for chat heads waiting on their chat's bucket
+        self._throttled = []
+        # Items admitted and not yet handed to _deliver, wherever they wait.
+        self._size = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        # chat_id -> items waiting behind the one in flight, so messages to a
+        # chat always go out in the order they were queued.
+        self._busy_chats = {}
+        self._global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+        self._chat_buckets = {}
+        self._paused_until = 0.0
+        self._latencies = collections.deque(maxlen=1000)
+        self.counters = {"sent": 0, "failed": 0, "rate_limited": 0}
+        self.workers = workers
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"outbound-{i}", daemon=True).start()
+
+    def submit(self, priority, method, chat_id, *args, **kwargs):
+        """Queue bot.<method>(chat_id, *args, **kwargs) and return a Future for its result.
+
+        method may also be a callable taking chat_id first, for bot methods
+        whose own signature doesn't start with it.
+
+        Bulk and reminder producers block while the queue is full; interactive
+        replies are always admitted so users never wait behind a fan-out.
+        """
+        future = Future()
+        with self._lock:
+            while priority != PRIORITY_INTERACTIVE and self._size >= self.maxsize:
+                self._not_full.wait()
+            item = (priority, next(self._seq), time.monotonic(), future, method, chat_id, args, kwargs)
+            heapq.heappush(self._heap, item)
+            self._size += 1
+            self._not_empty.notify()
+        return future
+
+    def _next_item(self):
+        """(item, owned): owned items are throttled chat heads whose chat is already held"""
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                if self._throttled and self._throttled[0][0] <= now:
+                    return heapq.heappop(self._throttled)[2], True
+                if self._heap:
+                    return heapq.heappop(self._heap), False
+                self._not_empty.wait(self._throttled[0][0] - now if self._throttled else None)
+
+    def _throttle(self, item, wait):
+        """Set a chat head aside until its bucket has the token it reserved"""
+        with self._lock:
+            heapq.heappush(self._throttled, (time.monotonic() + wait, item[1], item))
+            self._not_empty.notify()
+
+    def _taken(self):
+        with self._lock:
+            self._size -= 1
+            self._not_full.notify()
+
+    def _worker(self):
+        while True:
+            item, owned = self._next_item()
+            chat_id = item[5]
+            if not owned:
+                with self._lock:
+                    if chat_id in self._busy_chats:
+                        self._busy_chats[chat_id].append(item)
+                        continue
+                    self._busy_chats[chat_id] = collections.deque()
+            while item is not None:
+                if not owned:
+                    wait = self._chat_bucket(chat_id).reserve()
+                    if wait > 0:
+                        # The chat stays held, so nothing behind it can overtake.
+                        self._throttle(item, wait)
+                        break
+                owned = False
+                self._taken()
+                self._deliver(item)
+                with self._lock:
+                    waiting = self._busy_chats[chat_id]
+                    if waiting:
+                        item = waiting.popleft()
+                    else:
+                        del self._busy_chats[chat_id]
+                        item = None
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            with self._lock:
+                if len(self._chat_buckets) > 10000:
+                    self._chat_buckets = {k: b for k, b in self._chat_buckets.items() if not b.idle()}
+                bucket = self._chat_buckets.setdefault(
+                    chat_id, TokenBucket(TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST))
+        return bucket
+
+    def _deliver(self, item):
+        priority, seq, enqueued_at, future, method, chat_id, args, kwargs = item
+        if not future.set_running_or_notify_cancel():
+            return
+        for attempt in range(SEND_MAX_RATE_LIMIT_RETRIES + 1):
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                time.sleep(pause)
+            time.sleep(self._global_bucket.reserve())
+            send_started = time.perf_counter()
+            try:
+                send = method if callable(method) else getattr(get_bot(), method)
+                result = send(chat_id, *args, **kwargs)
+            except Exception as e:
+                TELEGRAM_SEND_SECONDS.observe(time.perf_counter() - send_started, self._method_name(method))
+                retry_after = _retry_after(e)
+                if retry_after is not None and attempt < SEND_MAX_RATE_LIMIT_RETRIES:
+                    self.counters["rate_limited"] += 1
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                    print(f"⏳ Telegram rate limit hit, pausing sends for {retry_after}s")
+                    continue
+                self.counters["failed"] += 1
+                future.set_exception(e)
+                return
+            TELEGRAM_SEND_SECONDS.observe(time.perf_counter() - send_started, self._method_name(method))
+            self.counters["sent"] += 1
+            self._latencies.append(time.monotonic() - enqueued_at)
+            future.set_result(result)
+            return
+
+    @staticmethod
+    def _method_name(method):
+        return method if isinstance(method, str) else method.__name__.lstrip("_")
+
+    def queue_depth(self):
+        with self._lock:
+            return self._size
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+
+        def pct(p):
+            if not latencies:
+                return 0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000)
+
+        return dict(self.counters, queue_depth=self.queue_depth(),
+                    latency_p50_ms=pct(0.50), latency_p95_ms=pct(0.95))
+
+def _retry_after(error):
+    """Seconds Telegram asked us to wait, if this is a 429"""
+    if getattr(error, "error_code", None) != 429:
+        return None
+    try:
+        return int(error.result_json["parameters"]["retry_after"])
+    except (KeyError, TypeError, ValueError):
+        return 1
+
+outbound = OutboundDispatcher(SEND_WORKERS, SEND_QUEUE_SIZE)
+
+def _log_send_failure(future):
+    error = future.exception()
+    if error is not None:
+        print(f"❌ Error sending message: {error}")
+
+def is_parse_error(error):
+    """Telegram's 400 for Markdown/HTML it can't parse, e.g. an unclosed * in LLM output"""
+    return (getattr(error, "error_code", None) == 400
+            and "can't parse entities" in str(getattr(error, "description", error)))
+
+def _send_message(chat_id, text, **kwargs):
+    """send_message, resent as plain text if Telegram rejects the markup"""
+    try:
+        return get_bot().send_message(chat_id, text, **kwargs)
+    except Exception as e:
+        if not kwargs.get("parse_mode") or not is_parse_error(e):
+            raise
+        print(f"⚠️ Markup rejected for {chat_id}, resending as plain text: {e}")
+        return get_bot().send_message(chat_id, text, **dict(kwargs, parse_mode=None))
+
+def queue_message(chat_id, text, priority=PRIORITY_INTERACTIVE, **kwargs):
+    """Fire-and-forget send; failures are logged. Returns the Future for callers that need the Message"""
+    future = outbound.submit(priority, _send_message, chat_id, text, **kwargs)
+    future.add_done_callback(_log_send_failure)
+    return future
+
+def queue_reply(message, text, priority=PRIORITY_INTERACTIVE, **kwargs):
+    return queue_message(message.chat.id, text, priority=priority,
+                         reply_to_message_id=message.message_id, **kwargs)
+
+# ==========================================
+# SUBSCRIPTIONS
+# ==========================================
+SQL_SUBSCRIBE = '''
+    INSERT INTO subscriptions (chat_id, active, subscribed_at) VALUES (?, 1, ?)
+    ON CONFLICT (chat_id) DO UPDATE SET
+        active = 1, subscribed_at = excluded.subscribed_at, unsubscribed_at = NULL
+'''
+SQL_UNSUBSCRIBE = '''
+    UPDATE subscriptions SET active = 0, unsubscribed_at = ?
+    WHERE chat_id = ? AND active = 1
+'''
+SQL_ACTIVE_SUBSCRIBERS = 'SELECT chat_id FROM subscriptions WHERE active = 1'
+SQL_IS_SUBSCRIBED = 'SELECT 1 FROM subscriptions WHERE chat_id = ? AND active = 1'
+SQL_SUBSCRIBER_COUNT = 'SELECT COUNT(*) FROM subscriptions WHERE active = 1'
+SQL_PENDING_TASK_COUNT = 'SELECT COUNT(*) FROM tasks WHERE completed = 0'
+
+@timed_db
+def subscribe_chat(chat_id):
+    try:
+        conn = get_db()
+        with conn:
+            conn.execute(SQL_SUBSCRIBE, (chat_id, get_ist_time().isoformat()))
+        status.invalidate("subscribers")
+        print(f"✅ Subscribed chat_id: {chat_id}")
+    except Exception as e:
+        print(f"❌ Error subscribing chat_id: {e}")
+
+@timed_db
+def unsubscribe_chat(chat_id):
+    """Stop meal reminders for a chat; returns True if it was subscribed"""
+    try:
+        conn = get_db()
+        with conn:
+            changed = conn.execute(SQL_UNSUBSCRIBE, (get_ist_time().isoformat(), chat_id)).rowcount
+        if changed:
+            status.invalidate("subscribers")
+            print(f"✅ Unsubscribed chat_id: {chat_id}")
+        return bool(changed)
+    except Exception as e:
+        print(f"❌ Error unsubscribing chat_id: {e}")
+        return False
+
+@timed_db
+def get_subscribers():
+    """Every chat that should receive meal reminders, in a single query"""
+    try:
+        return [row[0] for row in get_db().execute(SQL_ACTIVE_SUBSCRIBERS)]
+    except Exception as e:
+        print(f"❌ Error getting subscribers: {e}")
+        return []
+
+@timed_db
+def count_subscribers():
+    try:
+        return get_db().execute(SQL_SUBSCRIBER_COUNT).fetchone()[0]
+    except Exception as e:
+        print(f"❌ Error counting subscribers: {e}")
+        return 0
+
+@timed_db
+def is_subscribed(chat_id):
+    try:
+        return get_db().execute(SQL_IS_SUBSCRIBED, (chat_id,)).fetchone() is not None
+    except Exception as e:
+        print(f"❌ Error checking subscription: {e}")
+        return False
+
+@timed_db
+def count_pending_tasks():
+    try:
+        return task_store.count_pending()
+    except Exception as e:
+        print(f"❌ Error counting tasks: {e}")
+        return 0
+
+def migrate_legacy_chat_id():
+    """Carry the single chat saved by older versions over into subscriptions"""
+    try:
+        if os.path.exists(CHAT_ID_FILE):
+            with open(CHAT_ID_FILE, "r") as f:
+                chat_id = int(f.read().strip())
+            subscribe_chat(chat_id)
+            os.remove(CHAT_ID_FILE)
+            print(f"✅ Migrated legacy chat_id: {chat_id}")
+    except Exception as e:
+        print(f"⚠️ Error migrating chat_id: {e}")
+
+# workout_done_today caches today's rows in workouts, so a restart in the
+# middle of the day still skips the evening exercise reminder.
+SQL_LOG_WORKOUT = 'INSERT OR IGNORE INTO workouts (day, chat_id, logged_at) VALUES (?, ?, ?)'
+SQL_WORKOUTS_ON = 'SELECT chat_id FROM workouts WHERE day = ?'
+
+@timed_db
+def log_workout(chat_id):
+    now = get_ist_time()
+    workout_done_today.add(chat_id)
+    status.invalidate("workouts_done")
+    try:
+        conn = get_db()
+        with conn:
+            conn.execute(SQL_LOG_WORKOUT, (now.strftime("%Y-%m-%d"), chat_id, now.isoformat()))
+    except Exception as e:
+        print(f"❌ Error logging workout: {e}")
+
+@timed_db
+def load_workouts_today():
+    """Refill workout_done_today from the database after a restart"""
+    try:
+        rows = get_db().execute(SQL_WORKOUTS_ON, (get_ist_time().strftime("%Y-%m-%d"),)).fetchall()
+    except Exception as e:
+        print(f"❌ Error loading workouts: {e}")
+        return
+    workout_done_today.clear()
+    workout_done_today.update(chat_id for (chat_id,) in rows)
+    status.invalidate("workouts_done")
+
+# ==========================================
+# OUTBOX
+# ==========================================
+# Scheduled messages (meal slots, task reminders and follow-ups) are written
+# to the outbox table before anything is sent, each under an idempotency key
+# such as 2026-03-10_lunch_12345 or task_42_followup, so queueing the same
+# thing twice still leaves one row. A single sender thread claims pending
+# rows in batches, hands them to the outbound dispatcher and writes the
+# outcomes back with one commit per batch.
+#
+# Rows are 'sending' while in flight. On restart those go back to 'pending'
+# and are sent again: a message Telegram accepted in the last moments before
+# a crash may repeat, but nothing queued is lost and nothing recorded as sent
+# goes out twice. Finding the work again only touches the partial indexes.
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_MAX_INFLIGHT = int(os.getenv("OUTBOX_MAX_INFLIGHT", "500"))
+OUTBOX_FLUSH_SECONDS = float(os.getenv("OUTBOX_FLUSH_SECONDS", "1.0"))
+OUTBOX_RETRY_SECONDS = int(os.getenv("OUTBOX_RETRY_SECONDS", "30"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "4"))
+OUTBOX_IDLE_SECONDS = 60
+OUTBOX_KEEP_DAYS = 7
+
+SQL_OUTBOX_INSERT = '''
+    INSERT OR IGNORE INTO outbox (idempotency_key, chat_id, kind, ref, priority, text, parse_mode,
+                                  due_at, next_attempt_at, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_OUTBOX_CLAIM = '''
+    UPDATE outbox SET status = 'sending'
+    WHERE id IN (
+        SELECT id FROM outbox WHERE status = 'pending' AND next_attempt_at <= ?
+        ORDER BY priority, id LIMIT ?
+    )
+    RETURNING id, chat_id, kind, ref, priority, text, parse_mode, attempts, due_at
+'''
+SQL_OUTBOX_SENT = '''
+    UPDATE outbox SET status = 'sent', attempts = attempts + 1, sent_at = ?, message_id = ?
+    WHERE id = ?
+'''
+SQL_OUTBOX_RETRY = '''
+    UPDATE outbox SET status = 'pending', attempts = ?, next_attempt_at = ?, last_error = ?
+    WHERE id = ?
+'''
+SQL_OUTBOX_FAILED = "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?"
+SQL_OUTBOX_RECOVER = "UPDATE outbox SET status = 'pending' WHERE status = 'sending'"
+SQL_OUTBOX_NEXT_ATTEMPT = "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'"
+SQL_OUTBOX_PENDING_COUNT = "SELECT COUNT(*) FROM outbox WHERE status = 'pending'"
+SQL_OUTBOX_PRUNE = "DELETE FROM outbox WHERE status IN ('sent', 'failed') AND created_at < ?"
+
+def enqueue_outbox(conn, rows):
+    """Insert (key, chat_id, kind, ref, priority, text, parse_mode, due_at) rows.
+
+    Runs inside the caller's transaction so the outbox rows commit together
+    with whatever produced them. Keys already present are ignored; returns
+    the number of new rows. Call outbox.wake() after the commit.
+    """
+    now = get_ist_time().isoformat()
+    return conn.executemany(SQL_OUTBOX_INSERT, [
+        (key, chat_id, kind, None if ref is None else str(ref), priority, text, parse_mode,
+         due_at.isoformat(), now, now)
+        for key, chat_id, kind, ref, priority, text, parse_mode, due_at in rows
+    ]).rowcount
+
+@timed_db
+def claim_outbox_batch(limit):
+    conn = get_db()
+    with conn:
+        rows = conn.execute(SQL_OUTBOX_CLAIM, (get_ist_time().isoformat(), limit)).fetchall()
+    # RETURNING order is unspecified
+    rows.sort(key=lambda row: (row[4], row[0]))
+    return rows
+
+@timed_db
+def recover_outbox():
+    """Hand rows left in flight by a previous run back to the sender"""
+    conn = get_db()
+    with conn:
+        recovered = conn.execute(SQL_OUTBOX_RECOVER).rowcount
+    if recovered:
+        print(f"⚠️ Re-queued {recovered} outbox messages left in flight by a previous run")
+
+@timed_db
+def seconds_until_next_attempt():
+    row = get_db().execute(SQL_OUTBOX_NEXT_ATTEMPT).fetchone()
+    if row[0] is None:
+        return OUTBOX_IDLE_SECONDS
+    wait = (datetime.datetime.fromisoformat(row[0]) - get_ist_time()).total_seconds()
+    return min(max(wait, 0.0), OUTBOX_IDLE_SECONDS)
+
+@timed_db
+def count_outbox_pending():
+    try:
+        return get_db().execute(SQL_OUTBOX_PENDING_COUNT).fetchone()[0]
+    except Exception as e:
+        print(f"❌ Error counting outbox: {e}")
+        return 0
+
+@timed_db
+def prune_outbox(now):
+    conn = get_db()
+    with conn:
+        conn.execute(SQL_OUTBOX_PRUNE, ((now - datetime.timedelta(days=OUTBOX_KEEP_DAYS)).isoformat(),))
+
+@timed_db
+def record_outbox_results(results):
+    """Write a batch of (row, future) send outcomes back in one commit; returns (sent, retrying, failed)"""
+    now = get_ist_time()
+    sent, retry, failed, unreachable = [], [], [], set()
+    for (row_id, chat_id, kind, ref, priority, text, parse_mode, attempts, due_at), future in results:
+        error = future.exception()
+        if error is None:
+            sent.append((now.isoformat(), getattr(future.result(), "message_id", None), row_id))
+            lag = (now - datetime.datetime.fromisoformat(due_at)).total_seconds()
+            REMINDER_LAG_SECONDS.observe(max(lag, 0.0), kind)
+            if kind == "meal":
+                scheduler_status["last_sent"] = f"{ref} at {now.strftime('%I:%M:%S %p IST')}"
+            print(f"✅ [{now.strftime('%I:%M:%S %p IST')}] Sent {kind} {ref} to {chat_id}")
+            continue
+        attempts += 1
+        if is_chat_unreachable(error) or attempts >= OUTBOX_MAX_ATTEMPTS:
+            failed.append((attempts, str(error)[:500], row_id))
+            if kind == "meal" and is_chat_unreachable(error):
+                unreachable.add(chat_id)
+            print(f"❌ Giving up on {kind} {ref} for {chat_id} after {attempts} attempts: {error}")
+        else:
+            retry_at = now + datetime.timedelta(seconds=OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1))
+            retry.append((attempts, retry_at.isoformat(), str(error)[:500], row_id))
+            print(f"❌ Error sending {kind} {ref} to {chat_id} (attempt {attempts}): {error}")
+
+    conn = get_db()
+    with conn:
+        conn.executemany(SQL_OUTBOX_SENT, sent)
+        conn.executemany(SQL_OUTBOX_RETRY, retry)
+        conn.executemany(SQL_OUTBOX_FAILED, failed)
+    for chat_id in unreachable:
+        unsubscribe_chat(chat_id)
+    return len(sent), len(retry), len(failed)
+
+class OutboxSender:
+    """Drains the outbox table through the outbound dispatcher"""
+    def __init__(self):
+        self._cv = threading.Condition()
+        self._results = []
+        self._inflight = 0
+        self._woken = False
+        self._started = False
+        self.counters = {"sent": 0, "retried": 0, "failed": 0}
+
+    def start(self):
+        with self._cv:
+            if self._started:
+                return
+            self._started = True
+        recover_outbox()
+        threading.Thread(target=self._run, name="outbox-sender", daemon=True).start()
+
+    def wake(self):
+        """Tell the sender new rows were committed"""
+        with self._cv:
+            self._woken = True
+            self._cv.notify()
+
+    def inflight(self):
+        with self._cv:
+            return self._inflight
+
+    def _on_done(self, row, future):
+        with self._cv:
+            self._results.append((row, future))
+            if len(self._results) >= OUTBOX_BATCH_SIZE or len(self._results) == self._inflight:
+                self._cv.notify()
+
+    def _submit(self, row):
+        with self._cv:
+            self._inflight += 1
+        kwargs = {"parse_mode": row[6]} if row[6] else {}
+        future = outbound.submit(row[4], _send_message, row[1], row[5], **kwargs)
+        future.add_done_callback(lambda done, row=row: self._on_done(row, done))
+
+    def _flush(self):
+        with self._cv:
+            results, self._results = self._results, []
+        if not results:
+            return
+        try:
+            sent, retried, failed = record_outbox_results(results)
+        except Exception:
+            with self._cv:
+                self._results = results + self._results
+            raise
+        with self._cv:
+            self._inflight -= len(results)
+        self.counters["sent"] += sent
+        self.counters["retried"] += retried
+        self.counters["failed"] += failed
+
+    def _wait(self):
+        # While sends are in flight, wake often enough to commit their
+        # outcomes in batches; otherwise sleep until the next retry is due.
+        timeout = OUTBOX_FLUSH_SECONDS if self.inflight() else seconds_until_next_attempt()
+        with self._cv:
+            done = len(self._results)
+            if not self._woken and done < OUTBOX_BATCH_SIZE and not (done and done == self._inflight):
+                self._cv.wait(timeout)
+            self._woken = False
+
+    def _run(self):
+        print("📤 Outbox sender started")
+        while True:
+            try:
+                self._flush()
+                room = min(OUTBOX_BATCH_SIZE, OUTBOX_MAX_INFLIGHT - self.inflight())
+                claimed = claim_outbox_batch(room) if room > 0 else []
+                for row in claimed:
+                    self._submit(row)
+                if not claimed or len(claimed) < room:
+                    self._wait()
+            except Exception as e:
+                print(f"❌ Outbox sender error: {e}")
+                time.sleep(OUTBOX_FLUSH_SECONDS)
+
+outbox = OutboxSender()
+
+# ==========================================
+# RESPONSE CACHE
+# ==========================================
+# Free-text questions repeat a lot ("can I eat paneer tonight", "how many
+# rotis"), so answers are cached in SQLite keyed on the normalized question
+# and PROMPT_VERSION. Editing the prompt or model changes the version, which
+# retires every old answer without a manual flush.
+RESPONSE_CACHE_TTL_HOURS = int(os.getenv("RESPONSE_CACHE_TTL_HOURS", "72"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+
+SQL_CACHE_LOOKUP = '''
+    SELECT response, prompt_tokens + completion_tokens FROM response_cache
+    WHERE cache_key = ? AND created_at >= ?
+'''
+SQL_CACHE_TOUCH = '''
+    UPDATE response_cache SET last_hit_at = ?, hits = hits + 1 WHERE cache_key = ?
+'''
+SQL_CACHE_STORE = '''
+    INSERT INTO response_cache
+        (cache_key, prompt_version, question, response, prompt_tokens,
+         completion_tokens, created_at, last_hit_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (cache_key) DO UPDATE SET
+        response = excluded.response, prompt_tokens = excluded.prompt_tokens,
+        completion_tokens = excluded.completion_tokens,
+        created_at = excluded.created_at, last_hit_at = excluded.last_hit_at, hits = 0
+'''
+SQL_CACHE_EXPIRE = 'DELETE FROM response_cache WHERE created_at < ? OR prompt_version != ?'
+SQL_CACHE_EVICT_LRU = '''
+    DELETE FROM response_cache WHERE cache_key IN (
+        SELECT cache_key FROM response_cache ORDER BY last_hit_at DESC LIMIT -1 OFFSET ?
+    )
+'''
+SQL_CACHE_COUNT = 'SELECT COUNT(*) FROM response_cache'
+SQL_CACHE_PREF = 'SELECT response_cache FROM chat_prefs WHERE chat_id = ?'
+SQL_SET_CACHE_PREF = '''
+    INSERT INTO chat_prefs (chat_id, response_cache) VALUES (?, ?)
+    ON CONFLICT (chat_id) DO UPDATE SET response_cache = excluded.response_cache
+'''
+
+_NON_WORD_RE = re.compile(r"[^\w\s]+")
+
+response_cache_stats = {
+    'hits': 0,
+    'misses': 0,
+    'saved_tokens': 0
+}
+_response_cache_lock = threading.Lock()
+
+def normalize_question(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(_NON_WORD_RE.sub(" ", text.lower()).split())
+
+def response_cache_key(text):
+    normalized = normalize_question(text)
+    return hashlib.sha256(f"{PROMPT_VERSION}\n{normalized}".encode("utf-8")).hexdigest()
+
+def _cache_cutoff():
+    return (get_ist_time() - datetime.timedelta(hours=RESPONSE_CACHE_TTL_HOURS)).isoformat()
+
+def _count_cache_result(hit, saved_tokens=0):
+    with _response_cache_lock:
+        if hit:
+            response_cache_stats['hits'] += 1
+            response_cache_stats['saved_tokens'] += saved_tokens
+        else:
+            response_cache_stats['misses'] += 1
+
+@timed_db
+def get_cached_response(text):
+    """Cached answer for this question, or None on a miss or expiry"""
+    try:
+        key = response_cache_key(text)
+        conn = get_db()
+        row = conn.execute(SQL_CACHE_LOOKUP, (key, _cache_cutoff())).fetchone()
+        if row is None:
+            _count_cache_result(False)
+            return None
+        with conn:
+            conn.execute(SQL_CACHE_TOUCH, (get_ist_time().isoformat(), key))
+        _count_cache_result(True, row[1] or 0)
+        return row[0]
+    except Exception as e:
+        print(f"⚠️ Response cache lookup failed: {e}")
+        return None
+
+@timed_db
+def store_cached_response(text, response, prompt_tokens=0, completion_tokens=0):
+    """Save an answer, then drop expired entries and trim to the LRU limit"""
+    try:
+        now = get_ist_time().isoformat()
+        conn = get_db()
+        with conn:
+            conn.execute(SQL_CACHE_STORE, (
+                response_cache_key(text), PROMPT_VERSION, normalize_question(text),
+                response, prompt_tokens, completion_tokens, now, now))
+            conn.execute(SQL_CACHE_EXPIRE, (_cache_cutoff(), PROMPT_VERSION))
+            conn.execute(SQL_CACHE_EVICT_LRU, (RESPONSE_CACHE_MAX_ENTRIES,))
+    except Exception as e:
+        print(f"⚠️ Response cache store failed: {e}")
+
+@timed_db
+def is_response_cache_enabled(chat_id):
+    try:
+        row = get_db().execute(SQL_CACHE_PREF, (chat_id,)).fetchone()
+        return row is None or bool(row[0])
+    except Exception as e:
+        print(f"❌ Error reading chat prefs: {e}")
+        return False
+
+@timed_db
+def set_response_cache_enabled(chat_id, enabled):
+    try:
+        conn = get_db()
+        with conn:
+            conn.execute(SQL_SET_CACHE_PREF, (chat_id, 1 if enabled else 0))
+        return True
+    except Exception as e:
+        print(f"❌ Error saving chat prefs: {e}")
+        return False
+
+def get_response_cache_stats():
+    with _response_cache_lock:
+        stats = dict(response_cache_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(100.0 * stats['hits'] / lookups, 1) if lookups else 0.0
+    try:
+        stats['entries'] = get_db().execute(SQL_CACHE_COUNT).fetchone()[0]
+    except Exception as e:
+        print(f"❌ Error counting cache entries: {e}")
+        stats['entries'] = 0
+    return stats
+
+# ==========================================
+# STREAMING REPLIES
+# ==========================================
+# With LLM_STREAMING on, handle_chat posts a placeholder straight away and
+# edits it as tokens arrive instead of waiting for the whole completion.
+# Telegram only tolerates about one edit per second per chat, so edits are
+# spaced STREAM_EDIT_INTERVAL apart and at most one is in flight; the rest of
+# the text simply rides along with the next edit.
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") == "1"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+STREAM_PLACEHOLDER = "💭 Thinking..."
+STREAM_CURSOR = " ▌"
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters each) for when the API reports none"""
+    return max(1, len(text) // 4)
+
+def _edit_message_text(chat_id, message_id, text, **kwargs):
+    return get_bot().edit_message_text(text, chat_id=chat_id, message_id=message_id, **kwargs)
+
+def is_not_modified(error):
+    return "message is not modified" in str(getattr(error, "description", error))
+
+def _log_edit_failure(future):
+    error = future.exception()
+    if error is not None and not is_not_modified(error):
+        print(f"❌ Error editing message: {error}")
+
+def queue_edit(chat_id, message_id, text, **kwargs):
+    future = outbound.submit(PRIORITY_INTERACTIVE, _edit_message_text, chat_id, message_id, text, **kwargs)
+    future.add_done_callback(_log_edit_failure)
+    return future
+
+def _finish_streamed_reply(chat_id, message_id, reply):
+    """Final edit with Markdown; fall back to plain text if Telegram rejects the markup"""
+    def fallback(future):
+        error = future.exception()
+        if error is not None and not is_not_modified(error):
+            queue_edit(chat_id, message_id, reply)
+
+    outbound.submit(PRIORITY_INTERACTIVE, _edit_message_text, chat_id, message_id,
+                    reply, parse_mode="Markdown").add_done_callback(fallback)
+
+def stream_chat_reply(message, messages, prompt_tokens):
+    """Stream the answer into a placeholder message; returns (reply, completion_tokens).
+
+    The pinned openai client can't report usage on streams, so the call is
+    recorded with both sides estimated, from whatever text arrived, even
+    when the stream fails.
+    """
+    chat_id = message.chat.id
+    placeholder = queue_reply(message, STREAM_PLACEHOLDER)
+    message_id = None
+    parts = []
+    last_edit = 0.0
+    pending_edit = None
+
+    def placeholder_id():
+        try:
+            return placeholder.result(timeout=30).message_id
+        except Exception:
+            return None
+
+    started = time.monotonic()
+    try:
+        stream = get_openai_client().chat.completions.create(
+            model=CHAT_MODEL,
+            messages=messages,
+            max_tokens=CHAT_MAX_TOKENS,
+            temperature=CHAT_TEMPERATURE,
+            stream=True
+        )
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            parts.append(delta)
+            now = time.monotonic()
+            if now - last_edit < STREAM_EDIT_INTERVAL or (pending_edit and not pending_edit.done()):
+                continue
+            if message_id is None:
+                message_id = placeholder_id()
+                if message_id is None:
+                    continue
+            pending_edit = queue_edit(chat_id, message_id, "".join(parts) + STREAM_CURSOR)
+            last_edit = now
+    except Exception as e:
+        message_id = message_id or placeholder_id()
+        if message_id is None:
+            queue_reply(message, f"⚠️ Error: {e}")
+        else:
+            queue_edit(chat_id, message_id, f"⚠️ Error: {e}")
+        return None, 0
+    finally:
+        record_llm_usage(chat_id, "chat", started, prompt_tokens=prompt_tokens,
+                         completion_tokens=estimate_tokens("".join(parts)) if parts else 0, estimated=True)
+
+    reply = "".join(parts)
+    message_id = message_id or placeholder_id()
+    if not reply:
+        if message_id is not None:
+            outbound.submit(PRIORITY_INTERACTIVE, "delete_message", chat_id, message_id)
+        return None, 0
+    if message_id is None:
+        queue_message(chat_id, reply, parse_mode="Markdown")
+    else:
+        _finish_streamed_reply(chat_id, message_id, reply)
+    return reply, estimate_tokens(reply)
+
+# ==========================================
+# CONVERSATION MEMORY
+# ==========================================
+# Each chat keeps its recent turns verbatim plus a rolling summary of
+# everything older. Token counts are estimated once when a turn is stored and
+# summed into conversation_state.live_tokens, so building a prompt is one
+# state lookup plus a bounded read of the newest turns, never a scan of the
+# whole history. When summary + live turns exceed the budget the chat is
+# handed to the compactor thread, which folds the oldest turns into the
+# summary off the request path.
+CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1200"))
+CONVERSATION_KEEP_TOKENS = int(os.getenv("CONVERSATION_KEEP_TOKENS", "600"))
+CONVERSATION_SUMMARY_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "250"))
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "40"))
+# A question asked after this long a pause starts a fresh exchange, so it may
+# be answered from the response cache.
+CONVERSATION_IDLE_MINUTES = int(os.getenv("CONVERSATION_IDLE_MINUTES", "30"))
+SYSTEM_PROMPT_TOKENS = estimate_tokens(SYSTEM_PROMPT)
+SUMMARY_WORDS = CONVERSATION_SUMMARY_TOKENS * 3 // 4
+
+SQL_CONVERSATION_STATE = '''
+    SELECT summary, summary_tokens, live_tokens, last_turn_at
+    FROM conversation_state WHERE chat_id = ?
+'''
+SQL_RECENT_TURNS = '''
+    SELECT role, content, tokens FROM conversation_messages
+    WHERE chat_id = ? AND summarized = 0 ORDER BY id DESC LIMIT ?
+'''
+SQL_INSERT_TURN = '''
+    INSERT INTO conversation_messages (chat_id, role, content, tokens, created_at)
+    VALUES (?, ?, ?, ?, ?)
+'''
+SQL_ADD_LIVE_TOKENS = '''
+    INSERT INTO conversation_state (chat_id, live_tokens, last_turn_at) VALUES (?, ?, ?)
+    ON CONFLICT (chat_id) DO UPDATE SET
+        live_tokens = live_tokens + excluded.live_tokens, last_turn_at = excluded.last_turn_at
+    RETURNING summary_tokens + live_tokens
+'''
+SQL_OLDEST_TURNS = '''
+    SELECT id, role, content, tokens FROM conversation_messages
+    WHERE chat_id = ? AND summarized = 0 ORDER BY id LIMIT ?
+'''
+SQL_MARK_SUMMARIZED = '''
+    UPDATE conversation_messages SET summarized = 1
+    WHERE chat_id = ? AND summarized = 0 AND id <= ?
+'''
+SQL_SAVE_SUMMARY = '''
+    UPDATE conversation_state
+    SET summary = ?, summary_tokens = ?, live_tokens = live_tokens - ?
+    WHERE chat_id = ?
+'''
+SQL_OVER_BUDGET_CHATS = '''
+    SELECT chat_id FROM conversation_state WHERE summary_tokens + live_tokens > ?
+'''
+SQL_FORGET_MESSAGES = 'DELETE FROM conversation_messages WHERE chat_id = ?'
+SQL_FORGET_STATE = 'DELETE FROM conversation_state WHERE chat_id = ?'
+
+_compaction_pending = set()
+_compaction_cv = threading.Condition()
+
+@timed_db
+def build_chat_context(chat_id, user_text):
+    """Messages for the chat completion: prompt, summary, recent turns, new question.
+
+    Returns (messages, prompt_tokens, fresh); fresh means the chat has been
+    quiet for CONVERSATION_IDLE_MINUTES, so the question starts a new exchange.
+    """
+    prompt_tokens = SYSTEM_PROMPT_TOKENS + estimate_tokens(user_text)
+    try:
+        conn = get_db()
+        state = conn.execute(SQL_CONVERSATION_STATE, (chat_id,)).fetchone()
+        if state is None:
+            return chat_messages(user_text), prompt_tokens, True
+        summary, summary_tokens, live_tokens, last_turn_at = state
+
+        history = []
+        budget = CONVERSATION_TOKEN_BUDGET - summary_tokens
+        for role, content, tokens in conn.execute(SQL_RECENT_TURNS, (chat_id, CONVERSATION_MAX_TURNS)):
+            if tokens > budget:
+                break
+            budget -= tokens
+            prompt_tokens += tokens
+            history.append({"role": role, "content": content})
+        history.reverse()
+        if summary:
+            prompt_tokens += summary_tokens
+
+        idle = get_ist_time() - datetime.datetime.fromisoformat(last_turn_at)
+        return (chat_messages(user_text, summary, history), prompt_tokens,
+                idle > datetime.timedelta(minutes=CONVERSATION_IDLE_MINUTES))
+    except Exception as e:
+        print(f"⚠️ Conversation lookup failed: {e}")
+        return chat_messages(user_text), prompt_tokens, True
+
+@timed_db
+def record_turn(chat_id, user_text, reply):
+    """Store a question/answer pair and queue compaction if the chat is over budget"""
+    try:
+        now = get_ist_time().isoformat()
+        turns = [(chat_id, "user", user_text, estimate_tokens(user_text), now),
+                 (chat_id, "assistant", reply, estimate_tokens(reply), now)]
+        conn = get_db()
+        with conn:
+            conn.executemany(SQL_INSERT_TURN, turns)
+            total = conn.execute(SQL_ADD_LIVE_TOKENS,
+                                 (chat_id, sum(turn[3] for turn in turns), now)).fetchone()[0]
+        if total > CONVERSATION_TOKEN_BUDGET:
+            request_compaction(chat_id)
+    except Exception as e:
+        print(f"⚠️ Couldn't save conversation turn: {e}")
+
+@timed_db
+def forget_conversation(chat_id):
+    try:
+        conn = get_db()
+        with conn:
+            conn.execute(SQL_FORGET_MESSAGES, (chat_id,))
+            conn.execute(SQL_FORGET_STATE, (chat_id,))
+        return True
+    except Exception as e:
+        print(f"❌ Error clearing conversation: {e}")
+        return False
+
+def request_compaction(chat_id):
+    with _compaction_cv:
+        _compaction_pending.add(chat_id)
+        _compaction_cv.notify()
+
+def compact_conversation(chat_id):
+    """Fold the oldest live turns into the summary until CONVERSATION_KEEP_TOKENS remain"""
+    conn = get_db()
+    state = conn.execute(SQL_CONVERSATION_STATE, (chat_id,)).fetchone()
+    if state is None or state[1] + state[2] <= CONVERSATION_TOKEN_BUDGET:
+        return
+    summary, _, live_tokens, _ = state
+
+    folded, folded_tokens, last_id = [], 0, None
+    for turn_id, role, content, tokens in conn.execute(SQL_OLDEST_TURNS, (chat_id, CONVERSATION_MAX_TURNS)):
+        if live_tokens - folded_tokens <= CONVERSATION_KEEP_TOKENS:
+            break
+        folded.append(f"{'Client' if role == 'user' else 'Coach'}: {content}")
+        folded_tokens += tokens
+        last_id = turn_id
+    if last_id is None:
+        return
+
+    excerpt = "\n".join(folded)
+    started = time.monotonic()
+    completion = get_openai_client().chat.completions.create(
+        model=CHAT_MODEL,
+        messages=summary_messages(summary, excerpt, SUMMARY_WORDS),
+        max_tokens=CONVERSATION_SUMMARY_TOKENS,
+        temperature=SUMMARY_TEMPERATURE
+    )
+    record_llm_usage(chat_id, "summary", started, completion.usage)
+    new_summary = (completion.choices[0].message.content or "").strip() or summary
+    with conn:
+        conn.execute(SQL_MARK_SUMMARIZED, (chat_id, last_id))
+        conn.execute(SQL_SAVE_SUMMARY, (new_summary, estimate_tokens(new_summary), folded_tokens, chat_id))
+    print(f"✅ Compacted {len(folded)} turns for chat {chat_id} ({folded_tokens} tokens)")
+
+def conversation_compactor():
+    print("🧠 Conversation compactor started")
+    try:
+        for (chat_id,) in get_db().execute(SQL_OVER_BUDGET_CHATS, (CONVERSATION_TOKEN_BUDGET,)).fetchall():
+            request_compaction(chat_id)
+    except Exception as e:
+        print(f"❌ Error finding chats to compact: {e}")
+    while True:
+        with _compaction_cv:
+            while not _compaction_pending:
+                _compaction_cv.wait()
+            chat_id = _compaction_pending.pop()
+        try:
+            compact_conversation(chat_id)
+        except Exception as e:
+            print(f"❌ Compaction failed for chat {chat_id}: {e}")
+            time.sleep(TASK_RETRY_SECONDS)
+
+# ==========================================
+# USAGE ACCOUNTING
+# ==========================================
+# Every OpenAI call adds to one llm_usage row per (IST day, chat, kind), so
+# the table grows by a handful of rows per active chat per day no matter
+# how many calls are made. Prices are per million tokens (per minute for
+# Whisper) and only used to turn the rollups into an estimated cost. Calls
+# whose token counts were estimated from the text (streamed answers) are
+# counted in estimated_calls.
+LLM_PRICE_INPUT_PER_M = float(os.getenv("LLM_PRICE_INPUT_PER_M", "0.15"))
+LLM_PRICE_CACHED_INPUT_PER_M = float(os.getenv("LLM_PRICE_CACHED_INPUT_PER_M", "0.075"))
+LLM_PRICE_OUTPUT_PER_M = float(os.getenv("LLM_PRICE_OUTPUT_PER_M", "0.60"))
+WHISPER_PRICE_PER_MINUTE = float(os.getenv("WHISPER_PRICE_PER_MINUTE", "0.006"))
+USAGE_MAX_DAYS = 90
+
+SQL_RECORD_USAGE = '''
+    INSERT INTO llm_usage
+        (day, chat_id, kind, calls, prompt_tokens, completion_tokens,
+         cached_tokens, audio_seconds, latency_ms, estimated_calls)
+    VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (day, chat_id, kind) DO UPDATE SET
+        calls = calls + 1,
+        prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+        completion_tokens = completion_tokens + excluded.completion_tokens,
+        cached_tokens = cached_tokens + excluded.cached_tokens,
+        audio_seconds = audio_seconds + excluded.audio_seconds,
+        latency_ms = latency_ms + excluded.latency_ms,
+        estimated_calls = estimated_calls + excluded.estimated_calls
+'''
+_USAGE_TOTALS = '''
+    COUNT(DISTINCT chat_id), SUM(calls), SUM(prompt_tokens), SUM(completion_tokens),
+    SUM(cached_tokens), SUM(audio_seconds), SUM(latency_ms), SUM(estimated_calls)
+'''
+SQL_USAGE_BY_DAY = f'''
+    SELECT day, {_USAGE_TOTALS} FROM llm_usage WHERE day >= ? GROUP BY day ORDER BY day DESC
+'''
+SQL_USAGE_FOR_CHAT = f'SELECT {_USAGE_TOTALS} FROM llm_usage WHERE chat_id = ? AND day >= ?'
+SQL_USAGE_SINCE = f'SELECT {_USAGE_TOTALS} FROM llm_usage WHERE day >= ?'
+
+def _cached_tokens(usage):
+    """prompt_tokens_details.cached_tokens, which older clients only expose as an extra field"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", 0) or 0
+
+@timed_db
+def record_llm_usage(chat_id, kind, started, usage=None, prompt_tokens=0,
+                     completion_tokens=0, audio_seconds=0, estimated=False):
+    """Add one call to today's rollup; started is the time.monotonic() before the call.
+
+    Counts from the API's usage object win over the estimates passed in;
+    estimated=True marks a call that had no usage object at all.
+    """
+    latency = time.monotonic() - started
+    OPENAI_SECONDS.observe(latency, kind)
+    try:
+        latency_ms = int(latency * 1000)
+        cached_tokens = 0
+        if usage is not None:
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or prompt_tokens
+            completion_tokens = getattr(usage, "completion_tokens", 0) or completion_tokens
+            cached_tokens = _cached_tokens(usage)
+        conn = get_db()
+        with conn:
+            conn.execute(SQL_RECORD_USAGE, (
+                get_ist_time().strftime('%Y-%m-%d'), chat_id, kind, prompt_tokens,
+                completion_tokens, cached_tokens, int(audio_seconds or 0), latency_ms, int(estimated)))
+    except Exception as e:
+        print(f"⚠️ Couldn't record usage: {e}")
+
+def _usage_summary(row):
+    (active_chats, calls, prompt_tokens, completion_tokens, cached_tokens, audio_seconds, latency_ms,
+     estimated_calls) = (value or 0 for value in row)
+    cost = ((prompt_tokens - cached_tokens) * LLM_PRICE_INPUT_PER_M
+            + cached_tokens * LLM_PRICE_CACHED_INPUT_PER_M
+            + completion_tokens * LLM_PRICE_OUTPUT_PER_M) / 1_000_000
+    cost += audio_seconds / 60 * WHISPER_PRICE_PER_MINUTE
+    return {
+        "active_chats": active_chats,
+        "calls": calls,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "cached_pct": round(100.0 * cached_tokens / prompt_tokens, 1) if prompt_tokens else 0.0,
+        "audio_seconds": audio_seconds,
+        "avg_latency_ms": round(latency_ms / calls) if calls else 0,
+        "estimated_calls": estimated_calls,
+        "cost_usd": round(cost, 4),
+        "cost_per_active_chat_usd": round(cost / active_chats, 4) if active_chats else 0.0,
+    }
+
+def _usage_since(days):
+    days = max(1, min(days, USAGE_MAX_DAYS))
+    return (get_ist_time() - datetime.timedelta(days=days - 1)).strftime('%Y-%m-%d')
+
+@timed_db
+def get_usage_by_day(days=7):
+    try:
+        rows = get_db().execute(SQL_USAGE_BY_DAY, (_usage_since(days),)).fetchall()
+        return [dict(_usage_summary(row[1:]), day=row[0]) for row in rows]
+    except Exception as e:
+        print(f"❌ Error reading usage: {e}")
+        return []
+
+@timed_db
+def get_usage_totals(days=7, chat_id=None):
+    try:
+        if chat_id is None:
+            row = get_db().execute(SQL_USAGE_SINCE, (_usage_since(days),)).fetchone()
+        else:
+            row = get_db().execute(SQL_USAGE_FOR_CHAT, (chat_id, _usage_since(days))).fetchone()
+        return _usage_summary(row)
+    except Exception as e:
+        print(f"❌ Error reading usage: {e}")
+        return _usage_summary((0,) * 8)
+
+# ==========================================
+# MESSAGE TEMPLATES
+# ==========================================
+# Default reminder content. A JSON CONTENT_FILE may override any of
+# "water_messages", "exercise_messages", "food_options", "meal_titles" and
+# "meal_footers"; send /reload (or SIGHUP) after editing it.
+CONTENT_FILE = os.getenv("CONTENT_FILE")
+
+WATER_MESSAGES = [
+    "💧 *Water Time!*\n\nDrink 1 glass of water RIGHT NOW.\n\n💡 Tip: NOT during meals! Drink 30 min before or after eating.",
+    "💧 *Hydration Check!*\n\nHave you had water recently?\n\nDrink 1 glass now! Goal: 8-10 glasses daily. 🚰",
+    "💧 *Water Break!*\n\n1 glass of water = better metabolism!\n\nDrink it now! 💪",
+    "💧 *Thirsty?*\n\nEven if not, drink 1 glass NOW.\n\nProper hydration helps with weight loss!",
+    "💧 *Water Alert!*\n\nYour body needs water every 1-2 hours.\n\nDrink 1 glass right now!",
+    "💧 *Hydrate Now!*\n\n1 glass of water helps:\n• Reduce hunger\n• Boost metabolism\n• Flush toxins\n\nDrink up! 🚰"
+]
+
+EXERCISE_MESSAGES = {
+    "morning": (
+        "🏋️ *Morning Workout Time!*\n\n"
+        "⏰ 7:00 AM - Perfect time for your workout!\n\n"
+        "Today's plan: HIIT + Weights (30-60 min)\n\n"
+        "💡 Tips:\n"
+        "• Light snack if needed (banana/5-6 almonds)\n"
+        "• Drink water before starting\n"
+        "• This consistency will help break your plateau!\n\n"
+        "✅ Reply 'workout done' after your workout!"
+    ),
+    "evening": (
+        "⚠️ *Workout Reminder!*\n\n"
+        "🏋️ It's 5:00 PM - Haven't seen your workout today!\n\n"
+        "If morning got busy, let's do it now:\n"
+        "• Even 20-30 min is better than skipping!\n"
+        "• Quick option: 3 rounds of:\n"
+        "  - 20 squats\n"
+        "  - 15 push-ups\n"
+        "  - 30 sec plank\n"
+        "  - 20 jumping jacks\n\n"
+        "💪 Consistency is key to breaking your plateau!\n\n"
+        "✅ Reply 'workout done' when finished!"
+    ),
+}
+
+FOOD_OPTIONS = {
+    "morning_routine": [
+        "💧 Warm water/lemon water/ajwain-jeera water",
+        "🏋️ Pre-workout: Banana/5-6 almonds (optional)"
+    ],
+    "post_workout": [
+        "💪 Recovery: Fruit/almonds/coconut water/roasted chana"
+    ],
+    "breakfast": [
+        "🥘 *IDEAL OPTIONS:*",
+        "• Moong dal chilla (2 medium)",
+        "• Besan chilla (2 medium)",
+        "• Poha (1.5 cups)",
+        "• Upma (1 bowl)",
+        "• Paneer bhurji (50g = palm size)",
+        "",
+        "🏠 *FAMILY MEAL (Dry Sabzi + Roti):*",
+        "• 2 multigrain rotis (medium size)",
+        "• Dry sabzi: 1 small bowl (1 cup max)",
+        "• If potato sabzi: 4-5 pieces max",
+        "• Add: 1 small bowl curd/sprouts for protein",
+        "",
+        "⚡ *QUICK OPTION:*",
+        "• 2 toast + 2 tsp peanut butter",
+        "• OR Banana + 8-10 almonds"
+    ],
+    "midday_hydration": [
+        "💧 Water/Coconut water/Lemonade (no sugar)",
+        "🍎 Optional: Small fruit if hungry"
+    ],
+    "lunch": [
+        "🥘 *IDEAL BALANCED MEAL:*",
+        "• Start with salad (cucumber/carrot/sprouts)",
+        "• 2 multigrain rotis",
+        "• Wet sabzi/dal: 1 SMALL bowl (1 cup)",
+        "• OR Rajma/Chole: ½ cup",
+        "• Curd: 1 small bowl",
+        "",
+        "⚠️ *PORTION CONTROL RULES:*",
+        "• Sabzi bowl = your fist size (NOT serving bowl!)",
+        "• If paneer sabzi: 50-60g paneer max",
+        "• Rice option: 1 roti + ½ cup rice + dal",
+        "• Ghee in sabzi: Ask for LIGHT hand (1 tsp max)",
+        "",
+        "🥗 *REMEMBER:* Eat salad FIRST to feel fuller!"
+    ],
+    "snack": [
+        "🥜 *HEALTHY OPTIONS:*",
+        "• Roasted chana: 2-3 tbsp",
+        "• Makhana: 1 cup",
+        "• Mixed nuts: 10-12 pieces",
+        "• Apple/Pomegranate",
+        "",
+        "⚠️ *IF FAMILY HAS NAMKEEN:*",
+        "• Your limit: 2 tbsp MAX",
+        "• OR Better: Mix 1 tbsp namkeen + 2 tbsp roasted chana",
+        "• This is YOUR weak time - stay strong! 💪"
+    ],
+    "dinner": [
+        "🏠 *FAMILY MEAL (Stuffed Roti):*",
+        "• 1.5-2 stuffed rotis (medium size)",
+        "• If very filling: Just 1.5 roti",
+        "• Side: Small bowl curd/raita",
+        "",
+        "🌙 *LIGHTER OPTIONS (Better for weight loss):*",
+        "• Moong dal khichdi: 1 bowl + curd",
+        "• Daliya: 1 bowl",
+        "• 1 roti + dal + sabzi (small portions)",
+        "• Soup + 1 roti",
+        "",
+        "✨ *IDEAL:* Keep dinner lighter than lunch!"
+    ],
+    "night_craving": [
+        "🍵 *BEST CHOICES:*",
+        "• Warm water with ajwain-jeera-haldi",
+        "• Warm lemon water",
+        "• Cinnamon water",
+        "",
+        "🥜 *IF REALLY HUNGRY:*",
+        "• Makhana: ½ cup",
+        "• Roasted chana: 2 tbsp",
+        "• 6-8 almonds",
+        "• Khakhra: 2 pieces",
+        "",
+        "🍯 *SWEET CRAVING:*",
+        "• Small piece jaggery",
+        "• Warm milk + pinch cinnamon",
+        "",
+        "🚫 *AVOID:* Namkeen, biscuits, apple (at night), fried snacks"
+    ]
+}
+
+MEAL_TITLES = {
+    "morning_routine": "🌅 GOOD MORNING!",
+    "post_workout": "💪 Post-Workout Recovery",
+    "breakfast": "🍳 Breakfast Time!",
+    "midday_hydration": "💧 Midday Check-in!",
+    "lunch": "🍽️ Lunch Time!",
+    "snack": "☕ Evening Snack Time!",
+    "dinner": "🌆 Dinner Time!",
+    "night_craving": "🌙 Night Craving Alert!"
+}
 
-def get_ist_time_str():
-    return get_ist_time().strftime("%H:%M")
+MEAL_FOOTERS = {
+    "lunch": "💡 Walk 5-10 mins after eating for better digestion!",
+    "dinner": "💡 Walk 5-10 mins after eating for better digestion!",
+    "snack": "💪 This is your challenging time - you've got this!",
+    "night_craving": "✨ Smart choices now = lighter morning tomorrow!"
+}
 
-def get_ist_display():
-    return get_ist_time().strftime("%I:%M:%S %p IST")
+# Everything in a reminder except the send time is rendered once, at import
+# or on reload. Food reminders are kept as (head, tail) around the timestamp.
+message_templates = {}
 
-def save_chat_id(chat_id):
-    global active_chat_id
-    active_chat_id = chat_id
-    try:
-        with open(CHAT_ID_FILE, "w") as f:
-            f.write(str(chat_id))
-        print(f"✅ Saved chat_id: {chat_id}")
-    except Exception as e:
-        print(f"❌ Error saving chat_id: {e}")
+def _default_content():
+    return {
+        "water_messages": WATER_MESSAGES,
+        "exercise_messages": EXERCISE_MESSAGES,
+        "food_options": FOOD_OPTIONS,
+        "meal_titles": MEAL_TITLES,
+        "meal_footers": MEAL_FOOTERS
+    }
+
+def _load_content():
+    content = _default_content()
+    if CONTENT_FILE:
+        with open(CONTENT_FILE, encoding="utf-8") as f:
+            overrides = json.load(f)
+        for key, value in overrides.items():
+            if key not in content:
+                print(f"⚠️ Unknown content key: {key}")
+            elif isinstance(content[key], dict):
+                content[key] = dict(content[key], **value)
+            else:
+                content[key] = value
+    return content
+
+def build_message_templates(content):
+    food = {}
+    for meal, options in content["food_options"].items():
+        head = "*{title}*\n⏰ ".format(title=content["meal_titles"].get(meal, meal))
+        tail = "\n\n" + "".join(f"{item}\n" for item in options)
+        footer = content["meal_footers"].get(meal)
+        if footer:
+            tail += "\n" + footer
+        food[meal] = (head, tail)
+    return {
+        "water": tuple(content["water_messages"]),
+        "exercise": dict(content["exercise_messages"]),
+        "food": food
+    }
 
-def load_chat_id():
-    global active_chat_id
+def reload_message_templates():
+    """Re-read CONTENT_FILE and swap in freshly rendered templates; keeps the old ones on error"""
+    global message_templates
     try:
-        if os.path.exists(CHAT_ID_FILE):
-            with open(CHAT_ID_FILE, "r") as f:
-                chat_id = int(f.read().strip())
-                active_chat_id = chat_id
-                print(f"✅ Loaded chat_id: {chat_id}")
-                return chat_id
+        message_templates = build_message_templates(_load_content())
+        print(f"✅ Message templates loaded ({len(message_templates['food'])} meals)")
+        return True
     except Exception as e:
-        print(f"⚠️ Error loading chat_id: {e}")
-    return None
+        print(f"❌ Error loading message templates: {e}")
+        if not message_templates:
+            message_templates = build_message_templates(_default_content())
+        return False
 
-load_chat_id()
+reload_message_templates()
 
 def get_water_reminder():
-    import random
-    messages = [
-        "💧 *Water Time!*\n\nDrink 1 glass of water RIGHT NOW.\n\n💡 Tip: NOT during meals! Drink 30 min before or after eating.",
-        "💧 *Hydration Check!*\n\nHave you had water recently?\n\nDrink 1 glass now! Goal: 8-10 glasses daily. 🚰",
-        "💧 *Water Break!*\n\n1 glass of water = better metabolism!\n\nDrink it now! 💪",
-        "💧 *Thirsty?*\n\nEven if not, drink 1 glass NOW.\n\nProper hydration helps with weight loss!",
-        "💧 *Water Alert!*\n\nYour body needs water every 1-2 hours.\n\nDrink 1 glass right now!",
-        "💧 *Hydrate Now!*\n\n1 glass of water helps:\n• Reduce hunger\n• Boost metabolism\n• Flush toxins\n\nDrink up! 🚰"
-    ]
-    return random.choice(messages)
+    return random.choice(message_templates["water"])
 
 def get_exercise_reminder(time_of_day):
-    if time_of_day == "morning":
-        return (
-            "🏋️ *Morning Workout Time!*\n\n"
-            "⏰ 7:00 AM - Perfect time for your workout!\n\n"
-            "Today's plan: HIIT + Weights (30-60 min)\n\n"
-            "💡 Tips:\n"
-            "• Light snack if needed (banana/5-6 almonds)\n"
-            "• Drink water before starting\n"
-            "• This consistency will help break your plateau!\n\n"
-            "✅ Reply 'workout done' after your workout!"
-        )
-    else:
-        return (
-            "⚠️ *Workout Reminder!*\n\n"
-            "🏋️ It's 5:00 PM - Haven't seen your workout today!\n\n"
-            "If morning got busy, let's do it now:\n"
-            "• Even 20-30 min is better than skipping!\n"
-            "• Quick option: 3 rounds of:\n"
-            "  - 20 squats\n"
-            "  - 15 push-ups\n"
-            "  - 30 sec plank\n"
-            "  - 20 jumping jacks\n\n"
-            "💪 Consistency is key to breaking your plateau!\n\n"
-            "✅ Reply 'workout done' when finished!"
-        )
+    return message_templates["exercise"]["morning" if time_of_day == "morning" else "evening"]
 
-def get_food_options(meal):
-    options_map = {
-        "morning_routine": [
-            "💧 Warm water/lemon water/ajwain-jeera water",
-            "🏋️ Pre-workout: Banana/5-6 almonds (optional)"
-        ],
-        "post_workout": [
-            "💪 Recovery: Fruit/almonds/coconut water/roasted chana"
-        ],
-        "breakfast": [
-            "🥘 *IDEAL OPTIONS:*",
-            "• Moong dal chilla (2 medium)",
-            "• Besan chilla (2 medium)",
-            "• Poha (1.5 cups)",
-            "• Upma (1 bowl)",
-            "• Paneer bhurji (50g = palm size)",
-            "",
-            "🏠 *FAMILY MEAL (Dry Sabzi + Roti):*",
-            "• 2 multigrain rotis (medium size)",
-            "• Dry sabzi: 1 small bowl (1 cup max)",
-            "• If potato sabzi: 4-5 pieces max",
-            "• Add: 1 small bowl curd/sprouts for protein",
-            "",
-            "⚡ *QUICK OPTION:*",
-            "• 2 toast + 2 tsp peanut butter",
-            "• OR Banana + 8-10 almonds"
-        ],
-        "midday_hydration": [
-            "💧 Water/Coconut water/Lemonade (no sugar)",
-            "🍎 Optional: Small fruit if hungry"
-        ],
-        "lunch": [
-            "🥘 *IDEAL BALANCED MEAL:*",
-            "• Start with salad (cucumber/carrot/sprouts)",
-            "• 2 multigrain rotis",
-            "• Wet sabzi/dal: 1 SMALL bowl (1 cup)",
-            "• OR Rajma/Chole: ½ cup",
-            "• Curd: 1 small bowl",
-            "",
-            "⚠️ *PORTION CONTROL RULES:*",
-            "• Sabzi bowl = your fist size (NOT serving bowl!)",
-            "• If paneer sabzi: 50-60g paneer max",
-            "• Rice option: 1 roti + ½ cup rice + dal",
-            "• Ghee in sabzi: Ask for LIGHT hand (1 tsp max)",
-            "",
-            "🥗 *REMEMBER:* Eat salad FIRST to feel fuller!"
-        ],
-        "snack": [
-            "🥜 *HEALTHY OPTIONS:*",
-            "• Roasted chana: 2-3 tbsp",
-            "• Makhana: 1 cup",
-            "• Mixed nuts: 10-12 pieces",
-            "• Apple/Pomegranate",
-            "",
-            "⚠️ *IF FAMILY HAS NAMKEEN:*",
-            "• Your limit: 2 tbsp MAX",
-            "• OR Better: Mix 1 tbsp namkeen + 2 tbsp roasted chana",
-            "• This is YOUR weak time - stay strong! 💪"
-        ],
-        "dinner": [
-            "🏠 *FAMILY MEAL (Stuffed Roti):*",
-            "• 1.5-2 stuffed rotis (medium size)",
-            "• If very filling: Just 1.5 roti",
-            "• Side: Small bowl curd/raita",
-            "",
-            "🌙 *LIGHTER OPTIONS (Better for weight loss):*",
-            "• Moong dal khichdi: 1 bowl + curd",
-            "• Daliya: 1 bowl",
-            "• 1 roti + dal + sabzi (small portions)",
-            "• Soup + 1 roti",
-            "",
-            "✨ *IDEAL:* Keep dinner lighter than lunch!"
-        ],
-        "night_craving": [
-            "🍵 *BEST CHOICES:*",
-            "• Warm water with ajwain-jeera-haldi",
-            "• Warm lemon water",
-            "• Cinnamon water",
-            "",
-            "🥜 *IF REALLY HUNGRY:*",
-            "• Makhana: ½ cup",
-            "• Roasted chana: 2 tbsp",
-            "• 6-8 almonds",
-            "• Khakhra: 2 pieces",
-            "",
-            "🍯 *SWEET CRAVING:*",
-            "• Small piece jaggery",
-            "• Warm milk + pinch cinnamon",
-            "",
-            "🚫 *AVOID:* Namkeen, biscuits, apple (at night), fried snacks"
-        ]
-    }
-    return options_map.get(meal, ["Options not found"])
+def render_meal_message(meal, time_display):
+    head, tail = message_templates["food"].get(meal) or (f"*{meal}*\n⏰ ", "\n\nOptions not found\n")
+    return head + time_display + tail
 
-def send_meal_reminder(chat_id, meal):
-    global scheduler_status, workout_done_today
-    try:
-        current_time = get_ist_display()
+def build_meal_message(chat_id, meal, time_display=None):
+    """Message text for a meal slot, or None when this chat should be skipped"""
+    if meal.startswith("water_"):
+        return get_water_reminder()
 
-        if meal.startswith("water_"):
-            message = get_water_reminder()
-            bot.send_message(chat_id, message, parse_mode="Markdown")
-            scheduler_status["last_sent"] = f"{meal} at {current_time}"
-            print(f"✅ [{current_time}] Sent water reminder to {chat_id}")
-            return True
+    if meal == "exercise_morning":
+        return get_exercise_reminder("morning")
 
-        if meal == "exercise_morning":
-            message = get_exercise_reminder("morning")
-            bot.send_message(chat_id, message, parse_mode="Markdown")
-            scheduler_status["last_sent"] = f"{meal} at {current_time}"
-            print(f"✅ [{current_time}] Sent morning exercise reminder to {chat_id}")
-            return True
+    if meal == "exercise_backup":
+        if chat_id in workout_done_today:
+            return None
+        return get_exercise_reminder("evening")
 
-        if meal == "exercise_backup":
-            if not workout_done_today:
-                message = get_exercise_reminder("evening")
-                bot.send_message(chat_id, message, parse_mode="Markdown")
-                scheduler_status["last_sent"] = f"{meal} at {current_time}"
-                print(f"✅ [{current_time}] Sent backup exercise reminder to {chat_id}")
-            else:
-                print(f"⏭️ [{current_time}] Skipped backup - workout already done today!")
-            return True
+    return render_meal_message(meal, time_display or get_ist_display())
 
-        options = get_food_options(meal)
-
-        titles = {
-            "morning_routine": "🌅 GOOD MORNING!",
-            "post_workout": "💪 Post-Workout Recovery",
-            "breakfast": "🍳 Breakfast Time!",
-            "midday_hydration": "💧 Midday Check-in!",
-            "lunch": "🍽️ Lunch Time!",
-            "snack": "☕ Evening Snack Time!",
-            "dinner": "🌆 Dinner Time!",
-            "night_craving": "🌙 Night Craving Alert!"
-        }
+def _queue_meal_reminder(chat_id, meal, priority, time_display=None):
+    message = build_meal_message(chat_id, meal, time_display)
+    if message is None:
+        print(f"⏭️ [{get_ist_display()}] Skipped {meal} for {chat_id} - workout already done today!")
+        return None
+    return outbound.submit(priority, _send_message, chat_id, message, parse_mode="Markdown")
 
-        message = "*{title}*\n⏰ {time}\n\n".format(
-            title=titles.get(meal, meal),
-            time=current_time
-        )
-        for item in options:
-            message += f"{item}\n"
-
-        if meal in ["lunch", "dinner"]:
-            message += "\n💡 Walk 5-10 mins after eating for better digestion!"
-        elif meal == "snack":
-            message += "\n💪 This is your challenging time - you've got this!"
-        elif meal == "night_craving":
-            message += "\n✨ Smart choices now = lighter morning tomorrow!"
-
-        bot.send_message(chat_id, message, parse_mode="Markdown")
-        scheduler_status["last_sent"] = f"{meal} at {current_time}"
-        print(f"✅ [{current_time}] Sent {meal} to {chat_id}")
+def _finish_meal_reminder(chat_id, meal, future):
+    """Wait for a queued meal reminder and record the outcome; True if sent or skipped"""
+    if future is None:
         return True
+    try:
+        future.result()
+    except Exception as e:
+        scheduler_status["error_count"] += 1
+        print(f"❌ [{get_ist_display()}] Error sending {meal} to {chat_id}: {e}")
+        if is_chat_unreachable(e):
+            unsubscribe_chat(chat_id)
+        return False
+    current_time = get_ist_display()
+    scheduler_status["last_sent"] = f"{meal} at {current_time}"
+    print(f"✅ [{current_time}] Sent {meal} to {chat_id}")
+    return True
 
+def send_meal_reminder(chat_id, meal, priority=PRIORITY_INTERACTIVE):
+    """Send one meal slot to one chat and wait for the result"""
+    try:
+        future = _queue_meal_reminder(chat_id, meal, priority)
     except Exception as e:
         scheduler_status["error_count"] += 1
-        print(f"❌ [{get_ist_display()}] Error sending {meal}: {e}")
+        print(f"❌ [{get_ist_display()}] Error building {meal}: {e}")
         return False
+    return _finish_meal_reminder(chat_id, meal, future)
+
+def is_chat_unreachable(error):
+    """True for Telegram errors that mean the chat will never accept messages (blocked, deleted)"""
+    return getattr(error, "error_code", None) == 403
+
+def send_meal_to_subscribers(meal, fire_at=None):
+    """Write one meal slot for every subscriber to the outbox; returns (queued, total).
+
+    Keys are date_meal_chat, so queueing a slot again for the same day adds nothing.
+    """
+    fire_at = fire_at or get_ist_time()
+    day = fire_at.strftime("%Y-%m-%d")
+    chat_ids = get_subscribers()
+    time_display = get_ist_display()
+    rows = []
+    for chat_id in chat_ids:
+        message = build_meal_message(chat_id, meal, time_display)
+        if message is None:
+            print(f"⏭️ [{time_display}] Skipped {meal} for {chat_id} - workout already done today!")
+            continue
+        rows.append((f"{day}_{meal}_{chat_id}", chat_id, "meal", meal, PRIORITY_BULK,
+                     message, "Markdown", fire_at))
+    conn = get_db()
+    with conn:
+        queued = enqueue_outbox(conn, rows)
+    outbox.wake()
+    return queued, len(chat_ids)
 
 # ==========================================
 # TASK REMINDER CHECKER
 # ==========================================
+# Instead of polling, the checker keeps a min-heap of upcoming reminder and
+# follow-up times and sleeps until the earliest one. add_task() pushes new
+# times and mark_task_completed() asks for a reload, waking it early.
+TASK_QUEUE_PRELOAD = int(os.getenv("TASK_QUEUE_PRELOAD", "32"))
+TASK_ENGINE_MAX_SLEEP = int(os.getenv("TASK_ENGINE_MAX_SLEEP", "3600"))
+TASK_RETRY_SECONDS = int(os.getenv("TASK_RETRY_SECONDS", "30"))
+
+SQL_UPCOMING_REMINDERS = '''
+    SELECT reminder_at FROM tasks
+    WHERE reminder_sent = 0 AND completed = 0
+    ORDER BY reminder_at
+    LIMIT ?
+'''
+SQL_UPCOMING_FOLLOWUPS = '''
+    SELECT followup_at FROM tasks
+    WHERE followup_sent = 0 AND reminder_sent = 1 AND completed = 0
+    ORDER BY followup_at
+    LIMIT ?
+'''
+
+# A sweep flips every due row's flag and writes its message to the outbox in
+# the same transaction, so each reminder and follow-up is queued exactly once
+# and delivery (with retries) is the outbox sender's job.
+SQL_CLAIM_REMINDERS = '''
+    UPDATE tasks SET reminder_sent = 1
+    WHERE reminder_sent = 0 AND completed = 0 AND reminder_at <= ?
+    RETURNING id, chat_id, task_description, target_at, reminder_at
+'''
+SQL_CLAIM_FOLLOWUPS = '''
+    UPDATE tasks SET followup_sent = 1
+    WHERE followup_sent = 0 AND reminder_sent = 1 AND completed = 0 AND followup_at <= ?
+    RETURNING id, chat_id, task_description, target_at, followup_at
+'''
+
+_task_queue = []
+_task_queue_cv = threading.Condition()
+_task_queue_stale = False
+
+def notify_task_engine(due=None):
+    """Wake the reminder checker.
+
+    Pass the datetime of a newly scheduled reminder/follow-up to queue it, or
+    nothing when queued times may no longer be valid and the queue should be
+    reloaded from the database.
+    """
+    global _task_queue_stale
+    with _task_queue_cv:
+        if due is None:
+            _task_queue_stale = True
+        else:
+            heapq.heappush(_task_queue, due)
+        _task_queue_cv.notify()
+
+def _reload_task_queue(swept_at=None):
+    """Merge the store's next due times into the queue, dropping times a sweep at swept_at covered.
+
+    Merged rather than replaced so a time notify_task_engine() queues while
+    the store is being read is kept; a time that no longer fires only costs
+    an empty sweep.
+    """
+    global _task_queue, _task_queue_stale
+    with _task_queue_cv:
+        # Cleared before reading, so a reload asked for meanwhile still happens.
+        _task_queue_stale = False
+    due_times = [from_epoch(due) for due in task_store.upcoming(TASK_QUEUE_PRELOAD)]
+    with _task_queue_cv:
+        merged = set(_task_queue).union(due_times)
+        if swept_at is not None:
+            merged = {due for due in merged if due > swept_at}
+        _task_queue = list(merged)
+        heapq.heapify(_task_queue)
+
+def _wait_for_next_due():
+    """Sleep until the earliest queued time; returns False if the queue needs a reload instead"""
+    with _task_queue_cv:
+        while True:
+            if _task_queue_stale:
+                return False
+            now = datetime.datetime.now(IST)
+            if _task_queue and _task_queue[0] <= now:
+                return True
+            timeout = TASK_ENGINE_MAX_SLEEP
+            if _task_queue:
+                timeout = min(timeout, (_task_queue[0] - now).total_seconds())
+            if not _task_queue_cv.wait(timeout) and timeout == TASK_ENGINE_MAX_SLEEP:
+                # Nothing was due for a long while - resync in case the
+                # database was changed behind our back.
+                return False
+
+@timed_db
+def _claim_due_tasks(now):
+    """Move every due reminder and follow-up into the outbox in one transaction"""
+    return task_store.claim_due(to_epoch(now), lambda claimed: [
+        (f"task_{task_id}_{kind}", chat_id, kind, task_id, PRIORITY_REMINDER,
+         _format_task_message(kind, task_desc, target_at), "Markdown", from_epoch(due_at))
+        for kind, task_id, chat_id, task_desc, target_at, due_at in claimed
+    ])
+
+def _format_task_message(kind, task_desc, target_at):
+    target_dt = from_epoch(target_at)
+    if kind == "reminder":
+        return (
+            f"⏰ *TASK REMINDER*\n\n"
+            f"📋 {task_desc}\n\n"
+            f"⏱️ Scheduled for: {target_dt.strftime('%I:%M %p on %B %d, %Y')}\n\n"
+            f"This is your 1-hour advance notice! 🔔"
+        )
+    return (
+        f"✅ *FOLLOW-UP*\n\n"
+        f"📋 Did you complete: {task_desc}?\n\n"
+        f"⏱️ It was scheduled for {target_dt.strftime('%I:%M %p')}\n\n"
+        f"Reply 'done' if completed, or let me know if you need to reschedule!"
+    )
+
+def run_task_sweep():
+    """Queue every due reminder and follow-up; returns how many were queued"""
+    queued = _claim_due_tasks(datetime.datetime.now(IST))
+    if queued:
+        outbox.wake()
+        print(f"📤 Queued {queued} task reminders")
+    return queued
+
 def task_reminder_checker():
     print("🔔 Task reminder checker started")
+    # Sweep once on start to catch up on anything that fell due while down.
+    sweep_due = True
     while True:
         try:
-            pending_reminders = get_pending_reminders()
-            for task in pending_reminders:
-                task_id, chat_id, task_desc, target_dt_str, reminder_dt_str = task
-
-                target_dt = datetime.datetime.fromisoformat(target_dt_str)
-                target_display = target_dt.strftime("%I:%M %p on %B %d, %Y")
-
-                message = (
-                    f"⏰ *TASK REMINDER*\n\n"
-                    f"📋 {task_desc}\n\n"
-                    f"⏱️ Scheduled for: {target_display}\n\n"
-                    f"This is your 1-hour advance notice! 🔔"
-                )
-
-                try:
-                    bot.send_message(chat_id, message, parse_mode="Markdown")
-                    mark_reminder_sent(task_id)
-                    print(f"✅ Sent reminder for task {task_id} to {chat_id}")
-                except Exception as e:
-                    print(f"❌ Error sending reminder for task {task_id}: {e}")
-
-            pending_followups = get_pending_followups()
-            for task in pending_followups:
-                task_id, chat_id, task_desc, target_dt_str, followup_dt_str = task
-
-                target_dt = datetime.datetime.fromisoformat(target_dt_str)
-                target_display = target_dt.strftime("%I:%M %p")
-
-                message = (
-                    f"✅ *FOLLOW-UP*\n\n"
-                    f"📋 Did you complete: {task_desc}?\n\n"
-                    f"⏱️ It was scheduled for {target_display}\n\n"
-                    f"Reply 'done' if completed, or let me know if you need to reschedule!"
-                )
-
-                try:
-                    bot.send_message(chat_id, message, parse_mode="Markdown")
-                    mark_followup_sent(task_id)
-                    print(f"✅ Sent follow-up for task {task_id} to {chat_id}")
-                except Exception as e:
-                    print(f"❌ Error sending follow-up for task {task_id}: {e}")
-
+            swept_at = None
+            if sweep_due:
+                swept_at = datetime.datetime.now(IST)
+                run_task_sweep()
+            _reload_task_queue(swept_at)
+            sweep_due = _wait_for_next_due()
         except Exception as e:
             print(f"❌ Task reminder checker error: {e}")
+            time.sleep(TASK_RETRY_SECONDS)
+            sweep_due = True
+
+# ==========================================
+# TASK ARCHIVE
+# ==========================================
+# Keeps the hot tasks table small however old the deployment is: tasks that
+# finished more than TASK_ARCHIVE_DAYS ago move to tasks_archive in batches
+# of TASK_ARCHIVE_BATCH, copied and then deleted in short transactions, and the pages they
+# freed are handed back to the filesystem with incremental_vacuum. Only
+# /tasks history (get_user_tasks with include_completed) reads the archive.
+TASK_ARCHIVE_DAYS = int(os.getenv("TASK_ARCHIVE_DAYS", "30"))
+TASK_ARCHIVE_BATCH = int(os.getenv("TASK_ARCHIVE_BATCH", "500"))
+TASK_ARCHIVE_INTERVAL = int(os.getenv("TASK_ARCHIVE_INTERVAL", "3600"))
+DB_VACUUM_PAGES = int(os.getenv("DB_VACUUM_PAGES", "2000"))
 
-        time.sleep(30)
+@timed_db
+def vacuum_free_pages(pages=DB_VACUUM_PAGES):
+    """Release up to `pages` free pages from the end of the file; returns how many went"""
+    conn = get_db()
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # execute() steps a row-less PRAGMA only once (one page); executescript
+    # runs it to completion.
+    conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
 
-threading.Thread(target=task_reminder_checker, daemon=True).start()
+def archive_old_tasks(now=None):
+    """Archive every task finished before the cutoff, batch by batch; returns (archived, pages freed)"""
+    cutoff = to_epoch((now or get_ist_time()) - datetime.timedelta(days=TASK_ARCHIVE_DAYS))
+    archived = 0
+    while True:
+        moved = task_store.archive_finished(cutoff, TASK_ARCHIVE_BATCH)
+        archived += moved
+        if moved < TASK_ARCHIVE_BATCH:
+            break
+        # Let the reminder engine and handlers in between batches.
+        time.sleep(0.05)
+    freed = 0
+    while True:
+        released = vacuum_free_pages()
+        freed += released
+        if released < DB_VACUUM_PAGES:
+            break
+    if archived:
+        status.invalidate("pending_tasks")
+    if archived or freed:
+        print(f"🗄️ Archived {archived} finished tasks, released {freed} free pages")
+    return archived, freed
+
+def task_archiver():
+    print("🗄️ Task archiver started")
+    while True:
+        try:
+            archive_old_tasks()
+        except Exception as e:
+            print(f"❌ Task archiver error: {e}")
+        time.sleep(TASK_ARCHIVE_INTERVAL)
 
 # ==========================================
 # SCHEDULER
 # ==========================================
-def scheduler():
-    global scheduler_status, workout_done_today
-    sent_today = set()
+# Every meal_schedule slot gets an absolute next-fire datetime, kept in a heap;
+# the loop sleeps until the earliest one instead of polling the wall clock, so
+# a slow send or a pause can delay a slot but never skip it. A slot found late
+# on waking is still sent if it is within MEAL_MISFIRE_GRACE_SECONDS, subject
+# to MEAL_CATCHUP_POLICY:
+#   all    - send every slot that is still within grace
+#   latest - when several are overdue at once, send only the most recent
+#   skip   - send nothing that is late beyond MEAL_ON_TIME_SECONDS
+# Each (date, meal) is recorded in meal_fires once its messages are in the
+# outbox, so a restart inside the grace window doesn't queue a slot twice.
+MEAL_MISFIRE_GRACE_SECONDS = int(os.getenv("MEAL_MISFIRE_GRACE_SECONDS", "600"))
+MEAL_CATCHUP_POLICY = os.getenv("MEAL_CATCHUP_POLICY", "all").lower()
+MEAL_ON_TIME_SECONDS = 60
+SCHEDULER_MAX_SLEEP = 60
+SCHEDULER_BANNER_MINUTES = int(os.getenv("SCHEDULER_BANNER_MINUTES", "1"))
+MEAL_FIRES_KEEP_DAYS = 7
+DAILY_RESET = "__daily_reset__"
+
+SQL_MEAL_FIRED = 'SELECT 1 FROM meal_fires WHERE fire_date = ? AND meal = ?'
+SQL_RECORD_MEAL_FIRE = 'INSERT OR IGNORE INTO meal_fires (fire_date, meal, fired_at) VALUES (?, ?, ?)'
+SQL_PRUNE_MEAL_FIRES = 'DELETE FROM meal_fires WHERE fire_date < ?'
+
+class SystemClock:
+    """Wall-clock time in IST"""
+    def now(self):
+        return get_ist_time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+def slot_datetime(day, time_str):
+    """day (an IST datetime) at the HH:MM of time_str"""
+    return day.replace(hour=int(time_str[:2]), minute=int(time_str[3:5]), second=0, microsecond=0)
+
+def build_fire_queue(now):
+    """Heap of (fire_at, meal) holding each slot's next fire time.
+
+    Slots that passed less than the grace window ago stay on today so they can
+    still be caught up; the daily reset is always next midnight.
+    """
+    queue = []
+    for meal, time_str in meal_schedule.items():
+        fire_at = slot_datetime(now, time_str)
+        if (now - fire_at).total_seconds() > MEAL_MISFIRE_GRACE_SECONDS:
+            fire_at += datetime.timedelta(days=1)
+        queue.append((fire_at, meal))
+    queue.append((slot_datetime(now, "00:00") + datetime.timedelta(days=1), DAILY_RESET))
+    heapq.heapify(queue)
+    return queue
+
+def select_due_slots(due, now):
+    """Split overdue (fire_at, meal) slots into (to_send, missed) per the catch-up policy"""
+    on_time = MEAL_ON_TIME_SECONDS if MEAL_CATCHUP_POLICY == "skip" else MEAL_MISFIRE_GRACE_SECONDS
+    to_send = [slot for slot in due if (now - slot[0]).total_seconds() <= on_time]
+    missed = [slot for slot in due if slot not in to_send]
+    if MEAL_CATCHUP_POLICY == "latest" and len(to_send) > 1:
+        missed += to_send[:-1]
+        to_send = to_send[-1:]
+    return to_send, missed
+
+@timed_db
+def meal_already_fired(fire_at, meal):
+    try:
+        return get_db().execute(SQL_MEAL_FIRED, (fire_at.strftime("%Y-%m-%d"), meal)).fetchone() is not None
+    except Exception as e:
+        print(f"❌ Error checking meal fire: {e}")
+        return False
+
+@timed_db
+def record_meal_fire(fire_at, meal):
+    try:
+        conn = get_db()
+        with conn:
+            conn.execute(SQL_RECORD_MEAL_FIRE, (fire_at.strftime("%Y-%m-%d"), meal, get_ist_time().isoformat()))
+    except Exception as e:
+        print(f"❌ Error recording meal fire: {e}")
+
+def daily_reset(now):
+    workout_done_today.clear()
+    status.invalidate("workouts_done")
+    try:
+        conn = get_db()
+        with conn:
+            conn.execute(SQL_PRUNE_MEAL_FIRES, (
+                (now - datetime.timedelta(days=MEAL_FIRES_KEEP_DAYS)).strftime("%Y-%m-%d"),))
+        prune_outbox(now)
+    except Exception as e:
+        print(f"⚠️ Error pruning meal fires and outbox: {e}")
+    print(f"🔄 [{now.strftime('%I:%M:%S %p IST')}] Daily tracker reset - new day!")
+
+def fire_meal_slot(fire_at, meal, clock):
+    # The outbox rows are written before the fire is recorded: a crash in
+    # between queues the slot again on restart, and the outbox keys drop it.
+    if meal_already_fired(fire_at, meal):
+        print(f"⏭️ {meal} for {fire_at.strftime('%Y-%m-%d')} was already sent")
+        return
+    SCHEDULER_LAG_SECONDS.observe(max((clock.now() - fire_at).total_seconds(), 0.0))
+    print(f"\n🔔 TRIGGER: {meal} at {fire_at.strftime('%H:%M')}")
+    queued, total = send_meal_to_subscribers(meal, fire_at)
+    record_meal_fire(fire_at, meal)
+    print(f"📨 {meal}: queued for {queued}/{total} subscribers")
+
+def print_scheduler_banner(now, queue):
+    separator = "=" * 60
+    print(f"\n{separator}")
+    print(f"🇮🇳 [{now.strftime('%I:%M:%S %p IST')}]")
+    print(f"📱 Subscribers: {count_subscribers()}")
+    print(f"🏋️ Workouts Today: {len(workout_done_today)}")
+    upcoming = [slot for slot in queue if slot[1] != DAILY_RESET]
+    if upcoming:
+        fire_at, meal = min(upcoming)
+        minutes = int((fire_at - now).total_seconds() // 60)
+        print(f"⏰ Next: {meal} in {minutes} minutes ({fire_at.strftime('%H:%M')})")
+    print(f"{separator}\n")
+
+def scheduler(clock=None, until=None):
+    """Fire meal_schedule slots on time; runs forever unless until (a datetime) is given"""
+    clock = clock or SystemClock()
     scheduler_status["is_running"] = True
-    print(f"🔄 Scheduler started at {get_ist_display()}")
+    queue = build_fire_queue(clock.now())
+    next_banner = clock.now()
+    print(f"🔄 Scheduler started at {clock.now().strftime('%I:%M:%S %p IST')}")
 
-    while True:
+    while until is None or clock.now() < until:
         try:
-            ist_now = get_ist_time()
-            current_time = ist_now.strftime("%H:%M")
-            current_date = ist_now.strftime("%Y-%m-%d")
-            scheduler_status["last_check"] = get_ist_display()
-
-            if ist_now.second == 0:
-                separator = "=" * 60
-                print(f"\n{separator}")
-                print(f"🇮🇳 [{get_ist_display()}]")
-                print("📱 Active Chat: {chat}".format(chat=active_chat_id or 'NONE'))
-                print(f"⏰ Current Time: {current_time}")
-                print(f"🏋️ Workout Today: {'✅ Done' if workout_done_today else '❌ Pending'}")
-
-                for meal, time_str in sorted(meal_schedule.items(), key=lambda x: x[1]):
-                    if time_str > current_time:
-                        try:
-                            time_obj = datetime.datetime.strptime(time_str, "%H:%M")
-                            current_obj = datetime.datetime.strptime(current_time, "%H:%M")
-                            diff = (time_obj - current_obj).seconds // 60
-                            print(f"⏰ Next: {meal} in {diff} minutes ({time_str})")
-                        except ValueError:
-                            pass
-                        break
-                print(f"📊 Sent today: {len(sent_today)}")
-                print(f"{separator}\n")
-
-            if current_time == "00:00":
-                sent_today.clear()
-                workout_done_today = False
-                print(f"🔄 [{get_ist_display()}] Daily tracker reset - new day!")
-
-            if active_chat_id:
-                for meal, time_str in meal_schedule.items():
-                    meal_key = f"{current_date}_{meal}"
-                    if current_time == time_str and meal_key not in sent_today:
-                        print(f"\n🔔 TRIGGER: {meal} at {current_time}")
-                        if send_meal_reminder(active_chat_id, meal):
-                            sent_today.add(meal_key)
-                        time.sleep(2)
+            now = clock.now()
+            scheduler_status["last_check"] = now.strftime('%I:%M:%S %p IST')
+            if now >= next_banner:
+                print_scheduler_banner(now, queue)
+                next_banner = now + datetime.timedelta(minutes=SCHEDULER_BANNER_MINUTES)
+
+            due = []
+            while queue and queue[0][0] <= now:
+                fire_at, meal = heapq.heappop(queue)
+                heapq.heappush(queue, (fire_at + datetime.timedelta(days=1), meal))
+                if meal == DAILY_RESET:
+                    daily_reset(now)
+                else:
+                    due.append((fire_at, meal))
+
+            to_send, missed = select_due_slots(due, now)
+            for fire_at, meal in missed:
+                print(f"⚠️ Missed {meal} ({fire_at.strftime('%H:%M')}), "
+                      f"{int((now - fire_at).total_seconds())}s late - not sending")
+            for fire_at, meal in to_send:
+                fire_meal_slot(fire_at, meal, clock)
         except Exception as e:
             scheduler_status["error_count"] += 1
             print(f"❌ Scheduler error: {e}")
+        status.invalidate("scheduler")
+
+        now = clock.now()
+        wake_at = min(queue[0][0], next_banner)
+        if until is not None:
+            wake_at = min(wake_at, until)
+        clock.sleep(min(max((wake_at - now).total_seconds(), 0.0), SCHEDULER_MAX_SLEEP))
+
+# ==========================================
+# VOICE TRANSCRIPTION
+# ==========================================
+# Voice notes run as one job on the chat dispatcher's "voice" lane (VOICE_WORKERS
+# workers): check the duration/size caps, download, transcribe from memory and
+# answer the transcript, so the chat's next update waits until the answer is
+# out while other users' questions keep the llm lane to themselves.
+# Transcripts are cached by Telegram's file_unique_id, which is the same for
+# a forwarded or re-sent copy of a note, so each recording is billed once.
+VOICE_WORKERS = int(os.getenv("VOICE_WORKERS", "2"))
+VOICE_QUEUE_SIZE = int(os.getenv("VOICE_QUEUE_SIZE", "20"))
+VOICE_MAX_SECONDS = int(os.getenv("VOICE_MAX_SECONDS", "300"))
+VOICE_MAX_BYTES = int(os.getenv("VOICE_MAX_BYTES", str(5 * 1024 * 1024)))
+
+SQL_GET_TRANSCRIPT = 'SELECT transcript FROM voice_transcripts WHERE file_unique_id = ?'
+SQL_STORE_TRANSCRIPT = '''
+    INSERT OR REPLACE INTO voice_transcripts (file_unique_id, transcript, duration, created_at)
+    VALUES (?, ?, ?, ?)
+'''
+
+_INDIC_SCRIPT_RE = re.compile(r'[\u0900-\u097F\u0980-\u09FF\u0A00-\u0AFF]')
+
+# Jobs queued or running; beyond this new notes are turned away instead of
+# piling up behind a slow transcription.
+_voice_slots = threading.BoundedSemaphore(VOICE_QUEUE_SIZE)
+_voice_inflight = {}
+_voice_inflight_lock = threading.Lock()
+
+@timed_db
+def get_cached_transcript(file_unique_id):
+    try:
+        row = get_db().execute(SQL_GET_TRANSCRIPT, (file_unique_id,)).fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        print(f"⚠️ Transcript cache lookup failed: {e}")
+        return None
+
+@timed_db
+def store_transcript(file_unique_id, transcript, duration):
+    try:
+        conn = get_db()
+        with conn:
+            conn.execute(SQL_STORE_TRANSCRIPT, (file_unique_id, transcript, duration,
+                                                get_ist_time().isoformat()))
+    except Exception as e:
+        print(f"⚠️ Transcript cache store failed: {e}")
+
+def voice_rejection(voice):
+    """Why a voice note is refused before download, or None if it's acceptable"""
+    if (voice.duration or 0) > VOICE_MAX_SECONDS:
+        return f"⚠️ Voice notes can be up to {VOICE_MAX_SECONDS // 60} minutes long. Please send a shorter one!"
+    if (voice.file_size or 0) > VOICE_MAX_BYTES:
+        return f"⚠️ That voice note is too large (max {VOICE_MAX_BYTES // (1024 * 1024)} MB)."
+    return None
+
+def _whisper(voice, chat_id):
+    file_info = get_bot().get_file(voice.file_id)
+    audio = get_bot().download_file(file_info.file_path)
+    if len(audio) > VOICE_MAX_BYTES:
+        raise ValueError(f"voice note is {len(audio)} bytes, limit is {VOICE_MAX_BYTES}")
+    started = time.monotonic()
+    transcript = get_openai_client().audio.transcriptions.create(
+        model=TRANSCRIBE_MODEL,
+        file=("voice.ogg", io.BytesIO(audio), "audio/ogg"),
+        language="en",
+        response_format="text"
+    )
+    record_llm_usage(chat_id, "transcription", started, audio_seconds=voice.duration)
+    return (transcript if isinstance(transcript, str) else transcript.text).strip()
+
+def transcribe_voice(voice, chat_id):
+    """Transcript for a voice note, from the cache or Whisper.
+
+    Concurrent requests for the same recording share one Whisper call.
+    """
+    file_unique_id = voice.file_unique_id
+    cached = get_cached_transcript(file_unique_id)
+    if cached is not None:
+        print(f"✅ Transcript cache hit for {file_unique_id}")
+        return cached
+
+    with _voice_inflight_lock:
+        pending = _voice_inflight.get(file_unique_id)
+        if pending is None:
+            _voice_inflight[file_unique_id] = Future()
+    if pending is not None:
+        return pending.result()
+
+    future = _voice_inflight[file_unique_id]
+    try:
+        transcript = _whisper(voice, chat_id)
+        store_transcript(file_unique_id, transcript, voice.duration)
+        future.set_result(transcript)
+        return transcript
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _voice_inflight_lock:
+            _voice_inflight.pop(file_unique_id, None)
+
+# ==========================================
+# CHAT DISPATCHER
+# ==========================================
+# Telebot's handlers only enqueue here. Each chat with work pending has its
+# own FIFO, and only its head item runs, so a chat's updates are handled in
+# the order they arrived. The head goes to one of three worker lanes: "fast"
+# for commands, reminders and workout logs, "llm" for anything that waits on
+# OpenAI and "voice" for voice notes, transcription and answer together. A
+# slow answer for one user then never holds up another user's /tasks, and a
+# burst of voice notes never takes every llm worker.
+CHAT_FAST_WORKERS = int(os.getenv("CHAT_FAST_WORKERS", "4"))
+CHAT_LLM_WORKERS = int(os.getenv("CHAT_LLM_WORKERS", "8"))
+CHAT_QUEUE_SIZE = int(os.getenv("CHAT_QUEUE_SIZE", "10000"))
+WORKOUT_KEYWORDS = ('workout done', 'exercise done', 'finished workout', 'completed workout',
+                    'gym done', 'training done')
+REMINDER_TRIGGERS = ('remind me', 'reminder', 'remember to', 'don\'t forget')
+
+def chat_lane(message):
+    """'fast' or 'llm': which worker lane should run this message"""
+    text = (message.text or "").strip().lower()
+    if not text or text.startswith('/') or text in WORKOUT_KEYWORDS:
+        return "fast"
+    if any(trigger in text for trigger in REMINDER_TRIGGERS):
+        return "fast"
+    return "llm"
+
+class ChatDispatcher:
+    def __init__(self, lanes, maxsize):
+        self.lanes = lanes
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        # chat_id -> deque of (lane, enqueued_at, handler, message); the head
+        # is running or waiting in its lane, the rest wait behind it.
+        self._chats = {}
+        self._pending = 0
+        self._ready = {lane: queue.Queue() for lane in lanes}
+        self.counters = {"handled": 0, "errors": 0, "dropped": 0}
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for lane, workers in self.lanes.items():
+            for i in range(workers):
+                threading.Thread(target=self._worker, args=(lane,), name=f"chat-{lane}-{i}",
+                                 daemon=True).start()
+
+    def submit(self, handler, message, lane=None):
+        """Queue handler(message) behind the chat's earlier updates; False if the queue is full"""
+        lane = lane or chat_lane(message)
+        chat_id = message.chat.id
+        with self._lock:
+            if self._pending >= self.maxsize:
+                self.counters["dropped"] += 1
+                return False
+            self._pending += 1
+            waiting = self._chats.get(chat_id)
+            item = (lane, time.monotonic(), handler, message)
+            if waiting is not None:
+                waiting.append(item)
+                return True
+            self._chats[chat_id] = collections.deque([item])
+        self._ready[lane].put(chat_id)
+        return True
+
+    def _worker(self, lane):
+        ready = self._ready[lane]
+        while True:
+            chat_id = ready.get()
+            with self._lock:
+                _, enqueued_at, handler, message = self._chats[chat_id][0]
+            CHAT_QUEUE_WAIT_SECONDS.observe(time.monotonic() - enqueued_at, lane)
+            try:
+                handler(message)
+                self.counters["handled"] += 1
+            except Exception as e:
+                self.counters["errors"] += 1
+                print(f"❌ Error handling update from {chat_id}: {e}")
+            with self._lock:
+                waiting = self._chats[chat_id]
+                waiting.popleft()
+                self._pending -= 1
+                if not waiting:
+                    del self._chats[chat_id]
+                    continue
+                next_lane = waiting[0][0]
+            self._ready[next_lane].put(chat_id)
+
+    def queue_depth(self, lane=None):
+        """Updates queued or running, optionally only those whose chat waits on `lane`"""
+        with self._lock:
+            if lane is None:
+                return self._pending
+            return sum(len(waiting) for waiting in self._chats.values() if waiting[0][0] == lane)
+
+    def stats(self):
+        return dict(self.counters, queue_depth=self.queue_depth(), active_chats=len(self._chats))
 
-        time.sleep(10)
+chat_dispatcher = ChatDispatcher({"fast": CHAT_FAST_WORKERS, "llm": CHAT_LLM_WORKERS, "voice": VOICE_WORKERS},
+                                 CHAT_QUEUE_SIZE)
 
-threading.Thread(target=scheduler, daemon=True).start()
+def dispatch_voice(message):
+    if not _voice_slots.acquire(blocking=False):
+        queue_reply(message, "⏳ I'm busy with other voice notes right now. Please try again in a minute!")
+        return
+    if not chat_dispatcher.submit(_voice_job, message, "voice"):
+        _voice_slots.release()
+        print(f"⚠️ Chat dispatcher full, dropped voice note from {message.chat.id}")
+
+def _voice_job(message):
+    try:
+        handle_voice(message)
+    finally:
+        _voice_slots.release()
+
+def dispatch_message(message):
+    if not chat_dispatcher.submit(handle_all_messages, message):
+        print(f"⚠️ Chat dispatcher full, dropped update from {message.chat.id}")
 
 # ==========================================
 # MESSAGE HANDLERS
 # ==========================================
 
-@bot.message_handler(content_types=['voice'])
 def handle_voice(message):
-    """Handle voice messages - transcribe in English only"""
+    """Transcribe a voice note (English only), echo the text back and answer it like a typed message"""
+    started = time.perf_counter()
     try:
-        processing_msg = bot.reply_to(message, "🎙️ Transcribing your voice message...")
-        
-        file_info = bot.get_file(message.voice.file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
-        
-        temp_file = f"/tmp/voice_{message.chat.id}_{int(time.time())}.ogg"
-        with open(temp_file, 'wb') as f:
-            f.write(downloaded_file)
-        
-        with open(temp_file, 'rb') as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="en",
-                response_format="text"
-            )
-        
-        transcribed_text = transcript if isinstance(transcript, str) else transcript.text
-        
-        import re
-        if re.search(r'[\u0900-\u097F\u0980-\u09FF\u0A00-\u0AFF]', transcribed_text):
-            bot.delete_message(message.chat.id, processing_msg.message_id)
-            bot.reply_to(message, 
+        rejection = voice_rejection(message.voice)
+        if rejection:
+            queue_reply(message, rejection)
+            return
+        processing = queue_reply(message, "🎙️ Transcribing your voice message...")
+        transcribed_text = transcribe_voice(message.voice, message.chat.id)
+
+        try:
+            outbound.submit(PRIORITY_INTERACTIVE, "delete_message", message.chat.id,
+                            processing.result(timeout=30).message_id)
+        except Exception as e:
+            print(f"⚠️ Couldn't remove transcription notice: {e}")
+
+        if _INDIC_SCRIPT_RE.search(transcribed_text):
+            queue_reply(message, 
                 "⚠️ *Language Note*\n\n"
                 "Please speak in English or Hinglish!\n\n"
                 "✅ Good: 'mujhe paneer khana hai'\n"
                 "❌ Avoid: देवनागरी script\n\n"
                 "Try again! 🎙️",
                 parse_mode="Markdown")
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
             return
-        
-        bot.delete_message(message.chat.id, processing_msg.message_id)
-        
-        bot.reply_to(message, 
+
+        queue_reply(message, 
             f"🎙️ *You said:*\n\"{transcribed_text}\"", 
             parse_mode="Markdown")
-        
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
-        
-        class MockMessage:
-            def __init__(self, original_msg, text):
-                self.chat = original_msg.chat
-                self.text = text
-                self.message_id = original_msg.message_id
-        
-        mock_msg = MockMessage(message, transcribed_text)
-        handle_chat(mock_msg)
-        
+        handle_chat(as_text_message(message, transcribed_text))
+
     except Exception as e:
-        bot.reply_to(message, f"❌ Sorry, couldn't transcribe: {str(e)[:100]}")
+        queue_reply(message, f"❌ Sorry, couldn't transcribe: {str(e)[:100]}")
         print(f"❌ Voice transcription error: {e}")
+    finally:
+        HANDLER_SECONDS.observe(time.perf_counter() - started, "voice")
+
+def as_text_message(message, text):
+    """A copy of `message` carrying `text`, e.g. a voice note's transcript for handle_chat"""
+    shim = copy.copy(message)
+    shim.text = text
+    shim.content_type = "text"
+    return shim
 
 
-@bot.message_handler(func=lambda message: True)
+HANDLED_COMMANDS = ('/start', '/stop', '/debug', '/status', '/time', '/test', '/tasks',
+                    '/reload', '/cache', '/forget', '/usage', '/trigger')
+
+def command_label(text):
+    """Metric label for a message: the command name, chat or unknown"""
+    if not text.startswith('/'):
+        return "chat"
+    command = text.split()[0]
+    return command[1:] if command in HANDLED_COMMANDS else "unknown"
+
 def handle_all_messages(message):
     """Handle text messages"""
     if not message.text:
@@ -743,31 +3438,42 @@ def handle_all_messages(message):
     chat_id = message.chat.id
     print(f"📨 Received: '{text}' from {chat_id}")
     
-    if text == '/start':
-        handle_start(message)
-    elif text == '/debug':
-        handle_debug(message)
-    elif text == '/status':
-        handle_status(message)
-    elif text == '/time':
-        handle_time(message)
-    elif text == '/test':
-        handle_test(message)
-    elif text == '/tasks':
-        handle_tasks(message)
-    elif text.startswith('/trigger'):
-        handle_trigger(message)
-    elif text.startswith('/'):
-        bot.reply_to(message, "❌ Unknown command! Try /start /debug /status /time /test /tasks")
-    else:
-        handle_chat(message)
+    with HANDLER_SECONDS.time(command_label(text)):
+        if text == '/start':
+            handle_start(message)
+        elif text == '/stop':
+            handle_stop(message)
+        elif text == '/debug':
+            handle_debug(message)
+        elif text == '/status':
+            handle_status(message)
+        elif text == '/time':
+            handle_time(message)
+        elif text == '/test':
+            handle_test(message)
+        elif text == '/tasks':
+            handle_tasks(message)
+        elif text == '/reload':
+            handle_reload(message)
+        elif text == '/cache' or text.startswith('/cache '):
+            handle_cache(message)
+        elif text == '/forget':
+            handle_forget(message)
+        elif text == '/usage':
+            handle_usage(message)
+        elif text.startswith('/trigger'):
+            handle_trigger(message)
+        elif text.startswith('/'):
+            queue_reply(message, "❌ Unknown command! Try /start /stop /debug /status /time /test /tasks /cache /forget /usage")
+        else:
+            handle_chat(message)
 
 # ==========================================
 # COMMAND HANDLERS
 # ==========================================
 
 def handle_start(message):
-    save_chat_id(message.chat.id)
+    subscribe_chat(message.chat.id)
     msg = ("🙏 *Namaste! Your Health & Task Coach!*\n\n"
            "🇮🇳 Activated: {time}\n"
            "👤 Chat ID: {chat_id}\n\n"
@@ -781,18 +3487,31 @@ def handle_start(message):
            "• Remind me to call doctor at 5 PM tomorrow\n"
            "• Remind me to send report on Dec 5 at 3 PM\n\n"
            "💬 *Commands:*\n"
-           "/time /status /tasks /debug /test\n\n"
+           "/time /status /tasks /debug /test\n"
+           "/stop - pause daily reminders\n"
+           "/cache off - always get fresh answers\n"
+           "/forget - clear our chat history\n\n"
            "Let's achieve your goals! 💪").format(
                time=get_ist_display(),
                chat_id=message.chat.id
            )
-    bot.send_message(message.chat.id, msg, parse_mode="Markdown")
+    queue_message(message.chat.id, msg, parse_mode="Markdown")
+
+def handle_stop(message):
+    if unsubscribe_chat(message.chat.id):
+        queue_reply(message,
+            "🔕 *Daily reminders stopped.*\n\n"
+            "Your task reminders still work.\n"
+            "Send /start any time to turn them back on!",
+            parse_mode="Markdown")
+    else:
+        queue_reply(message, "ℹ️ You're not subscribed. Send /start to get daily reminders!")
 
 def handle_tasks(message):
     tasks = get_user_tasks(message.chat.id, include_completed=False)
 
     if not tasks:
-        bot.reply_to(message, 
+        queue_reply(message, 
             "📝 *Your Tasks*\n\n"
             "No pending tasks!\n\n"
             "Tell me naturally to add one:\n"
@@ -803,12 +3522,12 @@ def handle_tasks(message):
 
     msg = "📝 *Your Pending Tasks*\n\n"
     for task in tasks:
-        task_id, task_desc, target_dt_str, completed = task
-        target_dt = datetime.datetime.fromisoformat(target_dt_str)
+        task_id, task_desc, target_at, completed = task
+        target_dt = from_epoch(target_at)
         display_time = target_dt.strftime("%I:%M %p, %b %d")
         msg += f"• {task_desc}\n  ⏰ {display_time}\n\n"
 
-    bot.send_message(message.chat.id, msg, parse_mode="Markdown")
+    queue_message(message.chat.id, msg, parse_mode="Markdown")
 
 def handle_debug(message):
     ist_now = get_ist_time()
@@ -821,8 +3540,8 @@ def handle_debug(message):
            "⏰ Current IST: {ist}\n"
            "🕐 Time String: {time_str}\n"
            "👤 Your Chat ID: {your_id}\n"
-           "💾 Stored Chat ID: {stored_id}\n"
-           "✅ Match: {match}\n"
+           "🔔 Subscribed: {subscribed}\n"
+           "👥 Subscribers: {subscribers}\n"
            "🏋️ Workout Today: {workout}\n"
            "📝 Pending Tasks: {tasks}\n\n"
            "🔄 *Scheduler Status:*\n"
@@ -834,9 +3553,9 @@ def handle_debug(message):
                ist=get_ist_display(),
                time_str=current_time,
                your_id=message.chat.id,
-               stored_id=active_chat_id or 'None',
-               match='YES' if message.chat.id == active_chat_id else 'NO',
-               workout='✅ Done' if workout_done_today else '❌ Pending',
+               subscribed='YES' if is_subscribed(message.chat.id) else 'NO',
+               subscribers=count_subscribers(),
+               workout='✅ Done' if message.chat.id in workout_done_today else '❌ Pending',
                tasks=task_count,
                running=scheduler_status['is_running'],
                last_check=scheduler_status['last_check'] or 'Never',
@@ -848,31 +3567,46 @@ def handle_debug(message):
         match = "✅ NOW!" if current_time == time_str else "⏳"
         msg += f"{match} {time_str} - {meal}\n"
 
-    bot.send_message(message.chat.id, msg, parse_mode="Markdown")
+    queue_message(message.chat.id, msg, parse_mode="Markdown")
 
 def handle_status(message):
     tasks = get_user_tasks(message.chat.id, include_completed=False)
     task_count = len(tasks)
+    send_stats = outbound.stats()
+    cache_stats = get_response_cache_stats()
 
     msg = ("📊 *System Status*\n\n"
            "⏰ IST: {ist}\n"
-           "👤 Chat: {chat}\n"
+           "👥 Subscribers: {subscribers}\n"
            "🏋️ Workout: {workout}\n"
            "📝 Pending Tasks: {tasks}\n"
            "🔄 Scheduler: {scheduler}\n"
            "📡 Last Check: {last_check}\n"
            "📨 Last Sent: {last_sent}\n"
-           "❌ Errors: {errors}\n").format(
+           "❌ Errors: {errors}\n"
+           "📤 Send Queue: {queue_depth} (p50 {send_p50}ms, p95 {send_p95}ms)\n"
+           "⏳ Rate Limited: {rate_limited}\n"
+           "💾 Answer Cache: {cache_hit_rate}% hits ({cache_hits}/{cache_lookups}), "
+           "{cache_saved} tokens saved, {cache_entries} entries\n").format(
                ist=get_ist_display(),
-               chat=active_chat_id or 'None',
-               workout='✅ Done today' if workout_done_today else '❌ Pending',
+               subscribers=count_subscribers(),
+               workout='✅ Done today' if message.chat.id in workout_done_today else '❌ Pending',
                tasks=task_count,
                scheduler='✅ Running' if scheduler_status['is_running'] else '❌ Stopped',
                last_check=scheduler_status['last_check'] or 'Never',
                last_sent=scheduler_status['last_sent'] or 'None',
-               errors=scheduler_status['error_count']
+               errors=scheduler_status['error_count'],
+               queue_depth=send_stats['queue_depth'],
+               send_p50=send_stats['latency_p50_ms'],
+               send_p95=send_stats['latency_p95_ms'],
+               rate_limited=send_stats['rate_limited'],
+               cache_hit_rate=cache_stats['hit_rate'],
+               cache_hits=cache_stats['hits'],
+               cache_lookups=cache_stats['hits'] + cache_stats['misses'],
+               cache_saved=cache_stats['saved_tokens'],
+               cache_entries=cache_stats['entries']
            )
-    bot.send_message(message.chat.id, msg, parse_mode="Markdown")
+    queue_message(message.chat.id, msg, parse_mode="Markdown")
 
 def handle_time(message):
     ist_now = get_ist_time()
@@ -885,7 +3619,7 @@ def handle_time(message):
            "*Upcoming Today:*\n").format(
                display=get_ist_display(),
                date=ist_now.strftime('%d %B %Y, %A'),
-               workout='✅ Done' if workout_done_today else '❌ Pending'
+               workout='✅ Done' if message.chat.id in workout_done_today else '❌ Pending'
            )
 
     for meal, time_str in sorted(meal_schedule.items(), key=lambda x: x[1]):
@@ -896,20 +3630,73 @@ def handle_time(message):
                 meal=meal.replace('_', ' ').title()
             )
 
-    bot.send_message(message.chat.id, msg, parse_mode="Markdown")
+    queue_message(message.chat.id, msg, parse_mode="Markdown")
 
 def handle_test(message):
-    if not active_chat_id:
-        bot.reply_to(message, "⚠️ Send /start first!")
+    if not is_subscribed(message.chat.id):
+        queue_reply(message, "⚠️ Send /start first!")
         return
-    bot.reply_to(message, "🧪 Sending test water reminder...")
-    time.sleep(1)
+    queue_reply(message, "🧪 Sending test water reminder...")
     message_text = get_water_reminder()
-    bot.send_message(message.chat.id, message_text, parse_mode="Markdown")
+    queue_message(message.chat.id, message_text, parse_mode="Markdown")
+
+def handle_reload(message):
+    if reload_message_templates():
+        queue_reply(message, "✅ Reminder content reloaded!")
+    else:
+        queue_reply(message, "❌ Couldn't reload reminder content - check the logs. Still using the previous version.")
+
+def handle_cache(message):
+    """/cache on|off - opt this chat in or out of cached answers"""
+    arg = message.text[len('/cache'):].strip().lower()
+    if arg in ('on', 'off'):
+        if set_response_cache_enabled(message.chat.id, arg == 'on'):
+            queue_reply(message, "✅ Cached answers turned *{}* for this chat.".format(arg.upper()),
+                        parse_mode="Markdown")
+        else:
+            queue_reply(message, "❌ Couldn't save that setting. Please try again!")
+        return
+    state = 'ON' if is_response_cache_enabled(message.chat.id) else 'OFF'
+    queue_reply(message,
+        f"💾 Cached answers are *{state}* for this chat.\n\n"
+        "Repeated questions are answered instantly from earlier replies.\n"
+        "Use /cache off to always get a fresh answer, /cache on to re-enable.",
+        parse_mode="Markdown")
+
+def handle_forget(message):
+    if forget_conversation(message.chat.id):
+        queue_reply(message, "🧹 Done! I've cleared our conversation history. Let's start fresh.")
+    else:
+        queue_reply(message, "❌ Couldn't clear the history. Please try again!")
+
+def handle_usage(message):
+    mine = get_usage_totals(7, chat_id=message.chat.id)
+    today = get_usage_totals(1)
+    week = get_usage_totals(7)
+    msg = ("📈 *AI Usage*\n\n"
+           "*You, last 7 days:*\n"
+           "🔁 Calls: {m_calls} | ⏱️ Avg: {m_latency}ms\n"
+           "🔤 Tokens: {m_in} in ({m_cached}% cached), {m_out} out ({m_est} calls estimated)\n"
+           "🎙️ Voice: {m_audio}s\n"
+           "💵 Est. cost: ${m_cost}\n\n"
+           "*All chats:*\n"
+           "📅 Today: {t_chats} active, {t_calls} calls, ${t_cost} (${t_per} per chat)\n"
+           "🗓️ 7 days: {w_chats} active, {w_calls} calls, ${w_cost} (${w_per} per chat)").format(
+               m_calls=mine['calls'], m_latency=mine['avg_latency_ms'],
+               m_in=mine['prompt_tokens'], m_cached=mine['cached_pct'],
+               m_out=mine['completion_tokens'], m_est=mine['estimated_calls'],
+               m_audio=mine['audio_seconds'],
+               m_cost=mine['cost_usd'],
+               t_chats=today['active_chats'], t_calls=today['calls'], t_cost=today['cost_usd'],
+               t_per=today['cost_per_active_chat_usd'],
+               w_chats=week['active_chats'], w_calls=week['calls'], w_cost=week['cost_usd'],
+               w_per=week['cost_per_active_chat_usd']
+           )
+    queue_message(message.chat.id, msg, parse_mode="Markdown")
 
 def handle_trigger(message):
-    if not active_chat_id:
-        bot.reply_to(message, "⚠️ Send /start first!")
+    if not is_subscribed(message.chat.id):
+        queue_reply(message, "⚠️ Send /start first!")
         return
 
     if not message.text:
@@ -920,29 +3707,26 @@ def handle_trigger(message):
         msg = "Usage: /trigger [meal]\n\nAvailable:\n"
         for meal in meal_schedule.keys():
             msg += f"• {meal}\n"
-        bot.reply_to(message, msg)
+        queue_reply(message, msg)
         return
 
     meal = parts[1]
     if meal in meal_schedule:
-        bot.reply_to(message, f"🔧 Triggering: {meal}")
-        send_meal_reminder(active_chat_id, meal)
+        queue_reply(message, f"🔧 Triggering: {meal}")
+        send_meal_reminder(message.chat.id, meal)
     else:
-        bot.reply_to(message, f"❌ Unknown meal: {meal}")
+        queue_reply(message, f"❌ Unknown meal: {meal}")
 
 def handle_chat(message):
-    global workout_done_today
-
     if not message.text:
         return
 
     user_text = message.text.strip()
     user_lower = user_text.lower()
 
-    workout_keywords = ['workout done', 'exercise done', 'finished workout', 'completed workout', 'gym done', 'training done']
-    if user_lower in workout_keywords:
-        workout_done_today = True
-        bot.reply_to(message, 
+    if user_lower in WORKOUT_KEYWORDS:
+        log_workout(message.chat.id)
+        queue_reply(message, 
             "✅ *Excellent! Workout logged!*\n\n"
             "That's what consistency looks like! 💪\n\n"
             "Tomorrow at 7:00 AM - let's keep the momentum going!\n\n"
@@ -951,8 +3735,7 @@ def handle_chat(message):
         print(f"✅ [{get_ist_display()}] Workout marked as done by user {message.chat.id}")
         return
 
-    reminder_triggers = ['remind me', 'reminder', 'remember to', 'don\'t forget']
-    if any(trigger in user_lower for trigger in reminder_triggers):
+    if any(trigger in user_lower for trigger in REMINDER_TRIGGERS):
         task_desc, target_time = parse_reminder_request(user_text)
 
         if task_desc and target_time:
@@ -960,7 +3743,7 @@ def handle_chat(message):
             print(f"🕐 DEBUG: Current IST: {ist_now}, Target: {target_time}")
             
             if target_time <= ist_now:
-                bot.reply_to(message,
+                queue_reply(message,
                     "⚠️ That time is in the past!\n\n"
                     "Please specify a future time.\n\n"
                     "Examples:\n"
@@ -978,7 +3761,7 @@ def handle_chat(message):
                 followup_time = target_time + datetime.timedelta(minutes=15)
                 
                 if time_until_task < 60:
-                    bot.reply_to(message,
+                    queue_reply(message,
                         f"✅ *Task Reminder Set!*\n\n"
                         f"📋 Task: {task_desc}\n\n"
                         f"⏰ Scheduled for: {target_time.strftime('%I:%M %p on %B %d, %Y')}\n\n"
@@ -987,7 +3770,7 @@ def handle_chat(message):
                         f"Use /tasks to see all your tasks! 📝",
                         parse_mode="Markdown")
                 else:
-                    bot.reply_to(message,
+                    queue_reply(message,
                         f"✅ *Task Reminder Set!*\n\n"
                         f"📋 Task: {task_desc}\n\n"
                         f"⏰ Scheduled for: {target_time.strftime('%I:%M %p on %B %d, %Y')}\n\n"
@@ -999,9 +3782,9 @@ def handle_chat(message):
                 
                 print(f"✅ Added task {task_id} for user {message.chat.id}: {task_desc} at {target_time}")
             else:
-                bot.reply_to(message, "❌ Sorry, couldn't save your task. Please try again!")
+                queue_reply(message, "❌ Sorry, couldn't save your task. Please try again!")
         else:
-            bot.reply_to(message,
+            queue_reply(message,
                 "🤔 I couldn't understand that reminder.\n\n"
                 "Try these formats:\n"
                 "• Remind me to call doctor at 5 PM\n"
@@ -1011,7 +3794,7 @@ def handle_chat(message):
         return
 
     if len(user_text) <= 3 and not any(word in user_lower for word in ['hi', 'hey', 'yes', 'no', 'ok', 'hmm']):
-        bot.reply_to(message,
+        queue_reply(message,
             "I'm not sure what you mean by that! 😊\n\n"
             "You can:\n"
             "• Ask nutrition questions\n"
@@ -1020,122 +3803,405 @@ def handle_chat(message):
             "I'm here to help!")
         return
 
-    SYSTEM_PROMPT = """**CRITICAL: ALWAYS RESPOND IN ENGLISH ONLY**
-- If user writes in Hinglish (romanized Hindi like 'kya mai khana chahiye'), understand it and respond in English
-- Never use Devanagari (हिंदी) or any non-English script
-- Keep all responses in simple English
-
-You are a supportive but direct Indian vegetarian nutritionist helping a 33-year-old male client reach his goal of 74kg from 84kg. He's been stuck at a plateau for 1.5 years.
-
-
-CLIENT CONTEXT:
-- Lives with wife and 2 kids (elder is 5 years old)
-- North Indian Baniya family - joint meals, no separate cooking
-- Height: 5'8" | Current: 84kg | Target: 74kg
-- Exercises: HIIT + weights 6 days/week at 8:30 AM IST
-
-TYPICAL FAMILY MEALS:
-- Breakfast: Dry sabzi (often potato-based) + multigrain roti
-- Lunch: Wet sabzi/dal/rajma/chole + multigrain roti
-- Evening/Dinner: Stuffed wheat roti (aloo paratha, gobi paratha, etc.)
-
-KEY CHALLENGES:
-1. Large sabzi portions (1.5 bowls instead of 1 cup)
-2. Heavy ghee in cooking (family preference)
-3. Paneer dishes frequently
-4. Water during meals (poor habit)
-5. Namkeen at 4:30 PM (2-4 spoons daily - his weak time!)
-6. Fast food 3 times per week
-7. Strong night cravings around 9 PM
-8. Dal only 2-3 times per week (needs more protein)
-
-YOUR COACHING STYLE:
-- Be direct and clear, but supportive and understanding
-- Acknowledge family meal challenges (he can't control cooking)
-- Focus on PORTION CONTROL - he can control HIS plate
-- Give specific measurements (cups, palm size, pieces)
-- Show empathy - living with family is tough for dieting
-- Be encouraging but honest about what's holding him back
-- Offer practical compromises between ideal and realistic
-
-RESPONSE GUIDELINES:
-- Keep it brief (2-4 sentences for simple questions, longer for complex)
-- Always give EXACT portions, not vague advice
-- When he asks about family meals, give portions for THAT meal
-- If he's making excuses, gently call it out but stay supportive
-- Celebrate small wins, but keep pushing toward the goal
-- Focus on sustainable changes, not perfection"""
+    chat_id = message.chat.id
+    messages, prompt_tokens, fresh = build_chat_context(chat_id, user_text)
+    # Cached answers are generic: offer one only when the question opens a new
+    # exchange, and only cache answers written without this chat's history.
+    use_cache = fresh and is_response_cache_enabled(chat_id)
+    if use_cache:
+        cached = get_cached_response(user_text)
+        if cached:
+            queue_message(chat_id, cached, parse_mode="Markdown")
+            record_turn(chat_id, user_text, cached)
+            return
+    cacheable = use_cache and len(messages) == 2
+
+    if LLM_STREAMING:
+        reply, completion_tokens = stream_chat_reply(message, messages, prompt_tokens)
+    else:
+        try:
+            started = time.monotonic()
+            completion = get_openai_client().chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                max_tokens=CHAT_MAX_TOKENS,
+                temperature=CHAT_TEMPERATURE
+            )
+            reply = completion.choices[0].message.content
+            record_llm_usage(chat_id, "chat", started, completion.usage, prompt_tokens=prompt_tokens,
+                             completion_tokens=estimate_tokens(reply or ""))
+            usage = completion.usage
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or prompt_tokens
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+            if reply:
+                queue_message(chat_id, reply, parse_mode="Markdown")
+        except Exception as e:
+            queue_reply(message, f"⚠️ Error: {e}")
+            return
+
+    if reply:
+        record_turn(chat_id, user_text, reply)
+        if cacheable:
+            store_cached_response(user_text, reply, prompt_tokens, completion_tokens)
+
+# ==========================================
+# WEBHOOK INGESTION
+# ==========================================
+# BOT_MODE=webhook has Telegram POST updates to the Flask app instead of the
+# bot long-polling for them. The route only checks the secret token and puts
+# the raw body on update_queue, so Telegram gets its 200 immediately; parsing
+# and handling happen on UPDATE_WORKERS threads. If the queue is full the
+# route answers 503 and Telegram redelivers the update later.
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "8"))
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "10000"))
+# Telegram retries deliveries it thinks failed; remember this many update_ids
+# so a retried update is not handled twice.
+UPDATE_DEDUP_SIZE = 10000
+
+update_queue = queue.Queue(maxsize=UPDATE_QUEUE_SIZE)
+webhook_stats = {
+    'received': 0,
+    'rejected': 0,
+    'dropped': 0,
+    'duplicates': 0,
+    'processed': 0,
+    'errors': 0
+}
+_seen_updates = collections.OrderedDict()
+_seen_updates_lock = threading.Lock()
+
+def telegram_webhook():
+    from flask import request
 
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not hmac.compare_digest(token.encode("utf-8"), WEBHOOK_SECRET.encode("utf-8")):
+        webhook_stats['rejected'] += 1
+        return "forbidden", 403
     try:
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_text}
-            ],
-            max_tokens=500,
-            temperature=0.7
-        )
-        reply = completion.choices[0].message.content
-        if reply:
-            bot.send_message(message.chat.id, reply, parse_mode="Markdown")
-    except Exception as e:
-        bot.reply_to(message, f"⚠️ Error: {e}")
+        update_queue.put_nowait(request.get_data())
+    except queue.Full:
+        webhook_stats['dropped'] += 1
+        return "busy", 503
+    webhook_stats['received'] += 1
+    return "", 200
+
+def _first_delivery(update_id):
+    with _seen_updates_lock:
+        if update_id in _seen_updates:
+            return False
+        _seen_updates[update_id] = None
+        if len(_seen_updates) > UPDATE_DEDUP_SIZE:
+            _seen_updates.popitem(last=False)
+        return True
+
+def update_worker():
+    from telebot.types import Update
+
+    while True:
+        body = update_queue.get()
+        try:
+            update = Update.de_json(body.decode("utf-8"))
+            if not _first_delivery(update.update_id):
+                webhook_stats['duplicates'] += 1
+                continue
+            get_bot().process_new_updates([update])
+            webhook_stats['processed'] += 1
+        except Exception as e:
+            webhook_stats['errors'] += 1
+            print(f"❌ Error processing update: {e}")
+
+def register_webhook():
+    """Point Telegram at WEBHOOK_URL + WEBHOOK_PATH"""
+    url = WEBHOOK_URL + WEBHOOK_PATH
+    get_bot().set_webhook(url=url, secret_token=WEBHOOK_SECRET,
+                          max_connections=WEBHOOK_MAX_CONNECTIONS, allowed_updates=["message"])
+    print(f"✅ Webhook registered: {url}")
 
 # ==========================================
-# FLASK SERVER
+# STATUS SNAPSHOT
 # ==========================================
-app = Flask('')
+# / and /ping are polled constantly by uptime checkers, so they serve a
+# precomputed dict and never touch SQLite. Code that changes a figure calls
+# status.invalidate(field); a refresher thread recomputes the invalidated
+# fields, coalescing bursts into one query. The cheap in-memory fields (queue
+# stats, scheduler state) are also recomputed every STATUS_REFRESH_SECONDS;
+# the database counts only ever on invalidate. Each refresh publishes a new
+# dict, so readers never take a lock.
+STATUS_REFRESH_SECONDS = float(os.getenv("STATUS_REFRESH_SECONDS", "5"))
+STATUS_COALESCE_SECONDS = 0.2
+
+class StatusSnapshot:
+    def __init__(self, sources, live=()):
+        self.sources = sources
+        self.live = set(live)
+        self._data = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._live_refreshed = 0.0
+        self._started = False
+
+    def get(self):
+        return self._data
+
+    def invalidate(self, *fields):
+        with self._lock:
+            self._dirty.update(fields)
+        self._wake.set()
+
+    def refresh(self, fields=None):
+        """Recompute `fields` (all of them if None) and publish a new snapshot"""
+        if fields is None:
+            fields = self.sources
+        if not fields:
+            return
+        values = {}
+        for field in fields:
+            try:
+                values[field] = self.sources[field]()
+            except Exception as e:
+                print(f"⚠️ Status {field} failed: {e}")
+        now = time.time()
+        if self.live <= set(fields):
+            # Stamped separately: invalidations keep updated_at moving even
+            # when the queue stats are old.
+            values["live_updated_at"] = now
+            self._live_refreshed = time.monotonic()
+        with self._lock:
+            self._data = dict(self._data, **values, updated_at=now)
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, name="status-refresh", daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(max(0.0, self._live_refreshed + STATUS_REFRESH_SECONDS - time.monotonic()))
+            self._wake.clear()
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            if time.monotonic() - self._live_refreshed >= STATUS_REFRESH_SECONDS:
+                dirty |= self.live
+            self.refresh(dirty)
+            time.sleep(STATUS_COALESCE_SECONDS)
+
+status = StatusSnapshot({
+    "pending_tasks": count_pending_tasks,
+    "subscribers": count_subscribers,
+    "workouts_done": lambda: len(workout_done_today),
+    "scheduler": lambda: dict(scheduler_status),
+    "outbound": outbound.stats,
+    "chats": chat_dispatcher.stats,
+    "updates": lambda: dict(webhook_stats, queue_depth=update_queue.qsize()),
+}, live=("workouts_done", "scheduler", "outbound", "chats", "updates"))
 
-@app.route('/')
+# ==========================================
+# FLASK SERVER
+# ==========================================
 def home():
-    tasks_count = len(get_user_tasks(active_chat_id, include_completed=False)) if active_chat_id else 0
+    snapshot = status.get()
     html = ("<h1>🇮🇳 Health & Task Bot Running</h1>"
             "<p>IST: {ist}</p>"
-            "<p>Chat ID: {chat}</p>"
-            "<p>Workout Today: {workout}</p>"
+            "<p>Subscribers: {subscribers}</p>"
+            "<p>Workouts Today: {workouts}</p>"
             "<p>Pending Tasks: {tasks}</p>"
             "<p>Scheduler: {scheduler}</p>").format(
                 ist=get_ist_display(),
-                chat=active_chat_id or 'None',
-                workout='✅ Done' if workout_done_today else '❌ Pending',
-                tasks=tasks_count,
-                scheduler='Running' if scheduler_status['is_running'] else 'Stopped'
+                subscribers=snapshot.get("subscribers", 0),
+                workouts=snapshot.get("workouts_done", 0),
+                tasks=snapshot.get("pending_tasks", 0),
+                scheduler='Running' if snapshot.get("scheduler", {}).get("is_running") else 'Stopped'
             )
     return html
 
-@app.route('/ping')
 def ping():
-    tasks_count = len(get_user_tasks(active_chat_id, include_completed=False)) if active_chat_id else 0
+    snapshot = status.get()
     return {
         "status": "alive",
         "time": get_ist_display(),
-        "workout_done": workout_done_today,
-        "pending_tasks": tasks_count
+        "workouts_done": snapshot.get("workouts_done", 0),
+        "pending_tasks": snapshot.get("pending_tasks", 0),
+        "subscribers": snapshot.get("subscribers", 0),
+        "scheduler": snapshot.get("scheduler", {}),
+        "outbound": snapshot.get("outbound", {}),
+        "chats": snapshot.get("chats", {}),
+        "mode": BOT_MODE,
+        "updates": snapshot.get("updates", {}),
+        "snapshot_age_seconds": round(time.time() - snapshot.get("live_updated_at", 0), 1) if snapshot else None
     }
 
-@app.route('/health')
 def health():
     return {"status": "ok"}, 200
 
+def usage():
+    """Daily OpenAI usage rollups; ?days=N (default 7)"""
+    from flask import request
+
+    days = request.args.get('days', default=7, type=int)
+    return {
+        "days": get_usage_by_day(days),
+        "totals": get_usage_totals(days),
+        "prompt_version": PROMPT_VERSION
+    }
+
+def metrics():
+    return render_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+register_gauge("telegram_sends_total", "Outbound Telegram calls by outcome",
+               lambda: dict(outbound.counters), "counter", "outcome")
+register_gauge("telegram_send_queue_depth", "Messages waiting in the outbound dispatcher",
+               outbound.queue_depth)
+register_gauge("webhook_updates_total", "Webhook updates by outcome",
+               lambda: dict(webhook_stats), "counter", "outcome")
+register_gauge("webhook_queue_depth", "Webhook updates waiting for a worker", update_queue.qsize)
+register_gauge("chat_updates_total", "Updates through the chat dispatcher by outcome",
+               lambda: dict(chat_dispatcher.counters), "counter", "outcome")
+register_gauge("chat_queue_depth", "Updates queued or running in the chat dispatcher, by lane",
+               lambda: {lane: chat_dispatcher.queue_depth(lane) for lane in chat_dispatcher.lanes},
+               "gauge", "lane")
+register_gauge("response_cache_lookups_total", "Answer cache lookups by result",
+               lambda: {"hit": response_cache_stats['hits'], "miss": response_cache_stats['misses']},
+               "counter", "result")
+register_gauge("outbox_messages_total", "Outbox deliveries by outcome",
+               lambda: dict(outbox.counters), "counter", "outcome")
+register_gauge("outbox_pending", "Outbox messages waiting to be sent", count_outbox_pending)
+register_gauge("scheduler_errors_total", "Errors raised in the meal scheduler loop",
+               lambda: scheduler_status['error_count'], "counter")
+
+def create_app():
+    """Application factory for the Flask server"""
+    from flask import Flask
+
+    app = Flask('')
+    app.add_url_rule('/', view_func=home)
+    app.add_url_rule('/ping', view_func=ping)
+    app.add_url_rule('/health', view_func=health)
+    app.add_url_rule('/usage', view_func=usage)
+    app.add_url_rule('/metrics', view_func=metrics)
+    if BOT_MODE == "webhook":
+        app.add_url_rule(WEBHOOK_PATH, view_func=telegram_webhook, methods=['POST'])
+    return app
+
 # ==========================================
 # START SEQUENCE
 # ==========================================
+_workers_started = False
+_workers_ready = threading.Event()
+
+def start_workers():
+    """Open the database and start the background threads; safe to call more than once"""
+    global _workers_started
+    with _clients_lock:
+        if _workers_started:
+            return
+        _workers_started = True
+    init_database()
+    task_store.start()
+    migrate_legacy_chat_id()
+    load_workouts_today()
+    outbound.start()
+    outbox.start()
+    chat_dispatcher.start()
+    status.refresh()
+    status.start()
+    threading.Thread(target=task_reminder_checker, name="task-reminders", daemon=True).start()
+    threading.Thread(target=task_archiver, name="task-archiver", daemon=True).start()
+    threading.Thread(target=scheduler, name="meal-scheduler", daemon=True).start()
+    threading.Thread(target=conversation_compactor, name="conversation-compactor", daemon=True).start()
+    if BOT_MODE == "webhook":
+        for i in range(UPDATE_WORKERS):
+            threading.Thread(target=update_worker, name=f"updates-{i}", daemon=True).start()
+    _workers_ready.set()
+
+def wait_until_ready(timeout=READY_TIMEOUT):
+    """Block until the workers are up and Telegram answers getMe; False on timeout"""
+    deadline = time.monotonic() + timeout
+    if not _workers_ready.wait(timeout):
+        return False
+    delay = 0.5
+    while True:
+        try:
+            me = get_bot().get_me()
+            print(f"✅ Telegram reachable as @{me.username}")
+            return True
+        except Exception as e:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"⚠️ Telegram not reachable yet: {e}")
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 10)
+
 def start_bot():
-    import time
-    time.sleep(5)
+    if not wait_until_ready():
+        print("⚠️ Starting Telegram bot before readiness check passed")
+    if BOT_MODE == "webhook":
+        try:
+            register_webhook()
+        except Exception as e:
+            print(f"❌ Couldn't register webhook: {e}")
+        return
     print("✅ Starting Telegram bot...")
-    bot.infinity_polling()
+    # getUpdates is refused while a webhook is set, e.g. after switching modes.
+    get_bot().remove_webhook()
+    get_bot().infinity_polling()
+
+# The HTTP side (/, /ping, /health, /usage, /metrics and the webhook) runs on
+# waitress; HTTP_SERVER=flask falls back to Flask's development server.
+HTTP_SERVER = os.getenv("HTTP_SERVER", "waitress").lower()
+HTTP_THREADS = int(os.getenv("HTTP_THREADS", "8"))
+HTTP_CONNECTION_LIMIT = int(os.getenv("HTTP_CONNECTION_LIMIT", "1000"))
+_bot_started = False
+
+def wsgi_app():
+    """Start the workers and the bot, then return the Flask app for a WSGI server.
+
+    python bot.py serves it with waitress; other servers can call it
+    directly, e.g. waitress-serve --call bot:wsgi_app
+    """
+    global _bot_started
+    check_config()
+    if hasattr(signal, "SIGHUP") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGHUP, lambda signum, frame: reload_message_templates())
+
+    start_workers()
+    app = create_app()
+    with _clients_lock:
+        if _bot_started:
+            return app
+        _bot_started = True
 
-if __name__ == '__main__':
     print("="*60)
     print("🇮🇳 BOT STARTING")
     print(f"⏰ IST: {get_ist_display()}")
-    print(f"👤 Chat: {active_chat_id or 'None'}")
+    print(f"👥 Subscribers: {count_subscribers()}")
+    print(f"📡 Mode: {BOT_MODE}")
     print("="*60)
 
     Thread(target=start_bot, daemon=True).start()
+    return app
 
-    port = int(os.getenv("PORT", 8080))
-    print(f"🌐 Starting Flask on port {port}")
-    app.run(host='0.0.0.0', port=port)
+def serve_http(app, port):
+    """Serve app with waitress, or Flask's development server if HTTP_SERVER=flask"""
+    if HTTP_SERVER == "flask":
+        print(f"🌐 Starting Flask development server on port {port}")
+        app.run(host='0.0.0.0', port=port)
+        return
+    from waitress import serve
+    print(f"🌐 Serving on port {port} with waitress ({HTTP_THREADS} threads)")
+    serve(app, host='0.0.0.0', port=port, threads=HTTP_THREADS, connection_limit=HTTP_CONNECTION_LIMIT)
+
+def main():
+    app = wsgi_app()
+    serve_http(app, int(os.getenv("PORT", 8080)))
+
+if __name__ == '__main__':
+    main()